@@ -2,12 +2,14 @@
 import argparse
 import csv
 import logging
+import os
 import pkg_resources
 import yaml
 from collections import defaultdict
 from scrapy.crawler import CrawlerProcess
 from scrapy.utils.log import configure_logging
 from scrapy.utils.project import get_project_settings
+from misinformation.scheduling import MultiSiteScheduler
 from misinformation.spiders import IndexPageSpider, ScattergunSpider, XMLSitemapSpider
 
 
@@ -21,9 +23,28 @@ def main():
     crawl_type.add_argument("--list", "-l", help="CSV file of URLs to crawl with an 'article_url' column and a 'site name' column.")
     # General options
     parser.add_argument("--max_articles", "-n", type=int, default=0, help="Maximum number of articles to process from each site.")
-    parser.add_argument("--exporter", "-e", default="file", choices=["file", "blob"], help="Article export method.")
+    parser.add_argument("--exporter", "-e", default="file", choices=["file", "blob", "segments"], help="Article export method.")
+    parser.add_argument("--local-storage", default="", help="Directory to use for blob storage and the database instead of Azure.")
+    parser.add_argument("--upload-segments", action="store_true", help="Upload completed WARC segments to blob storage (with the 'segments' exporter).")
+    parser.add_argument("--codec", default="gzip", choices=["gzip", "zstd"], help="Compression for WARC files written by the 'blob' and 'file' exporters.")
+    parser.add_argument("--extract", action="store_true", help="Extract articles during the crawl and add them to the database.")
+    parser.add_argument("--browsers", type=int, default=2, help="Number of headless browsers used to press buttons on pages in parallel.")
     parser.add_argument("--no-digest", action="store_true", help="Disable content digests.")
     parser.add_argument("--no-index", action="store_true", help="Disable node indexes.")
+    parser.add_argument("--revalidate", action="store_true", help="Send conditional requests and skip pages that are unchanged since the previous crawl.")
+    parser.add_argument("--incremental", action="store_true", help="Skip sitemap entries that are older than the previous crawl.")
+    parser.add_argument("--prioritise-articles", action="store_true", help="Crawl links that are likely to be articles first.")
+    parser.add_argument("--canonical-urls", action="store_true", help="Identify articles by the canonical URL that they declare with rel=canonical or og:url.")
+    parser.add_argument("--dedupe", action="store_true", help="Record near-duplicates of previously archived pages as aliases instead of archiving them.")
+    parser.add_argument("--resume", help="Directory in which to save crawl state, resuming any interrupted crawl found there.")
+    parser.add_argument("--shared-frontier", help="Path to a crawl frontier shared with other crawler processes on this host.")
+    parser.add_argument("--worker-id", default="", help="Name of this process when using a shared frontier (defaults to hostname and PID).")
+    # Options for fair scheduling when crawling all sites
+    parser.add_argument("--fair", action="store_true", help="Schedule sites with per-site budgets when crawling all sites.")
+    parser.add_argument("--fairness", default="equal", choices=["equal", "weighted"], help="How to size each site's budget of concurrent requests: the same for every site ('equal') or scaled by its 'crawl_weight' ('weighted').")
+    parser.add_argument("--global-concurrency", type=int, default=64, help="Maximum number of concurrent requests across all sites.")
+    parser.add_argument("--site-concurrency", type=int, default=8, help="Number of concurrent requests for each site (scaled by 'crawl_weight' for weighted fairness).")
+    parser.add_argument("--site-timeout", type=int, default=0, help="Maximum number of seconds to spend crawling each site.")
     args = parser.parse_args()
 
     # Set up logging
@@ -35,9 +56,32 @@ def main():
     settings = get_project_settings()
     settings.update({
         'ARTICLE_EXPORTER': args.exporter,
+        'WARC_SEGMENT_UPLOAD': args.upload_segments,
+        'LOCAL_STORAGE_DIR': args.local_storage,
+        'WARC_CODEC': args.codec,
+        'ARTICLE_EXTRACTION': args.extract,
+        'BUTTON_PRESS_BROWSERS': args.browsers,
         'CONTENT_DIGESTS': (not args.no_digest),
         'NODE_INDEXES': (not args.no_index),
+        'CONDITIONAL_REQUESTS': args.revalidate,
+        'INCREMENTAL_SITEMAPS': args.incremental,
+        'PRIORITISE_ARTICLE_LINKS': args.prioritise_articles,
+        'USE_DECLARED_CANONICAL_URLS': args.canonical_urls,
+        'NEAR_DUPLICATE_DETECTION': args.dedupe,
     })
+    # Pull requests from a shared frontier if specified
+    if args.shared_frontier:
+        settings.update({
+            'SCHEDULER': 'misinformation.frontier.SharedFrontierScheduler',
+            'SHARED_FRONTIER_PATH': args.shared_frontier,
+            'SHARED_FRONTIER_WORKER_ID': args.worker_id,
+            'DOWNLOADER_MIDDLEWARES': dict(settings.getdict('DOWNLOADER_MIDDLEWARES'), **{
+                'misinformation.frontier.SharedFrontierMiddleware': 10,
+            }),
+            'SPIDER_MIDDLEWARES': dict(settings.getdict('SPIDER_MIDDLEWARES'), **{
+                'misinformation.frontier.SharedFrontierSpiderMiddleware': 10,
+            }),
+        })
     # Apply an item limit if specified
     if args.max_articles:
         settings.update({
@@ -57,16 +101,29 @@ def main():
     # -------------------
     if args.site:
         # Create a dynamic spider class and register it with the crawler
-        spider_class = dynamic_spider_class(site_configs[args.site], args.max_articles)
+        spider_class = dynamic_spider_class(site_configs[args.site], args.max_articles, args.resume)
         process.crawl(spider_class, config=site_configs[args.site])
 
     # Crawl all sites
     # ---------------
     elif args.all:
+        scheduler = None
+        if args.fair:
+            scheduler = MultiSiteScheduler(process,
+                                           global_concurrency=args.global_concurrency,
+                                           site_concurrency=args.site_concurrency,
+                                           fairness=args.fairness,
+                                           site_timeout=args.site_timeout)
         for site_name in site_configs:
             # Create a dynamic spider class and register it with the crawler
-            spider_class = dynamic_spider_class(site_configs[site_name], args.max_articles)
-            process.crawl(spider_class, config=site_configs[site_name])
+            # (or with the scheduler, which will start it when there is capacity)
+            spider_class = dynamic_spider_class(site_configs[site_name], args.max_articles, args.resume)
+            if scheduler:
+                scheduler.add_site(spider_class, site_configs[site_name])
+            else:
+                process.crawl(spider_class, config=site_configs[site_name])
+        if scheduler:
+            scheduler.start()
 
     # Crawl all URLs from a CSV file
     # ------------------------------
@@ -88,23 +145,32 @@ def main():
             site_config["start_url"] = ""
             site_config["article_override_list"] = article_urls[site_name]
             # Create a dynamic spider class and register it with the crawler
-            spider_class = dynamic_spider_class(site_config, args.max_articles)
+            spider_class = dynamic_spider_class(site_config, args.max_articles, args.resume)
             process.crawl(spider_class, config=site_config)
 
     # Start the crawler
     process.start()
 
 
-def dynamic_spider_class(config, max_articles):
+def dynamic_spider_class(config, max_articles, resume_dir=None):
     """
     As custom-settings are only applied at class-level, we create a new class
     for each site and set the custom_settings appropriately
+
+    The class name depends only on the site name so that a resumed crawl
+    recreates the same class. Queued requests refer to their callbacks by
+    name, so they can be restored onto the new class.
     """
     # Whether to obey robots.txt
     custom_settings = {
         "ROBOTSTXT_OBEY": config.get("obey_robots_txt", True),
     }
 
+    # Each site needs its own job directory to persist its scheduler queue,
+    # duplicate filter and spider state
+    if resume_dir:
+        custom_settings["JOBDIR"] = os.path.join(resume_dir, config["site_name"])
+
     # For sites with a maximum per-crawler limit, use lots of shallow crawlers
     # which will self-terminate when they hit a 402 error
     if config["crawl_strategy"].get("use_shallow_crawlers", False):
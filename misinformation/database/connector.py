@@ -1,12 +1,22 @@
+import os
 import yaml
 import pkg_resources
 import sqlalchemy
 from azure.storage.blob import BlockBlobService
 from .exceptions import RecoverableDatabaseError, NonRecoverableDatabaseError
+from .local_blob_service import LocalBlobService
+from .models import BaseTableModel
 
 
 class Connector():
-    def __init__(self, blob_container_name="warc-files"):
+    """Connection to blob storage and the database.
+
+    By default these are the Azure blob storage account and SQL database
+    configured in 'secrets/db_config.yml'. If local_storage_dir is given,
+    blobs are kept in a local content-addressed store and database entries
+    in a SQLite database, both inside that directory.
+    """
+    def __init__(self, blob_container_name="warc-files", local_storage_dir=None):
         # Database connections
         self._db_config = None
         self._engine = None
@@ -14,11 +24,15 @@ class Connector():
         # Blob storage
         self._block_blob_service = None
         self.blob_container_name = blob_container_name
+        self.local_storage_dir = local_storage_dir
 
     @property
     def block_blob_service(self):
         if not self._block_blob_service:
-            self._block_blob_service = BlockBlobService(account_name="misinformationcrawldata", account_key=self.db_config["blob_storage_key"])
+            if self.local_storage_dir:
+                self._block_blob_service = LocalBlobService(os.path.join(self.local_storage_dir, "blobs"))
+            else:
+                self._block_blob_service = BlockBlobService(account_name="misinformationcrawldata", account_key=self.db_config["blob_storage_key"])
         return self._block_blob_service
 
     @property
@@ -31,6 +45,12 @@ class Connector():
         return self._db_config
 
     def open_session(self):
+        if not self._engine and self.local_storage_dir:
+            if not os.path.isdir(self.local_storage_dir):
+                os.makedirs(self.local_storage_dir)
+            self._engine = sqlalchemy.create_engine("sqlite:///{}".format(os.path.join(self.local_storage_dir, "database.sqlite3")),
+                                                    connect_args={"check_same_thread": False})
+            BaseTableModel.metadata.create_all(self._engine)
         if not self._engine:
             self._engine = sqlalchemy.create_engine("mssql+pyodbc://{user}:{password}@{server}:1433/{database}?driver={driver}".format(
                 database=self.db_config["database"],
@@ -43,7 +63,19 @@ class Connector():
             self._session_factory = sqlalchemy.orm.sessionmaker(bind=self._engine)
         return self._session_factory()
 
+    @staticmethod
+    def segment_blob_key(segment_name, offset, length):
+        """Blob key for a page stored at a byte range within a WARC segment."""
+        return "{}#{}:{}".format(segment_name, offset, length)
+
     def get_blob_content(self, blob_key):
+        # Pages stored in WARC segments only need their own byte range
+        if "#" in blob_key:
+            blob_name, byte_range = blob_key.rsplit("#", 1)
+            offset, length = [int(value) for value in byte_range.split(":")]
+            blob = self.block_blob_service.get_blob_to_bytes(self.blob_container_name, blob_name,
+                                                             start_range=offset, end_range=offset + length - 1)
+            return blob.content
         blob = self.block_blob_service.get_blob_to_bytes(self.blob_container_name, blob_key)
         return blob.content
 
@@ -73,6 +105,30 @@ class Connector():
                 raise NonRecoverableDatabaseError("The database has reached its size quota. Ending the crawl.")
             raise  # Re-raise the exception if it had a different cause
 
+    def add_entries(self, entries):
+        """Attempt to commit several entries to the database in a single transaction.
+
+        If this fails (eg. because one entry is a duplicate) the entries are
+        added one at a time instead. Returns the RecoverableDatabaseErrors for
+        any entries which could not be added.
+        """
+        session = self.open_session()
+        try:
+            session.add_all(entries)
+            session.commit()
+            return []
+        except sqlalchemy.exc.SQLAlchemyError:
+            session.rollback()
+        finally:
+            session.close()
+        errors = []
+        for entry in entries:
+            try:
+                self.add_entry(entry)
+            except RecoverableDatabaseError as err:
+                errors.append(err)
+        return errors
+
     def read_entries(self, entry_type, max_entries=None, site_name=None):
         try:
             session = self.open_session()
@@ -0,0 +1,110 @@
+import hashlib
+import os
+import sqlite3
+import tempfile
+import threading
+from collections import namedtuple
+
+LocalBlob = namedtuple("LocalBlob", ["name", "content"])
+
+
+class LocalBlobService():
+    """Content-addressed blob store on the local filesystem.
+
+    This provides the parts of the Azure BlockBlobService interface that are
+    used by the crawler. Blob contents are stored once per SHA-256 digest in
+    a sharded 'objects/ab/cd/<digest>' directory tree, and a SQLite database
+    maps each (container, blob name) to the digest of its contents.
+    """
+    def __init__(self, root):
+        self.root = root
+        if not os.path.isdir(self.root):
+            os.makedirs(self.root)
+        self.lock = threading.Lock()
+        # The store is used from the exporters' upload threads as well as the reactor thread
+        self.connection = sqlite3.connect(os.path.join(root, "blobs.sqlite3"), check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("""CREATE TABLE IF NOT EXISTS blobs (
+                                       container TEXT NOT NULL,
+                                       name TEXT NOT NULL,
+                                       digest TEXT NOT NULL,
+                                       size INTEGER NOT NULL,
+                                       PRIMARY KEY (container, name))""")
+        self.connection.commit()
+
+    def object_path(self, digest):
+        return os.path.join(self.root, "objects", digest[:2], digest[2:4], digest)
+
+    def add_object(self, source_path, digest):
+        """Move a temporary file into the object store unless an object with this digest already exists."""
+        object_path = self.object_path(digest)
+        if os.path.isfile(object_path):
+            os.remove(source_path)
+            return
+        os.makedirs(os.path.dirname(object_path), exist_ok=True)
+        os.replace(source_path, object_path)
+
+    def set_blob(self, container_name, blob_name, digest, size):
+        with self.lock, self.connection:
+            self.connection.execute("INSERT OR REPLACE INTO blobs (container, name, digest, size) VALUES (?, ?, ?, ?)",
+                                    (container_name, blob_name, digest, size))
+
+    def create_blob_from_bytes(self, container_name, blob_name, blob):
+        digest = hashlib.sha256(blob).hexdigest()
+        file_descriptor, temporary_path = tempfile.mkstemp(dir=self.root)
+        with os.fdopen(file_descriptor, "wb") as f_out:
+            f_out.write(blob)
+        self.add_object(temporary_path, digest)
+        self.set_blob(container_name, blob_name, digest, len(blob))
+
+    def create_blob_from_text(self, container_name, blob_name, text, encoding="utf-8"):
+        if isinstance(text, str):
+            text = text.encode(encoding)
+        self.create_blob_from_bytes(container_name, blob_name, text)
+
+    def create_blob_from_path(self, container_name, blob_name, file_path):
+        file_hash, size = hashlib.sha256(), 0
+        file_descriptor, temporary_path = tempfile.mkstemp(dir=self.root)
+        with open(file_path, "rb") as f_in, os.fdopen(file_descriptor, "wb") as f_out:
+            for chunk in iter(lambda: f_in.read(1024 * 1024), b""):
+                file_hash.update(chunk)
+                size += len(chunk)
+                f_out.write(chunk)
+        self.add_object(temporary_path, file_hash.hexdigest())
+        self.set_blob(container_name, blob_name, file_hash.hexdigest(), size)
+
+    def digest(self, container_name, blob_name):
+        with self.lock:
+            row = self.connection.execute("SELECT digest FROM blobs WHERE container = ? AND name = ?",
+                                          (container_name, blob_name)).fetchone()
+        if not row:
+            raise KeyError("Blob {} does not exist in container {}".format(blob_name, container_name))
+        return row[0]
+
+    def exists(self, container_name, blob_name=None):
+        if blob_name is None:
+            return True
+        try:
+            self.digest(container_name, blob_name)
+            return True
+        except KeyError:
+            return False
+
+    def get_blob_to_bytes(self, container_name, blob_name, start_range=None, end_range=None):
+        with open(self.object_path(self.digest(container_name, blob_name)), "rb") as f_in:
+            if start_range is None:
+                return LocalBlob(blob_name, f_in.read())
+            f_in.seek(start_range)
+            return LocalBlob(blob_name, f_in.read(end_range - start_range + 1))
+
+    def list_blobs(self, container_name, prefix=None):
+        with self.lock:
+            rows = self.connection.execute("SELECT name FROM blobs WHERE container = ? AND name >= ? ORDER BY name",
+                                           (container_name, prefix or "")).fetchall()
+        for (name,) in rows:
+            if prefix and not name.startswith(prefix):
+                break
+            yield LocalBlob(name, None)
+
+    def close(self):
+        self.connection.close()
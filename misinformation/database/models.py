@@ -1,17 +1,30 @@
+from dateutil import parser
 from sqlalchemy import Column, Integer, String, DateTime
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import deferred
+from sqlalchemy.types import TypeDecorator
 
 BaseTableModel = declarative_base()
 
 
+class IsoDateTime(TypeDecorator):
+    """DateTime column which accepts ISO-format strings, even on SQLite which needs datetime objects."""
+    impl = DateTime
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if isinstance(value, str) and dialect.name == "sqlite":
+            return parser.parse(value)
+        return value
+
+
 class Webpage(BaseTableModel):
     __tablename__ = 'webpages'
     id = Column(Integer, primary_key=True)
     site_name = Column(String)
     article_url = Column(String)
     crawl_id = Column(String)
-    crawl_datetime = Column(DateTime)
+    crawl_datetime = Column(IsoDateTime)
     blob_key = Column(String)
 
     def __str__(self):
@@ -30,7 +43,7 @@ class Article(BaseTableModel):
     __tablename__ = 'articles_dev'
     id = Column(Integer, primary_key=True)
     crawl_id = Column(String)
-    crawl_datetime = deferred(Column(DateTime))  # deferred as access causes a pyodbc crash
+    crawl_datetime = deferred(Column(IsoDateTime))  # deferred as access causes a pyodbc crash
     site_name = Column(String)
     article_url = Column(String)
     title = Column(String)
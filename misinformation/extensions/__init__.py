@@ -0,0 +1,15 @@
+"""
+This module contains any project-specific Scrapy extensions
+
+See documentation at:
+https://doc.scrapy.org/en/latest/topics/extensions.html
+"""
+from .atomic_spider_state import AtomicSpiderState
+from .pipeline_metrics import PipelineMetrics
+from .pipeline_monitor import PipelineMonitor
+
+__all__ = [
+    "AtomicSpiderState",
+    "PipelineMetrics",
+    "PipelineMonitor",
+]
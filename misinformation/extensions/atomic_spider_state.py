@@ -0,0 +1,33 @@
+import os
+import pickle
+import tempfile
+from scrapy.extensions.spiderstate import SpiderState
+
+
+class AtomicSpiderState(SpiderState):
+    """Scrapy's SpiderState extension, which saves spider.state in the JOBDIR, but replacing the saved state atomically.
+
+    The state is written to a temporary file which then replaces the
+    previous one, so a crawl killed while saving its state cannot leave a
+    truncated file behind. Spiders with restore_state and save_state methods
+    are called once spider.state has been loaded and just before it is
+    saved, whichever order the signal handlers happen to run in.
+    """
+    def spider_opened(self, spider):
+        super().spider_opened(spider)
+        if hasattr(spider, "restore_state"):
+            spider.restore_state()
+
+    def spider_closed(self, spider):
+        if hasattr(spider, "save_state"):
+            spider.save_state()
+        file_descriptor, temporary_path = tempfile.mkstemp(dir=self.jobdir, prefix="spider.state.")
+        try:
+            with os.fdopen(file_descriptor, "wb") as f_out:
+                pickle.dump(spider.state, f_out, protocol=4)
+                f_out.flush()
+                os.fsync(f_out.fileno())
+            os.replace(temporary_path, self.statefn)
+        except BaseException:
+            os.remove(temporary_path)
+            raise
@@ -0,0 +1,63 @@
+import time
+
+
+class PipelineMetrics():
+    """Record item pipeline queue depths and per-stage latencies in the crawler stats.
+
+    Items and bytes in flight are kept as 'pipeline/items_in_flight' and
+    'pipeline/bytes_in_flight'. Each stage has a count, total and maximum
+    latency under 'pipeline/<stage>/'. If there is no stats collector then
+    nothing is recorded.
+    """
+    def __init__(self, stats=None):
+        self.stats = stats
+
+    def item_started(self, n_bytes):
+        if self.stats is None:
+            return
+        self.stats.inc_value("pipeline/items_in_flight", 1)
+        self.stats.inc_value("pipeline/bytes_in_flight", n_bytes)
+
+    def item_finished(self, n_bytes):
+        if self.stats is None:
+            return
+        self.stats.inc_value("pipeline/items_in_flight", -1)
+        self.stats.inc_value("pipeline/bytes_in_flight", -n_bytes)
+
+    def record_latency(self, stage, seconds):
+        if self.stats is None:
+            return
+        self.stats.inc_value("pipeline/{}/count".format(stage), 1)
+        self.stats.inc_value("pipeline/{}/total_seconds".format(stage), seconds)
+        self.stats.max_value("pipeline/{}/max_seconds".format(stage), seconds)
+
+    def timed(self, stage, deferred):
+        """Record the time until a Deferred fires as the latency of a stage, returning the Deferred."""
+        start_time = time.time()
+
+        def record(result):
+            self.record_latency(stage, time.time() - start_time)
+            return result
+        return deferred.addBoth(record)
+
+    def tracked(self, n_bytes, deferred):
+        """Count an item as in flight until its Deferred fires, returning the Deferred."""
+        self.item_started(n_bytes)
+
+        def finish(result):
+            self.item_finished(n_bytes)
+            return result
+        return deferred.addBoth(finish)
+
+    def summary(self, stages):
+        """Mean and maximum latency of each stage that has been recorded, as a human-readable string."""
+        summaries = []
+        for stage in stages:
+            count = self.stats.get_value("pipeline/{}/count".format(stage), 0)
+            if count:
+                summaries.append("{} {:.1f}ms (max {:.1f}ms)".format(
+                    stage,
+                    1000 * self.stats.get_value("pipeline/{}/total_seconds".format(stage)) / count,
+                    1000 * self.stats.get_value("pipeline/{}/max_seconds".format(stage)),
+                ))
+        return ", ".join(summaries)
@@ -0,0 +1,70 @@
+from scrapy import signals
+from scrapy.exceptions import NotConfigured
+from twisted.internet import task
+from .pipeline_metrics import PipelineMetrics
+
+STAGES = ["warc_build", "extraction", "upload", "db_insert"]
+
+
+class PipelineMonitor():
+    """Periodically log the item pipeline queue depth, bytes in flight and stage latencies.
+
+    If PIPELINE_MAX_BYTES_IN_FLIGHT is set, the downloader concurrency is
+    halved whenever more than this many bytes are in flight in the pipelines,
+    and increased by one request per interval (up to CONCURRENT_REQUESTS)
+    once fewer than half as many are.
+    """
+    def __init__(self, crawler, interval, max_bytes_in_flight):
+        self.crawler = crawler
+        self.interval = interval
+        self.max_bytes_in_flight = max_bytes_in_flight
+        self.metrics = PipelineMetrics(crawler.stats)
+        self.max_concurrency = None
+        self.task = None
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        interval = crawler.settings.getfloat('PIPELINE_MONITOR_INTERVAL')
+        if not interval:
+            raise NotConfigured
+        extension = cls(crawler, interval, crawler.settings.getint('PIPELINE_MAX_BYTES_IN_FLIGHT'))
+        crawler.signals.connect(extension.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(extension.spider_closed, signal=signals.spider_closed)
+        return extension
+
+    def spider_opened(self, spider):
+        self.max_concurrency = self.crawler.engine.downloader.total_concurrency
+        self.task = task.LoopingCall(self.check, spider)
+        self.task.start(self.interval, now=False)
+
+    def spider_closed(self, spider):
+        del spider  # supress unused argument warning
+        if self.task and self.task.running:
+            self.task.stop()
+
+    def check(self, spider):
+        stats = self.crawler.stats
+        scraper_slot = self.crawler.engine.scraper.slot
+        items_waiting = scraper_slot.itemproc_size if scraper_slot else 0
+        bytes_in_flight = stats.get_value("pipeline/bytes_in_flight", 0)
+        spider.logger.info("Pipelines: %s items queued, %s items and %s bytes in flight. %s",
+                           items_waiting,
+                           stats.get_value("pipeline/items_in_flight", 0),
+                           bytes_in_flight,
+                           self.metrics.summary(STAGES),
+                           )
+        if self.max_bytes_in_flight:
+            self.throttle(spider, bytes_in_flight)
+
+    def throttle(self, spider, bytes_in_flight):
+        downloader = self.crawler.engine.downloader
+        concurrency = downloader.total_concurrency
+        if bytes_in_flight > self.max_bytes_in_flight:
+            concurrency = max(1, concurrency // 2)
+        elif bytes_in_flight < self.max_bytes_in_flight / 2:
+            concurrency = min(self.max_concurrency, concurrency + 1)
+        if concurrency != downloader.total_concurrency:
+            spider.logger.info("Changing concurrent requests from %s to %s with %s bytes in flight",
+                               downloader.total_concurrency, concurrency, bytes_in_flight)
+            downloader.total_concurrency = concurrency
+        self.crawler.stats.set_value("pipeline/concurrent_requests", concurrency)
@@ -0,0 +1,12 @@
+"""
+This module contains a crawl frontier which can be shared between crawler processes
+"""
+from .shared_frontier_scheduler import SharedFrontierMiddleware, SharedFrontierScheduler, SharedFrontierSpiderMiddleware
+from .sqlite_frontier import SQLiteFrontier
+
+__all__ = [
+    "SharedFrontierMiddleware",
+    "SharedFrontierScheduler",
+    "SharedFrontierSpiderMiddleware",
+    "SQLiteFrontier",
+]
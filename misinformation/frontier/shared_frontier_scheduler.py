@@ -0,0 +1,232 @@
+import os
+import pickle
+import socket
+from collections import Counter, deque
+from scrapy import Request, signals
+from scrapy.utils.misc import load_object
+from scrapy.utils.request import request_from_dict
+
+# Sent by the SharedFrontierMiddleware when a request fails to download
+request_failed = object()
+# Sent by the SharedFrontierSpiderMiddleware once a response and all the items from its callback have been processed
+request_processed = object()
+
+
+class SharedFrontierScheduler():
+    """Scrapy scheduler which pulls requests from a frontier shared between crawler processes.
+
+    Several processes crawling the same site will divide its requests between
+    them without duplicate fetches. Requests with dont_filter set (start URLs,
+    retries and CloudFlare reschedules) are kept in a local queue, since they
+    are specific to this process. New requests and acknowledgements are
+    written to the frontier in batches, and a request is only acknowledged
+    once its callback and item pipelines have finished with it, so a page
+    is fetched again by another worker if this one dies part way through.
+    """
+    def __init__(self, frontier, worker_id, batch_size, stats, fingerprinter):
+        self.frontier = frontier
+        self.worker_id = worker_id
+        self.batch_size = batch_size
+        self.stats = stats
+        self.fingerprinter = fingerprinter
+        self.spider = None
+        self.local_queue = deque()
+        self.leased_requests = deque()
+        self.unacknowledged_ids = set()
+        self.pending_requests = {}
+        self.acknowledged_ids = []
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        frontier_cls = load_object(settings["SHARED_FRONTIER_BACKEND"])
+        frontier = frontier_cls(settings["SHARED_FRONTIER_PATH"],
+                                lease_seconds=settings.getint("SHARED_FRONTIER_LEASE_SECONDS"),
+                                max_attempts=settings.getint("SHARED_FRONTIER_MAX_ATTEMPTS"))
+        worker_id = settings.get("SHARED_FRONTIER_WORKER_ID") or "{}-{}".format(socket.gethostname(), os.getpid())
+        scheduler = cls(frontier, worker_id, settings.getint("SHARED_FRONTIER_BATCH_SIZE"), crawler.stats,
+                        crawler.request_fingerprinter)
+        crawler.signals.connect(scheduler.request_finished, signal=request_processed)
+        crawler.signals.connect(scheduler.request_finished, signal=request_failed)
+        return scheduler
+
+    @property
+    def site_name(self):
+        return self.spider.config["site_name"]
+
+    def open(self, spider):
+        self.spider = spider
+        spider.logger.info("Using shared frontier as worker %s (%s requests pending for %s)",
+                           self.worker_id, self.frontier.n_pending(self.site_name), self.site_name)
+
+    def close(self, reason):
+        self.flush()
+        # Hand back any requests that we leased but did not get round to, or
+        # which were still being processed when the crawl stopped
+        self.frontier.release([request.meta["frontier_id"] for request in self.leased_requests] +
+                              sorted(self.unacknowledged_ids))
+        self.unacknowledged_ids.clear()
+        self.frontier.close()
+        del reason  # supress unused argument warning
+
+    def has_pending_requests(self):
+        # Requests leased by other workers are not counted, so this worker
+        # stops once it has nothing left to do rather than waiting for them
+        return bool(self.local_queue or self.leased_requests or self.pending_requests or
+                    self.frontier.n_available(self.site_name))
+
+    def enqueue_request(self, request):
+        if request.dont_filter:
+            # Retries keep the frontier ID of the original request, which is acknowledged once they finish
+            self.local_queue.append(request)
+            self.stats.inc_value("scheduler/enqueued/memory")
+        else:
+            fingerprint = self.fingerprinter.fingerprint(request).hex()
+            is_duplicate = fingerprint in self.pending_requests
+            if not is_duplicate:
+                self.pending_requests[fingerprint] = (request.priority, pickle.dumps(request.to_dict(spider=self.spider),
+                                                                                     protocol=pickle.HIGHEST_PROTOCOL))
+            # A redirect replaces the request that it came from, which is acknowledged once the redirect is stored
+            self.acknowledge(request)
+            if is_duplicate:
+                self.stats.inc_value("dupefilter/filtered")
+                return False
+            if len(self.pending_requests) >= self.batch_size:
+                self.flush()
+        self.stats.inc_value("scheduler/enqueued")
+        return True
+
+    def next_request(self):
+        if self.local_queue:
+            self.stats.inc_value("scheduler/dequeued/memory")
+            request = self.local_queue.popleft()
+        else:
+            if not self.leased_requests:
+                self.flush()
+                for request_id, data in self.frontier.lease(self.site_name, self.worker_id, self.batch_size):
+                    request = request_from_dict(pickle.loads(data), spider=self.spider)
+                    request.meta["frontier_id"] = request_id
+                    self.leased_requests.append(request)
+            if not self.leased_requests:
+                return None
+            self.stats.inc_value("scheduler/dequeued/shared")
+            request = self.leased_requests.popleft()
+            self.unacknowledged_ids.add(request.meta["frontier_id"])
+        self.stats.inc_value("scheduler/dequeued")
+        return request
+
+    def flush(self):
+        """Add the requests found since the last batch to the frontier, then acknowledge the requests they came from."""
+        if self.pending_requests:
+            requests = [(fingerprint, priority, data) for fingerprint, (priority, data) in self.pending_requests.items()]
+            self.pending_requests = {}
+            n_added = self.frontier.add_many(self.site_name, requests)
+            self.stats.inc_value("scheduler/enqueued/shared", n_added)
+            self.stats.inc_value("dupefilter/filtered", len(requests) - n_added)
+        if self.acknowledged_ids:
+            self.frontier.acknowledge(self.acknowledged_ids)
+            self.acknowledged_ids = []
+
+    def acknowledge(self, request):
+        """Remove a shared request from the frontier, with the next batch, once this worker has finished with it."""
+        request_id = request.meta.get("frontier_id", None)
+        if request_id in self.unacknowledged_ids:
+            self.unacknowledged_ids.discard(request_id)
+            self.acknowledged_ids.append(request_id)
+            if len(self.acknowledged_ids) >= self.batch_size:
+                self.flush()
+
+    def request_finished(self, request, spider):
+        """Acknowledge shared requests which have been processed or which failed to download.
+
+        Otherwise they would be leased again (by this or another worker) each
+        time their lease expires, until they reach the maximum number of attempts.
+        """
+        self.acknowledge(request)
+        del spider  # supress unused argument warning
+
+    def __len__(self):
+        return len(self.local_queue) + len(self.leased_requests) + len(self.pending_requests)
+
+
+class SharedFrontierMiddleware():
+    """Scrapy downloader middleware which reports requests that fail to download.
+
+    This should come before all other downloader middlewares, so that it only
+    sees failures which none of them (eg. the RetryMiddleware) recovered from,
+    including requests rejected before reaching the downloader (eg. those
+    disallowed by robots.txt). These never produce a response, so this lets
+    the SharedFrontierScheduler acknowledge them.
+    """
+    def __init__(self, crawler):
+        self.crawler = crawler
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls(crawler)
+
+    def process_exception(self, request, exception, spider=None):
+        self.crawler.signals.send_catch_log(signal=request_failed, request=request, spider=self.crawler.spider)
+        del exception, spider  # supress unused argument warning
+
+
+class SharedFrontierSpiderMiddleware():
+    """Scrapy spider middleware which reports responses once they have been fully processed.
+
+    This should come before all other spider middlewares, so that it sees the
+    final output of each callback. A response is reported once its callback
+    has finished (or failed) and every item it produced has passed through
+    the item pipelines.
+    """
+    def __init__(self, crawler):
+        self.crawler = crawler
+        self.items_in_progress = Counter()
+        self.finished_callbacks = set()
+        for signal in (signals.item_scraped, signals.item_dropped, signals.item_error):
+            crawler.signals.connect(self.item_finished, signal=signal)
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls(crawler)
+
+    def process_spider_output(self, response, result):
+        try:
+            for output in result:
+                self.item_started(response, output)
+                yield output
+        finally:
+            self.callback_finished(response)
+
+    async def process_spider_output_async(self, response, result):
+        try:
+            async for output in result:
+                self.item_started(response, output)
+                yield output
+        finally:
+            self.callback_finished(response)
+
+    def process_spider_exception(self, response, exception):
+        self.callback_finished(response)
+        del exception  # supress unused argument warning
+
+    def item_started(self, response, output):
+        if output is not None and not isinstance(output, Request):
+            self.items_in_progress[response] += 1
+
+    def item_finished(self, response):
+        if response not in self.items_in_progress:
+            return
+        self.items_in_progress[response] -= 1
+        if not self.items_in_progress[response]:
+            del self.items_in_progress[response]
+            if response in self.finished_callbacks:
+                self.request_processed(response)
+
+    def callback_finished(self, response):
+        self.finished_callbacks.add(response)
+        if not self.items_in_progress[response]:
+            self.request_processed(response)
+
+    def request_processed(self, response):
+        self.finished_callbacks.discard(response)
+        self.crawler.signals.send_catch_log(signal=request_processed, request=response.request, spider=self.crawler.spider)
@@ -0,0 +1,118 @@
+import os
+import sqlite3
+import time
+from contextlib import contextmanager
+
+
+class SQLiteFrontier():
+    """Crawl frontier and duplicate filter shared between crawler processes on one host, backed by SQLite.
+
+    Requests are partitioned by site. Workers lease batches of requests for a
+    site, which stops any other worker from receiving the same requests until
+    the lease expires. Requests which are never acknowledged (eg. because the
+    worker crashed) are therefore handed out again after the lease expires,
+    up to a maximum number of attempts.
+
+    The database uses SQLite's write-ahead log, which relies on memory shared
+    between the processes and so does not work over a network filesystem.
+    Other backends (eg. for workers on several hosts) can be used by the
+    SharedFrontierScheduler as long as they provide the same add_many/lease/
+    acknowledge/release/n_available/n_pending methods.
+    """
+    def __init__(self, path, lease_seconds=600, max_attempts=3):
+        output_dir = os.path.dirname(path)
+        if output_dir and not os.path.isdir(output_dir):
+            os.makedirs(output_dir)
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        # Use autocommit mode so that we can manage transactions explicitly
+        self.connection = sqlite3.connect(path, timeout=60, isolation_level=None)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("""CREATE TABLE IF NOT EXISTS fingerprints (
+                                       site_name TEXT NOT NULL,
+                                       fingerprint TEXT NOT NULL,
+                                       PRIMARY KEY (site_name, fingerprint))""")
+        self.connection.execute("""CREATE TABLE IF NOT EXISTS requests (
+                                       id INTEGER PRIMARY KEY AUTOINCREMENT,
+                                       site_name TEXT NOT NULL,
+                                       priority INTEGER NOT NULL,
+                                       data BLOB NOT NULL,
+                                       lease_owner TEXT,
+                                       lease_expiry REAL NOT NULL DEFAULT 0,
+                                       attempts INTEGER NOT NULL DEFAULT 0)""")
+        self.connection.execute("""CREATE INDEX IF NOT EXISTS requests_by_priority
+                                   ON requests (site_name, priority DESC, id)""")
+
+    def close(self):
+        self.connection.close()
+
+    def add(self, site_name, fingerprint, priority, data):
+        """Add a request unless any worker has already seen it, returning whether it was added."""
+        return bool(self.add_many(site_name, [(fingerprint, priority, data)]))
+
+    def add_many(self, site_name, requests):
+        """Add (fingerprint, priority, data) tuples in a single transaction, skipping any that a worker has already seen.
+
+        Returns the number of requests added.
+        """
+        n_added = 0
+        with self.transaction():
+            for fingerprint, priority, data in requests:
+                cursor = self.connection.execute("INSERT OR IGNORE INTO fingerprints (site_name, fingerprint) VALUES (?, ?)",
+                                                 (site_name, fingerprint))
+                if cursor.rowcount:
+                    self.connection.execute("INSERT INTO requests (site_name, priority, data) VALUES (?, ?, ?)",
+                                            (site_name, priority, data))
+                    n_added += 1
+        return n_added
+
+    def lease(self, site_name, worker_id, max_requests):
+        """Lease up to max_requests of the highest-priority available requests for a site.
+
+        Returns a list of (request_id, data) tuples.
+        """
+        now = time.time()
+        with self.transaction():
+            rows = self.connection.execute("""SELECT id, data FROM requests
+                                              WHERE site_name = ? AND lease_expiry < ? AND attempts < ?
+                                              ORDER BY priority DESC, id LIMIT ?""",
+                                           (site_name, now, self.max_attempts, max_requests)).fetchall()
+            self.connection.executemany("""UPDATE requests
+                                           SET lease_owner = ?, lease_expiry = ?, attempts = attempts + 1
+                                           WHERE id = ?""",
+                                        [(worker_id, now + self.lease_seconds, request_id) for request_id, _ in rows])
+        return rows
+
+    def acknowledge(self, request_ids):
+        """Remove requests which have been fully processed."""
+        with self.transaction():
+            self.connection.executemany("DELETE FROM requests WHERE id = ?", [(request_id, ) for request_id in request_ids])
+
+    def release(self, request_ids):
+        """Return leased requests which were not processed so that other workers can take them."""
+        with self.transaction():
+            self.connection.executemany("UPDATE requests SET lease_owner = NULL, lease_expiry = 0, attempts = attempts - 1 WHERE id = ?",
+                                        [(request_id, ) for request_id in request_ids])
+
+    def n_available(self, site_name):
+        """Number of requests for this site that can be leased now."""
+        return self.connection.execute("SELECT COUNT(*) FROM requests WHERE site_name = ? AND lease_expiry < ? AND attempts < ?",
+                                       (site_name, time.time(), self.max_attempts)).fetchone()[0]
+
+    def n_pending(self, site_name):
+        """Number of requests for this site that are waiting or leased but not yet acknowledged."""
+        return self.connection.execute("SELECT COUNT(*) FROM requests WHERE site_name = ? AND attempts < ?",
+                                       (site_name, self.max_attempts)).fetchone()[0] + \
+            self.connection.execute("SELECT COUNT(*) FROM requests WHERE site_name = ? AND attempts >= ? AND lease_expiry >= ?",
+                                    (site_name, self.max_attempts, time.time())).fetchone()[0]
+
+    @contextmanager
+    def transaction(self):
+        """Run a write transaction, taking the database lock immediately."""
+        self.connection.execute("BEGIN IMMEDIATE")
+        try:
+            yield self.connection
+        except BaseException:
+            self.connection.execute("ROLLBACK")
+            raise
+        self.connection.execute("COMMIT")
@@ -7,4 +7,6 @@ class CrawlResponse(scrapy.Item):
     crawl_id = scrapy.Field()
     crawl_datetime = scrapy.Field()
     site_name = scrapy.Field()
+    simhash = scrapy.Field()
+    validators = scrapy.Field()
     warc_data = scrapy.Field(serializer=string_from_warc)
@@ -0,0 +1,98 @@
+import threading
+from selenium import webdriver
+from selenium.common.exceptions import WebDriverException
+from selenium.webdriver.common.desired_capabilities import DesiredCapabilities
+from twisted.internet import defer, reactor, threads
+from twisted.python.threadpool import ThreadPool
+
+
+def headless_chrome(performance_log=False):
+    """Start a headless Chrome webdriver, optionally recording its network requests in the performance log"""
+    chrome_options = webdriver.ChromeOptions()
+    chrome_options.add_argument("--headless")
+    capabilities = DesiredCapabilities.CHROME.copy()
+    if performance_log:
+        # The capability was renamed in chromedriver 75
+        capabilities["loggingPrefs"] = {"performance": "ALL"}
+        capabilities["goog:loggingPrefs"] = {"performance": "ALL"}
+    return webdriver.Chrome(chrome_options=chrome_options, desired_capabilities=capabilities)
+
+
+class BrowserPool:
+    """Pool of webdrivers which are driven from worker threads rather than the reactor thread.
+
+    Each call to render runs a function with an idle webdriver in a worker
+    thread and returns a Deferred which fires with its result. Calls are
+    queued once all browsers are busy. Browsers are only started when they
+    are first needed, and each is replaced after rendering pages_per_browser
+    pages (0 for no limit) or after losing its connection to the browser.
+    """
+    def __init__(self, n_browsers=2, pages_per_browser=20, driver_factory=headless_chrome):
+        self.pages_per_browser = pages_per_browser
+        self.driver_factory = driver_factory
+        self.idle_drivers = []
+        self.pages_rendered = {}
+        self.lock = threading.Lock()
+        self.thread_pool = ThreadPool(minthreads=0, maxthreads=n_browsers, name="BrowserPool")
+        self.browser_slots = defer.DeferredSemaphore(n_browsers)
+        self.started = False
+
+    def __len__(self):
+        return len(self.pages_rendered)
+
+    def render(self, func, *args):
+        """Call func(driver, *args) with the next available webdriver, returning a Deferred"""
+        if not self.started:
+            self.thread_pool.start()
+            self.started = True
+        return self.browser_slots.run(threads.deferToThreadPool, reactor, self.thread_pool, self.with_driver, func, *args)
+
+    def acquire(self):
+        with self.lock:
+            if self.idle_drivers:
+                return self.idle_drivers.pop()
+        driver = self.driver_factory()
+        with self.lock:
+            self.pages_rendered[driver] = 0
+        return driver
+
+    def release(self, driver, recycle=False):
+        with self.lock:
+            self.pages_rendered[driver] += 1
+            if not recycle and not (self.pages_per_browser > 0 and self.pages_rendered[driver] >= self.pages_per_browser):
+                self.idle_drivers.append(driver)
+                return
+            del self.pages_rendered[driver]
+        self.quit(driver)
+
+    def with_driver(self, func, *args):
+        driver = self.acquire()
+        try:
+            result = func(driver, *args)
+        except WebDriverException:
+            # The browser may have crashed, so start a new one for the next page
+            self.release(driver, recycle=True)
+            raise
+        except BaseException:
+            self.release(driver)
+            raise
+        self.release(driver)
+        return result
+
+    @staticmethod
+    def quit(driver):
+        try:
+            driver.quit()
+        except WebDriverException:
+            pass
+
+    def close(self):
+        """Quit all browsers once any pages being rendered are finished"""
+        if self.started:
+            self.thread_pool.stop()
+            self.started = False
+        with self.lock:
+            drivers, self.idle_drivers = self.idle_drivers, []
+            self.pages_rendered.clear()
+        for driver in drivers:
+            self.quit(driver)
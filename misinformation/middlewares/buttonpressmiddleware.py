@@ -1,12 +1,28 @@
+import html
+import re
 import time
-from scrapy.http import HtmlResponse
-from selenium import webdriver
+from collections import OrderedDict
+from functools import partial
+from lxml import etree
+from scrapy.http import HtmlResponse, Request, TextResponse
 from selenium.common.exceptions import NoSuchElementException, TimeoutException, StaleElementReferenceException, ElementNotVisibleException, ElementNotInteractableException, WebDriverException
 from selenium.webdriver.common.by import By
 from selenium.webdriver.common.keys import Keys
 from selenium.webdriver.support.expected_conditions import visibility_of_element_located, element_to_be_clickable
 from selenium.webdriver.support.wait import WebDriverWait
 from selenium.webdriver.common.action_chains import ActionChains
+from ..shared_pool import SharedPool
+from .browserpool import BrowserPool, headless_chrome
+from .xhrpagination import PaginationPattern, html_from_xhr_response, infer_pagination, xhr_requests_from_performance_log
+
+
+def start_browser_pool(n_browsers, pages_per_browser):
+    # The browsers render pages for every site, so they always record the requests needed by sites with 'replay_xhr'
+    return BrowserPool(n_browsers, pages_per_browser, partial(headless_chrome, performance_log=True))
+
+
+# Browsers shared by the button press middlewares of every crawler in this process
+BROWSERS = SharedPool(start_browser_pool, BrowserPool.close)
 
 
 class PressableButton:
@@ -16,6 +32,10 @@ class PressableButton:
         self.interact_method = interact_method
         self.element = None
 
+    def copy(self):
+        """Copy of this button without any element found by a webdriver, for use in another browser"""
+        return PressableButton(self.xpath, self.interact_method)
+
     def find_if_exists(self, driver):
         """Use a webdriver to get an interactable button specified by the xpath"""
         try:
@@ -41,88 +61,180 @@ class PressableButton:
             self.element.click()
 
 
+def single_element_predicate(xpath):
+    """Split an XPath of the form '//tag[predicate]' into its tag and predicate, or return None"""
+    match = re.match(r"^//([\w-]+)\[(.*)\]$", xpath)
+    if not match:
+        return None
+    # Check that the brackets around the predicate are a matching pair
+    depth, quote = 1, None
+    for char in match.group(2):
+        if quote:
+            quote = None if char == quote else quote
+        elif char in "'\"":
+            quote = char
+        elif char == "[":
+            depth += 1
+        elif char == "]":
+            depth -= 1
+            if depth == 0:
+                return None
+    return match.group(1), match.group(2)
+
+
+def combined_xpath(xpaths):
+    """Combine XPaths into a single union XPath.
+
+    XPaths which select elements with a given tag by a single predicate are
+    merged into one location path for that tag, so that each tag is only
+    searched for once, however many patterns there are for it.
+    """
+    predicates, others = OrderedDict(), []
+    for xpath in xpaths:
+        tag_predicate = single_element_predicate(xpath)
+        if tag_predicate:
+            predicates.setdefault(tag_predicate[0], []).append(tag_predicate[1])
+        else:
+            others.append(xpath)
+    merged = ["//{}[{}]".format(tag, " or ".join("({})".format(predicate) for predicate in tag_predicates))
+              for tag, tag_predicates in predicates.items()]
+    return " | ".join(merged + others)
+
+
+class ButtonDetector:
+    """Check whether a page contains any of a list of PressableButtons using a single precompiled XPath.
+
+    This is evaluated on the response's own parsed document, which is cached
+    for use by the spider, so most pages are not parsed again.
+    """
+    def __init__(self, buttons):
+        self.xpath = etree.XPath(combined_xpath([button.xpath for button in buttons])) if buttons else None
+
+    def __call__(self, response):
+        if self.xpath is None or not isinstance(response, TextResponse):
+            return False
+        return bool(self.xpath(response.selector.root))
+
+
+class SiteButtons:
+    """Buttons and button pressing limits for one site, from the 'buttons' section of its configuration.
+
+    Both 'form' and 'load' are lists of buttons with an 'xpath' and an
+    'interact_method' (either 'Return' or 'Click'). If 'replay_xhr' is set,
+    the requests made by the first 'replay_discovery_clicks' presses of a
+    load button are used to request further pages directly, instead of
+    pressing the button again.
+    """
+    def __init__(self, config):
+        self.form_buttons = self.buttons_from_config(config.get("form", []))
+        self.load_buttons = self.buttons_from_config(config.get("load", []))
+        self.max_button_clicks = config.get("max_button_clicks", 5000)  # each button clicked at most 5000 times
+        self.timeout_single_click = config.get("timeout_single_click", 60)  # 60 second timeout on page reload
+        self.timeout_cumulative = config.get("timeout_cumulative", 1800)  # 30 minute cumulative timeout
+        self.replay_xhr = config.get("replay_xhr", False)
+        self.replay_discovery_clicks = config.get("replay_discovery_clicks", 3)
+        self.button_detectors = {}
+
+    @staticmethod
+    def buttons_from_config(button_configs):
+        buttons = []
+        for button_config in button_configs:
+            interact_method = button_config.get("interact_method", "Return")
+            if interact_method not in ("Return", "Click"):
+                raise ValueError("Unknown interact_method '{}' for button {}".format(interact_method, button_config["xpath"]))
+            buttons.append(PressableButton(button_config["xpath"], interact_method))
+        return buttons
+
+    def contains_button(self, response, load=False, form=False):
+        """Check if any there are any load or form buttons in the response."""
+        if (load, form) not in self.button_detectors:
+            self.button_detectors[(load, form)] = ButtonDetector((self.load_buttons if load else []) + (self.form_buttons if form else []))
+        return self.button_detectors[(load, form)](response)
+
+
 class ButtonPressMiddleware:
     """Scrapy middleware to bypass 'load more' and form buttons using selenium.
 
-    Buttons are identified by searching for XPath patterns.
+    Buttons are identified by searching for XPath patterns, which are
+    configured for each site in the 'buttons' section of its site config.
+    Sites without any buttons are skipped.
 
     Selenium will first press each form button encountered.
 
     Selenium will then keep pressing any load button present until one of the following occurs:
         1. The button disappears (eg. when there are no more articles to load)
-        2. The page takes too long to load (currently 60s)
-        3. A maximum number of button presses is reached (currently 10000)
+        2. The page takes too long to load (timeout_single_click)
+        3. A maximum number of button presses is reached (max_button_clicks)
+        4. Too much time has been spent pressing the button (timeout_cumulative)
+
+    Pages are rendered by a pool of headless browsers in worker threads, so
+    that button pressing does not block the crawl. The pool is shared by
+    every site crawled in this process. process_response returns a Deferred
+    which fires with the rendered page.
+
+    For sites with 'replay_xhr' set, the browser only presses each load
+    button a few times. If the requests made by these presses follow a
+    pattern (eg. '?page=2', '?page=3'), further pages are then requested
+    one at a time as normal Scrapy requests until a page without any links
+    is returned.
     """
-    def __init__(self):
-        chrome_options = webdriver.ChromeOptions()
-        chrome_options.add_argument("--headless")
-        self.driver = webdriver.Chrome(chrome_options=chrome_options)
+    def __init__(self, n_browsers=2, pages_per_browser=20, crawler=None):
+        self.n_browsers = n_browsers
+        self.pages_per_browser = pages_per_browser
+        self.crawler = crawler
         self.seen_urls = set()
         self.form_button_delay = 1
-        self.max_button_clicks = 5000   # each button clicked at most 5000 times
-        self.timeout_single_click = 60  # 60 second timeout on page reload
-        self.timeout_cumulative = 1800  # 30 minute cumulative timeout
-        self.form_buttons = [
-            PressableButton('//button[@class="qc-cmp-button"]', "Return"),
-            PressableButton('//button[@data-click="close"]', "Return"),
-            PressableButton('//button[@id="accept"]', "Return"),
-            PressableButton('//button[@name="agree"]', "Return"),
-            PressableButton('//button[contains(@class, "gdpr-modal-close")]', "Return"),
-            PressableButton('//form[@class="gdpr-form"]/input[@class="btn"]', "Return"),
-            PressableButton('//input[contains(@class, "agree")]', "Return"),
-        ]
-        self.load_buttons = [
-            PressableButton('//button[@class="btn-more"]', "Return"),
-            PressableButton('//button[@class="options__load-more"]', "Return"),
-            PressableButton('//button[@phx-track-id="load more"]', "Return"),
-            PressableButton('//button[contains(@class, "LoadMoreButton")]', "Return"),
-            PressableButton('//button[contains(@class, "show-more")]', "Return"),
-            PressableButton('//button[text()="Load More"]', "Return"),
-            PressableButton('//button[text()="Show More"]', "Return"),
-            PressableButton('//div[contains(@class, "button-load-more")]', "Click"),
-            PressableButton('//div[contains(@class, "load-btn")]/a', "Return"),
-            PressableButton('//div[contains(@class, "pb-loadmore")]', "Click"),
-            PressableButton('//li[@class="pager__item"]/a[text()="Show More"]', "Return"),
-            PressableButton('//ul[contains(@class, "pager-load-more")]/li/a', "Return"),
-        ]
-
-    def get_next_available_button(self, button_list):
+        self.site_buttons = {}
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls(crawler.settings.getint('BUTTON_PRESS_BROWSERS'),
+                   crawler.settings.getint('BUTTON_PRESS_PAGES_PER_BROWSER'),
+                   crawler)
+
+    @staticmethod
+    def get_next_available_button(driver, button_list):
         """Find the next button on the page from a list of PressableButton objects"""
         for button in button_list:
             try:
-                button.find_if_exists(self.driver)
+                button.find_if_exists(driver)
                 return button
             except WebDriverException:
                 pass
         return None
 
-    def contains_button(self, response, load=False, form=False):
-        """Check if any there are any load or form buttons in the response."""
-        buttons = (self.load_buttons if load else []) + (self.form_buttons if form else [])
-        for button in buttons:
-            if response.xpath(button.xpath):
-                return True
-        return False
+    def buttons_for_site(self, spider):
+        """Buttons configured for the spider's site, or None if it has no buttons"""
+        site_name = spider.config["site_name"]
+        if site_name not in self.site_buttons:
+            button_config = spider.config.get("buttons")
+            self.site_buttons[site_name] = SiteButtons(button_config) if button_config else None
+        return self.site_buttons[site_name]
+
+    def browser_pool(self):
+        """Pool of browsers, which is created when the first page with buttons is found and closed when the reactor stops"""
+        return BROWSERS.get(self.n_browsers, self.pages_per_browser)
 
-    def press_form_buttons(self, spider, url):
+    def press_form_buttons(self, driver, buttons, spider, url):
         """Press any form buttons on the page until they disappear"""
-        for button in self.form_buttons:
-            while button.find_if_exists(self.driver):
+        for button in [button.copy() for button in buttons.form_buttons]:
+            while button.find_if_exists(driver):
                 # Keep pressing the button with a brief delay to avoid multiple clicks
                 try:
-                    button.press_button(self.driver)
+                    button.press_button(driver)
                     spider.logger.info("Clicked a form button ({}) on {}.".format(button.xpath, url))
                     time.sleep(self.form_button_delay)
                 # If the button is not interactable then move to the next one
                 except (NoSuchElementException, ElementNotInteractableException, StaleElementReferenceException):
                     break
 
-    def press_load_button_repeatedly(self, button, spider, url):
+    def press_load_button_repeatedly(self, driver, buttons, button, spider, url, max_clicks=None):
         """Press a PressableButton as many times as we want, catch exceptions and log info to spider"""
+        max_clicks = buttons.max_button_clicks if max_clicks is None else max_clicks
         n_clicks_performed = 0
         cached_page_source = None
         start_time = time.time()
-        while (time.time() - start_time) < self.timeout_cumulative:
+        while (time.time() - start_time) < buttons.timeout_cumulative:
             try:
                 # We need a nested try block here, since the WebDriverWait
                 # inside the ElementNotVisibleException or the
@@ -131,10 +243,10 @@ class ButtonPressMiddleware:
                 # other TimeoutExceptions
                 try:
                     # Cache the page source in case the page crashes
-                    cached_page_source = self.driver.page_source
+                    cached_page_source = driver.page_source
 
                     # Press a button
-                    button.press_button(self.driver)
+                    button.press_button(driver)
 
                     # Store the button location so that we can check when the page is reloaded
                     button_location = button.element.location
@@ -144,7 +256,7 @@ class ButtonPressMiddleware:
                     spider.logger.info("Clicked a load button ({}) once ({} times in total) on {}.".format(button.xpath, n_clicks_performed, url))
 
                     # Terminate if we're at the maximum number of clicks
-                    if n_clicks_performed >= self.max_button_clicks > 0:
+                    if n_clicks_performed >= max_clicks > 0:
                         spider.logger.info("Finished loading more articles after clicking button {} times on {}.".format(n_clicks_performed, url))
                         break
 
@@ -153,34 +265,86 @@ class ButtonPressMiddleware:
                     # NB. the default poll frequency is 0.5s so if we want
                     # short timeouts this needs to be changed in the
                     # WebDriverWait constructor
-                    WebDriverWait(self.driver, self.timeout_single_click).until(lambda _: button_location != button.element.location)
+                    WebDriverWait(driver, buttons.timeout_single_click).until(lambda _: button_location != button.element.location)
 
                 except ElementNotVisibleException:
                     # This can happen when the page refresh makes a previously
                     # found element invisible until the page load is finished
-                    WebDriverWait(self.driver, self.timeout_single_click).until(visibility_of_element_located((By.XPATH, button.xpath)))
+                    WebDriverWait(driver, buttons.timeout_single_click).until(visibility_of_element_located((By.XPATH, button.xpath)))
                 except ElementNotInteractableException:
                     # This can happen when the page refresh makes an element
                     # non-clickable for some period
-                    WebDriverWait(self.driver, self.timeout_single_click).until(element_to_be_clickable((By.XPATH, button.xpath)))
+                    WebDriverWait(driver, buttons.timeout_single_click).until(element_to_be_clickable((By.XPATH, button.xpath)))
             except (NoSuchElementException, StaleElementReferenceException):
                 # The button we were clicking has gone, but maybe it moved
                 # Check whether we can find another button of this type
-                if not button.find_if_exists(self.driver):
+                if not button.find_if_exists(driver):
                     spider.logger.info("Terminating button clicking since there are no more load buttons on page {}.".format(url))
                     break
             except TimeoutException:
-                spider.logger.info("Terminating button clicking after exceeding timeout of {} seconds for page {}.".format(self.timeout_single_click, url))
+                spider.logger.info("Terminating button clicking after exceeding timeout of {} seconds for page {}.".format(buttons.timeout_single_click, url))
                 break
             except WebDriverException:
                 spider.logger.info("Terminating button clicking after losing connection to page {}.".format(url))
                 break
         try:
-            return self.driver.page_source
+            return driver.page_source
         except WebDriverException:
             pass
         return cached_page_source
 
+    def discover_pagination(self, driver, buttons, button, spider, url):
+        """Press a load button a few times and find the pattern followed by the requests that this makes"""
+        # Discard the requests made while loading the page
+        driver.get_log("performance")
+        page_source = self.press_load_button_repeatedly(driver, buttons, button, spider, url, buttons.replay_discovery_clicks)
+        pattern = infer_pagination(xhr_requests_from_performance_log(driver.get_log("performance")))
+        if pattern:
+            spider.logger.info("Replaying requests like {} instead of clicking a load button on {}.".format(pattern.url, url))
+        else:
+            spider.logger.info("Could not find a pattern in the requests made by a load button on {}.".format(url))
+        return page_source, pattern
+
+    def render(self, driver, buttons, spider, url, encoding):
+        """Load a page in a webdriver and press its buttons.
+
+        Returns the page source, any cookies and the pattern followed by the
+        load button's requests, if it should be replayed.
+
+        This runs in one of the browser pool's worker threads.
+        """
+        # Load the URL using chromedriver
+        driver.get(url)
+
+        # Press any form buttons needed to access the home page of the site
+        self.press_form_buttons(driver, buttons, spider, url)
+
+        # Get the cached page source in case the page crashes
+        page_source = driver.page_source
+
+        # Press all the load buttons so we get the max no. of articles
+        pattern = None
+        for button in [button.copy() for button in buttons.load_buttons]:
+            if not button.find_if_exists(driver):
+                continue
+            max_clicks = buttons.max_button_clicks
+            if buttons.replay_xhr and not pattern:
+                page_source, pattern = self.discover_pagination(driver, buttons, button, spider, url)
+                if pattern:
+                    continue
+                # Otherwise carry on pressing the button
+                max_clicks -= buttons.replay_discovery_clicks
+                if buttons.max_button_clicks > 0 and max_clicks <= 0:
+                    continue
+            page_source = self.press_load_button_repeatedly(driver, buttons, button, spider, url, max_clicks)
+
+        # Collect any cookies so that they can be used for future requests
+        try:
+            cookies = driver.get_cookies()
+        except WebDriverException:
+            cookies = []
+        return page_source.encode(encoding), cookies, pattern
+
     def process_response(self, request, response, spider):
         """Process the page response using the selenium driver if applicable.
 
@@ -188,44 +352,73 @@ class ButtonPressMiddleware:
         we only do this if we actively identify the page as having a javascript
         load button.
         """
+        # Skip sites which do not have any buttons configured
+        buttons = self.buttons_for_site(spider)
+        if not buttons:
+            return response
+
+        # Pages requested by replaying a load button are passed on without using a browser
+        if "xhr_replay" in request.meta:
+            return self.replayed_response(request, response, buttons, spider)
+
         # Do not process the same request URL twice
         if request.url in self.seen_urls:
             return response
         self.seen_urls.add(request.url)
 
         # Look for a load button or form button using xpaths on the scrapy response
-        if not self.contains_button(response, load=True, form=True):
+        if not buttons.contains_button(response, load=True, form=True):
             return response
 
-        # Load the URL using chromedriver
-        self.driver.get(request.url)
-
         # We should only reach this point if we have found a javascript button
         spider.logger.debug("Identified interactable buttons on {}.".format(request.url))
 
-        # Press any form buttons needed to access the home page of the site
-        self.press_form_buttons(spider, request.url)
-
-        # Get the cached page source in case the page crashes
-        page_source = self.driver.page_source
-
-        # Press all the load buttons so we get the max no. of articles
-        for button in self.load_buttons:
-            if button.find_if_exists(self.driver):
-                page_source = self.press_load_button_repeatedly(button, spider, request.url)
-
-        html_str = page_source.encode(request.encoding)
+        # Render the page in the next available browser
+        deferred = self.browser_pool().render(self.render, buttons, spider, request.url, request.encoding)
+        deferred.addCallbacks(self.rendered_response, self.render_failed, (request, spider), errbackArgs=(response, spider))
+        return deferred
 
+    def rendered_response(self, result, request, spider):
+        html_str, cookies, pattern = result
         # Add any cookies that we may have collected to the spider so that they
         # can be used for future requests
-        try:
-            cookies = self.driver.get_cookies()
-            if cookies:
-                spider.update_cookies(cookies)
-        except WebDriverException:
-            pass
+        if cookies:
+            spider.update_cookies(cookies)
+        # Request the next page that the load button would have loaded
+        if pattern:
+            self.replay_page(pattern, 1, request.url, spider)
         return HtmlResponse(body=html_str, url=request.url, encoding=request.encoding, request=request)
 
-    def spider_closed(self):
-        """Shutdown the driver when spider is closed"""
-        self.driver.quit()
+    def replay_page(self, pattern, page, page_url, spider):
+        """Schedule a request for the given page after the last one loaded by pressing a button on page_url"""
+        request = Request(pattern.page_url(page), headers=pattern.headers, cookies=spider.cookies, meta={
+            "xhr_replay": {"url": pattern.url, "index": pattern.index, "step": pattern.step, "headers": pattern.headers,
+                           "page": page, "page_url": page_url},
+        })
+        request.headers.setdefault("Referer", page_url)
+        self.crawler.engine.crawl(request)
+
+    def replayed_response(self, request, response, buttons, spider):
+        """Turn the articles loaded by a replayed request into an HTML page, and request the next page"""
+        if response.status != 200 or not isinstance(response, TextResponse):
+            return response
+        replay = request.meta["xhr_replay"]
+        articles_html = html_from_xhr_response(response)
+        # Stop at the first page without any links, as there are no more articles
+        if "href" not in articles_html:
+            spider.logger.info("Finished replaying requests for {} after {} pages.".format(replay["page_url"], replay["page"] - 1))
+        elif buttons.max_button_clicks > 0 and replay["page"] + buttons.replay_discovery_clicks >= buttons.max_button_clicks:
+            spider.logger.info("Finished replaying requests for {} after {} pages.".format(replay["page_url"], replay["page"]))
+        else:
+            pattern = PaginationPattern(replay["url"], replay["index"], replay["step"], replay["headers"])
+            self.replay_page(pattern, replay["page"] + 1, replay["page_url"], spider)
+        # Links in the loaded articles are relative to the page that they would have been added to
+        body = '<html><head><base href="{}"></head><body>{}</body></html>'.format(html.escape(replay["page_url"]), articles_html)
+        return HtmlResponse(body=body.encode("utf-8"), url=request.url, encoding="utf-8", request=request)
+
+    @staticmethod
+    def render_failed(failure, response, spider):
+        # Fall back to the downloaded page if the browser crashed
+        failure.trap(WebDriverException)
+        spider.logger.info("Could not press buttons on {} ({}).".format(response.url, failure.value))
+        return response
@@ -1,4 +1,3 @@
-import time
 from scrapy.downloadermiddlewares.retry import RetryMiddleware
 from scrapy.exceptions import IgnoreRequest
 
@@ -7,9 +6,12 @@ class DelayedRetryMiddleware(RetryMiddleware):
     """Scrapy middleware to delay the crawl when we hit 'Service Unavailable' errors.
 
     These are most frequently caused by a high crawl frequency, so we
-    deliberately introduce a delay to bypass this.
+    deliberately introduce a delay to bypass this. The delay is applied to the
+    download slot for this site rather than by sleeping, so that other sites
+    crawled in the same process are not stalled.
     """
     def __init__(self, settings):
+        self.download_delay = settings.getfloat("DOWNLOAD_DELAY")
         self.delay_http_codes = [429, 503]
         self.ignore_http_codes = [402]
         self.delay_increment = 0.1
@@ -43,7 +45,9 @@ class DelayedRetryMiddleware(RetryMiddleware):
                     "Current delay interval is {:.2f}s".format(
                         self.num_responses, self.delay_increment, self.delay_interval))
                 self.num_responses = 0
-        # Wait if the delay is non-zero
-        if self.delay_interval:
-            time.sleep(self.delay_interval)
+        # Apply the current delay to future requests in this download slot,
+        # on top of any delay that the spider sets for itself
+        slot = spider.crawler.engine.downloader.slots.get(request.meta.get("download_slot"))
+        if slot:
+            slot.delay = getattr(spider, "download_delay", self.download_delay) + self.delay_interval
         return super().process_response(request, response, spider)
@@ -0,0 +1,97 @@
+import json
+import re
+from collections import OrderedDict, namedtuple
+
+NUMBER = re.compile(r"\d+")
+
+# Request headers which are set by Scrapy itself or are specific to the browser's connection
+IGNORED_HEADERS = {"content-length", "cookie", "host", "user-agent"}
+
+XhrRequest = namedtuple("XhrRequest", ["url", "headers"])
+
+
+def xhr_requests_from_performance_log(entries):
+    """GET requests made by page scripts (XHR or fetch), in the order they were sent, from a Chrome performance log"""
+    requests = []
+    for entry in entries:
+        message = json.loads(entry["message"])["message"]
+        if message["method"] != "Network.requestWillBeSent":
+            continue
+        params = message["params"]
+        if params.get("type") not in ("XHR", "Fetch") or params["request"]["method"] != "GET":
+            continue
+        headers = {name: value for name, value in params["request"].get("headers", {}).items()
+                   if not name.startswith(":") and name.lower() not in IGNORED_HEADERS}
+        requests.append(XhrRequest(params["request"]["url"], headers))
+    return requests
+
+
+class PaginationPattern:
+    """URLs of successive pages, which differ only in one number increasing by a fixed step.
+
+    The pattern is described by the URL of the last page seen, the position
+    of the page number among the numbers in that URL, and the step. Any
+    headers sent by the browser with that request are kept for replaying it.
+    """
+    def __init__(self, url, index, step, headers=None):
+        self.url = url
+        self.index = index
+        self.step = step
+        self.headers = headers or {}
+        self.parts = NUMBER.split(url)
+        self.numbers = NUMBER.findall(url)
+
+    def page_url(self, n_pages):
+        """URL of the page n_pages after the last page seen"""
+        numbers = list(self.numbers)
+        numbers[self.index] = str(int(numbers[self.index]) + n_pages * self.step)
+        return "".join(part + number for part, number in zip(self.parts, numbers + [""]))
+
+
+def infer_pagination(requests, max_timestamp=10 ** 9):
+    """Find the pagination pattern followed by a sequence of requests, or return None if there isn't one.
+
+    Requests are grouped by the text around the numbers in their URLs. Within
+    the largest group in which exactly one number changes between requests,
+    by the same step each time, that number is taken to be the page number
+    (or offset). Numbers of max_timestamp or more (eg. cache-busting
+    timestamps) are not considered.
+    """
+    groups = OrderedDict()
+    for request in requests:
+        group = groups.setdefault(tuple(NUMBER.split(request.url)), [])
+        if not group or group[-1].url != request.url:
+            group.append(request)
+    for group in sorted(groups.values(), key=len, reverse=True):
+        if len(group) < 2:
+            break
+        numbers = [[int(number) for number in NUMBER.findall(request.url)] for request in group]
+        changing = [index for index, values in enumerate(zip(*numbers))
+                    if len(set(values)) > 1 and max(values) < max_timestamp]
+        if len(changing) != 1:
+            continue
+        steps = {later[changing[0]] - earlier[changing[0]] for earlier, later in zip(numbers, numbers[1:])}
+        if len(steps) == 1 and steps != {0}:
+            return PaginationPattern(group[-1].url, changing[0], steps.pop(), group[-1].headers)
+    return None
+
+
+def html_from_xhr_response(response):
+    """HTML for the articles loaded by a replayed request, which may be an HTML fragment or JSON containing HTML"""
+    text = response.text
+    try:
+        data = json.loads(text)
+    except ValueError:
+        return text
+    fragments = []
+
+    def collect(value):
+        if isinstance(value, dict):
+            value = list(value.values())
+        if isinstance(value, list):
+            for item in value:
+                collect(item)
+        elif isinstance(value, str) and "<" in value:
+            fragments.append(value)
+    collect(data)
+    return "\n".join(fragments)
@@ -5,9 +5,18 @@ See documentation at:
 http://doc.scrapy.org/en/latest/topics/item-pipeline.html
 """
 from .articleblobstorageexporter import ArticleBlobStorageExporter
-from .articlejsonfileexporter import ArticleJsonFileExporter
+from .articlecrawlarchiveexporter import ArticleCrawlArchiveExporter, ArticleJsonFileExporter
+from .articleextractionpipeline import ArticleExtractionPipeline
+from .articlewarcsegmentexporter import ArticleWarcSegmentExporter
+from .nearduplicatepipeline import NearDuplicatePipeline
+from .validatorpipeline import ValidatorPipeline
 
 __all__ = [
     "ArticleBlobStorageExporter",
+    "ArticleCrawlArchiveExporter",
+    "ArticleExtractionPipeline",
     "ArticleJsonFileExporter",
+    "ArticleWarcSegmentExporter",
+    "NearDuplicatePipeline",
+    "ValidatorPipeline",
 ]
@@ -1,49 +1,204 @@
 import hashlib
+import os
 from scrapy.exceptions import NotConfigured
-from ..database import Connector, RecoverableDatabaseError, NonRecoverableDatabaseError, Webpage
+from twisted.internet import defer, reactor, threads
+from twisted.python.failure import Failure
+from twisted.python.threadpool import ThreadPool
+from ..database import Connector, NonRecoverableDatabaseError, RecoverableDatabaseError, Webpage
+from ..extensions import PipelineMetrics
+from ..shared_pool import SharedPool
+from ..state import BlobKeyIndex
+from ..warc import SiteWarcEncoder, ZstdDictionaryStore, dictionary_blob_name
+
+
+def start_thread_pool(n_threads):
+    thread_pool = ThreadPool(minthreads=0, maxthreads=n_threads, name="ArticleBlobStorageExporter")
+    thread_pool.start()
+    return thread_pool
+
+
+# Upload threads shared by the blob storage exporters of every crawler in this process
+UPLOAD_THREADS = SharedPool(start_thread_pool, ThreadPool.stop)
 
 
 class ArticleBlobStorageExporter(Connector):
+    """Upload pages to blob storage and track them in the webpages table, without blocking the crawl.
+
+    Compression, uploads and database writes run in a bounded thread pool,
+    shared between crawlers, and each item's Deferred fires once its upload
+    has finished. Items for a page
+    which is already being uploaded wait for that upload instead. If too many uploads are queued, further items
+    wait, which in turn stops Scrapy from downloading more pages until the
+    queue drains. Webpage entries are added to the database in batches, and
+    any remaining entries are added when the spider closes.
+    """
+    def __init__(self, codec="gzip", state_dir="crawl_state", dictionary_samples=100, blob_key_refresh=24 * 60 * 60,
+                 upload_threads=8, upload_queue_size=32, webpage_batch_size=50, local_storage_dir=None, stats=None):
+        super().__init__(local_storage_dir=local_storage_dir)
+        self.metrics = PipelineMetrics(stats)
+        self.codec = codec
+        self.state_dir = state_dir
+        self.dictionary_samples = dictionary_samples
+        self.blob_key_refresh = blob_key_refresh
+        self.webpage_batch_size = webpage_batch_size
+        self.encoder = None
+        self.blob_keys = None
+        self.uploading = {}
+        self.pending_webpages = []
+        self.upload_threads = upload_threads
+        self.thread_pool = None
+        self.upload_slots = defer.DeferredSemaphore(upload_queue_size)
+        self.database_lock = defer.DeferredLock()
+
     @classmethod
     def from_crawler(cls, crawler):
         exporter = crawler.settings['ARTICLE_EXPORTER']
         if exporter != 'blob':
             # if this isn't specified in settings, the pipeline will be completely disabled
             raise NotConfigured
-        return cls()
+        return cls(crawler.settings.get('WARC_CODEC'),
+                   crawler.settings.get('CRAWL_STATE_DIR'),
+                   crawler.settings.getint('ZSTD_DICTIONARY_SAMPLES'),
+                   crawler.settings.getint('BLOB_KEY_INDEX_REFRESH'),
+                   crawler.settings.getint('BLOB_UPLOAD_THREADS'),
+                   crawler.settings.getint('BLOB_UPLOAD_QUEUE_SIZE'),
+                   crawler.settings.getint('BLOB_WEBPAGE_BATCH_SIZE'),
+                   crawler.settings.get('LOCAL_STORAGE_DIR') or None,
+                   crawler.stats)
+
+    # Initialise pipeline when crawler opened
+    def open_spider(self, spider):
+        if self.codec == "zstd":
+            dictionaries = ZstdDictionaryStore(os.path.join(self.state_dir, "zstd_dictionaries"))
+            self.encoder = SiteWarcEncoder(spider.config['site_name'], dictionaries,
+                                           self.dictionary_samples, on_trained=self.upload_dictionary)
+            spider.logger.info("Compressing WARC files with zstd dictionary: {}".format(self.encoder.dictionary_name))
+        self.thread_pool = UPLOAD_THREADS.get(self.upload_threads)
+
+        # Load the index of blobs that have already been uploaded, rebuilding it if it is out of date
+        index_dir = self.local_storage_dir or self.state_dir
+        self.blob_keys = BlobKeyIndex(os.path.join(index_dir, "{}_blob_keys.sqlite3".format(self.blob_container_name)),
+                                      self.blob_key_refresh)
+        if self.blob_keys.is_stale():
+            # Listing a large container takes a while, so do it in an upload thread. Scrapy waits for
+            # this Deferred before sending any items, so the index is not in use while it is rebuilt.
+            spider.logger.info("Refreshing index of blobs in container: {}".format(self.blob_container_name))
+            deferred = threads.deferToThreadPool(reactor, self.thread_pool, self.refresh_blob_keys)
+        else:
+            deferred = defer.succeed(None)
+        deferred.addCallback(lambda _: spider.logger.info("Loaded index of {} existing blobs".format(len(self.blob_keys))))
+        return deferred
+
+    def refresh_blob_keys(self):
+        self.blob_keys.refresh(blob.name for blob in self.block_blob_service.list_blobs(self.blob_container_name))
+
+    # Tidy up after crawler closed
+    def close_spider(self, spider):
+        # Scrapy waits for all items to finish before closing, so only the last webpage entries remain
+        deferred = self.flush_webpages(spider)
+        deferred.addBoth(self.shutdown)
+        return deferred
+
+    def shutdown(self, result):
+        self.blob_keys.close()
+        return result
+
+    def upload_dictionary(self, name):
+        '''Upload a newly trained dictionary so that WARC files compressed with it can be read elsewhere
+
+        Called from an upload thread by the encoder, before any page compressed with the dictionary is uploaded.
+        '''
+        # Dictionary names include a digest of their contents, so an existing blob with this name is the same dictionary
+        if self.block_blob_service.exists(self.blob_container_name, dictionary_blob_name(name)):
+            return
+        self.block_blob_service.create_blob_from_path(self.blob_container_name, dictionary_blob_name(name),
+                                                      self.encoder.dictionaries.path(name))
 
     def process_item(self, crawl_response, spider):
-        '''Add an article to blob storage and track it in the database'''
-        # Construct blob data and associated key
-        blob_data = crawl_response["warc_data"]
+        '''Add an article to blob storage and track it in the database, once an upload slot is free'''
+        return self.metrics.tracked(len(crawl_response["warc_data"]),
+                                    self.upload_slots.run(self.export_item, crawl_response, spider))
+
+    def export_item(self, crawl_response, spider):
+        # Construct blob key
         blob_key = hashlib.md5(crawl_response["url"].encode("utf-8")).hexdigest()
 
-        # Check whether blob already exists and add it if not
-        if list(self.block_blob_service.list_blobs(self.blob_container_name, blob_key)):
+        # Check whether blob already exists (or is being uploaded) and add it if not
+        if blob_key in self.blob_keys:
             spider.logger.info("  refusing to overwrite file that already exists in blob storage: {}".format(crawl_response["url"]))
+            deferred = defer.succeed(None)
+        elif blob_key in self.uploading:
+            # Only add a webpage entry once the original upload has succeeded
+            spider.logger.info("  waiting for upload of WARC file already in progress for: {}".format(crawl_response["url"]))
+            deferred = defer.Deferred()
+            self.uploading[blob_key].append(deferred)
         else:
             spider.logger.info("  uploading WARC file for: {}".format(crawl_response["url"]))
-            self.block_blob_service.create_blob_from_text(self.blob_container_name, blob_key, blob_data)
+            self.uploading[blob_key] = []
+            deferred = self.metrics.timed("upload", threads.deferToThreadPool(
+                reactor, self.thread_pool, self.upload_blob, blob_key, crawl_response["warc_data"]))
+            deferred.addCallback(lambda _: self.blob_keys.add(blob_key))
+            deferred.addBoth(self.upload_finished, blob_key)
+        deferred.addCallback(self.add_webpage, crawl_response, spider, blob_key)
+        return deferred
 
-        # Construct webpage table entry
-        webpage_data = Webpage(
+    def upload_blob(self, blob_key, warc_data):
+        '''Compress and upload WARC data, from an upload thread'''
+        if self.encoder:
+            warc_data = self.encoder.encode(warc_data)
+        self.block_blob_service.create_blob_from_text(self.blob_container_name, blob_key, warc_data)
+
+    def upload_finished(self, result, blob_key):
+        for waiting in self.uploading.pop(blob_key):
+            if isinstance(result, Failure):
+                waiting.errback(result)
+            else:
+                waiting.callback(None)
+        return result
+
+    def add_webpage(self, _, crawl_response, spider, blob_key):
+        '''Queue a webpage table entry, adding a batch to the database once enough are queued'''
+        self.pending_webpages.append(Webpage(
             site_name=crawl_response["site_name"],
             article_url=crawl_response["url"],
             crawl_id=crawl_response["crawl_id"],
             crawl_datetime=crawl_response["crawl_datetime"],
             blob_key=blob_key,
-        )
+        ))
+        # The item that fills a batch waits for it to be added, so that slow database writes also apply back-pressure
+        if len(self.pending_webpages) >= self.webpage_batch_size:
+            deferred = self.flush_webpages(spider)
+        else:
+            deferred = defer.succeed(None)
+        deferred.addCallback(lambda _: spider.logger.info("Finished processing: {}".format(crawl_response["url"])))
+        deferred.addCallback(lambda _: crawl_response)
+        return deferred
+
+    def flush_webpages(self, spider):
+        '''Add all queued webpage entries to the database in a single transaction'''
+        webpages, self.pending_webpages = self.pending_webpages, []
+        if not webpages:
+            return defer.succeed(None)
+        deferred = self.database_lock.run(self.insert_webpages, webpages)
+        deferred.addCallback(self.webpages_added, webpages, spider)
+        deferred.addErrback(self.webpages_failed, spider)
+        return deferred
+
+    def insert_webpages(self, webpages):
+        return self.metrics.timed("db_insert", threads.deferToThreadPool(reactor, self.thread_pool, self.add_entries, webpages))
 
-        # Add webpage entry to database
-        try:
-            self.add_entry(webpage_data)
-            spider.logger.info("  added database entry for: {}".format(crawl_response["url"]))
-        except RecoverableDatabaseError as err:
+    @staticmethod
+    def webpages_added(errors, webpages, spider):
+        for err in errors:
             spider.logger.info(str(err))
-        except NonRecoverableDatabaseError as err:
-            spider.request_closure = True
-            spider.logger.critical(str(err))
+        spider.logger.info("  added {} database entries".format(len(webpages) - len(errors)))
 
-        # Log end of item processing and return the item
-        spider.logger.info("Finished processing: {}".format(crawl_response["url"]))
-        return crawl_response
+    @staticmethod
+    def webpages_failed(failure, spider):
+        failure.trap(RecoverableDatabaseError, NonRecoverableDatabaseError)
+        if failure.check(RecoverableDatabaseError):
+            # eg. no database configured: log and carry on crawling, as when entries were added one at a time
+            spider.logger.info(str(failure.value))
+            return
+        spider.request_closure = True
+        spider.logger.critical(str(failure.value))
@@ -0,0 +1,65 @@
+import os
+from scrapy.exceptions import NotConfigured
+from scrapy.utils.job import job_dir
+from ..warc import RotatingCrawlArchiveWriter, SiteWarcEncoder, ZstdDictionaryStore, crawl_archive_paths
+
+
+class ArticleCrawlArchiveExporter():
+    """Export pages to size-rotated local binary crawl archives for each site.
+
+    Each page's metadata is stored as JSON next to its raw WARC data, which
+    can then be streamed back by the WarcParser without base64 decoding.
+    """
+    def __init__(self, max_archive_size=256 * 1024 * 1024, fsync_interval=30, codec="gzip", state_dir="crawl_state",
+                 dictionary_samples=100, resumable=False):
+        self.max_archive_size = max_archive_size
+        self.fsync_interval = fsync_interval
+        self.codec = codec
+        self.state_dir = state_dir
+        self.dictionary_samples = dictionary_samples
+        self.resumable = resumable
+        self.exporter = None
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        exporter = crawler.settings['ARTICLE_EXPORTER']
+        if exporter != 'file':
+            # if this isn't specified in settings, the pipeline will be completely disabled
+            raise NotConfigured
+        return cls(crawler.settings.getint('LOCAL_ARCHIVE_SIZE'),
+                   crawler.settings.getint('LOCAL_ARCHIVE_FSYNC_INTERVAL'),
+                   crawler.settings.get('WARC_CODEC'),
+                   crawler.settings.get('CRAWL_STATE_DIR'),
+                   crawler.settings.getint('ZSTD_DICTIONARY_SAMPLES'),
+                   bool(job_dir(crawler.settings)))
+
+    # Initialise pipeline when crawler opened
+    def open_spider(self, spider):
+        output_dir = "webpages"
+        prefix = "{}_extracted".format(spider.config['site_name'])
+        # Replace the output of any previous crawl of this site, unless this
+        # crawl may be resuming, in which case we add further archives to it
+        if not self.resumable:
+            for path in crawl_archive_paths(output_dir, prefix):
+                os.remove(path)
+        encoder = None
+        if self.codec == "zstd":
+            dictionaries = ZstdDictionaryStore(os.path.join(self.state_dir, "zstd_dictionaries"))
+            encoder = SiteWarcEncoder(spider.config['site_name'], dictionaries, self.dictionary_samples)
+        self.exporter = RotatingCrawlArchiveWriter(output_dir, prefix, self.max_archive_size, self.fsync_interval, encoder)
+
+    # Tidy up after crawler closed
+    def close_spider(self, spider):
+        self.exporter.close()
+        del spider  # supress unused argument warning
+
+    def process_item(self, crawl_response, spider):
+        spider.logger.info('  preparing to save response to local file')
+        metadata = {key: value for key, value in crawl_response.items() if key != "warc_data"}
+        self.exporter.write(metadata, crawl_response["warc_data"])
+        spider.logger.info("Finished processing: {}".format(crawl_response["url"]))
+        return crawl_response
+
+
+# Former name, from when pages were exported as JSON lines, kept for existing settings files
+ArticleJsonFileExporter = ArticleCrawlArchiveExporter
@@ -0,0 +1,141 @@
+import json
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import suppress
+from dateutil import parser
+from scrapy.exceptions import NotConfigured
+from twisted.internet import defer, reactor, threads
+from twisted.python.failure import Failure
+from ..database import Article, Connector, NonRecoverableDatabaseError
+from ..extensions import PipelineMetrics
+from ..extractors import extract_article
+from ..shared_pool import SharedPool
+from ..warc import LazyWarcResponse
+from ..warc.crawl_file import CrawlFile
+
+
+def extract_article_from_warc(crawl_response, config, content_digests, node_indexes):
+    '''Extract an article from the WARC data of a crawled page, returning None if there isn't one'''
+    db_entry = CrawlFile(
+        article_url=crawl_response["url"],
+        crawl_id=crawl_response["crawl_id"],
+        crawl_datetime=parser.parse(crawl_response["crawl_datetime"]),
+        site_name=crawl_response["site_name"],
+        warc_data=crawl_response["warc_data"],
+    )
+    article = extract_article(LazyWarcResponse(db_entry.warc_data), config, db_entry, content_digests, node_indexes)
+    if not article["content"]:
+        return None
+    with suppress(KeyError):
+        article["plain_text"] = json.dumps(article["plain_text"])
+    with suppress(KeyError):
+        article["metadata"] = json.dumps(article["metadata"])
+    return article
+
+
+# Worker processes shared by the extraction pipelines of every crawler in this process
+WORKER_PROCESSES = SharedPool(lambda n_processes: ProcessPoolExecutor(max_workers=n_processes), ProcessPoolExecutor.shutdown)
+
+
+def deferred_from_future(future):
+    '''Wrap a concurrent.futures Future in a Deferred which fires in the reactor thread'''
+    deferred = defer.Deferred()
+
+    def done(future):
+        if future.exception():
+            reactor.callFromThread(deferred.errback, Failure(future.exception()))
+        else:
+            reactor.callFromThread(deferred.callback, future.result())
+    future.add_done_callback(done)
+    return deferred
+
+
+class ArticleExtractionPipeline(Connector):
+    """Extract articles from pages as they are crawled and add them to the articles table.
+
+    Extraction runs in a pool of worker processes so that it does not block
+    the crawl, and each page is only parsed once. This replaces running
+    populate_article_db.py after the crawl. Articles are added to the
+    database in batches, and any remaining articles when the spider closes.
+    """
+    def __init__(self, n_processes=4, batch_size=20, content_digests=False, node_indexes=False, local_storage_dir=None,
+                 stats=None):
+        super().__init__(local_storage_dir=local_storage_dir)
+        self.metrics = PipelineMetrics(stats)
+        self.n_processes = n_processes
+        self.batch_size = batch_size
+        self.content_digests = content_digests
+        self.node_indexes = node_indexes
+        self.executor = None
+        self.extraction_slots = defer.DeferredSemaphore(2 * n_processes)
+        self.database_lock = defer.DeferredLock()
+        self.pending_articles = []
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        if not crawler.settings.getbool('ARTICLE_EXTRACTION'):
+            # if this isn't specified in settings, the pipeline will be completely disabled
+            raise NotConfigured
+        return cls(crawler.settings.getint('ARTICLE_EXTRACTION_PROCESSES'),
+                   crawler.settings.getint('ARTICLE_EXTRACTION_BATCH_SIZE'),
+                   crawler.settings.getbool('CONTENT_DIGESTS'),
+                   crawler.settings.getbool('NODE_INDEXES'),
+                   crawler.settings.get('LOCAL_STORAGE_DIR') or None,
+                   crawler.stats)
+
+    # Initialise pipeline when crawler opened
+    def open_spider(self, spider):
+        self.executor = WORKER_PROCESSES.get(self.n_processes)
+        spider.logger.info("Extracting articles with {} shared worker processes".format(self.n_processes))
+
+    # Tidy up after crawler closed. The worker processes are left running for
+    # any other crawlers and are shut down when the reactor stops.
+    def close_spider(self, spider):
+        return self.flush_articles(spider)
+
+    def process_item(self, crawl_response, spider):
+        '''Extract an article from a page, once a worker process is available'''
+        return self.metrics.tracked(len(crawl_response["warc_data"]),
+                                    self.extraction_slots.run(self.extract_item, crawl_response, spider))
+
+    def extract_item(self, crawl_response, spider):
+        # Pass the worker process a plain dict of the item fields rather than the Scrapy item
+        future = self.executor.submit(extract_article_from_warc, dict(crawl_response), spider.config,
+                                      self.content_digests, self.node_indexes)
+        deferred = self.metrics.timed("extraction", deferred_from_future(future))
+        deferred.addCallback(self.add_article, crawl_response, spider)
+        return deferred
+
+    def add_article(self, article, crawl_response, spider):
+        '''Queue an extracted article, adding a batch to the database once enough are queued'''
+        if not article:
+            spider.logger.info("  no article found for: {}".format(crawl_response["url"]))
+            return crawl_response
+        spider.logger.info("  extracted article from: {}".format(crawl_response["url"]))
+        self.pending_articles.append(Article(**article))
+        deferred = defer.succeed(None)
+        if len(self.pending_articles) >= self.batch_size:
+            deferred = self.flush_articles(spider)
+        deferred.addCallback(lambda _: crawl_response)
+        return deferred
+
+    def flush_articles(self, spider):
+        '''Add all queued articles to the database in a single transaction'''
+        articles, self.pending_articles = self.pending_articles, []
+        if not articles:
+            return defer.succeed(None)
+        deferred = self.database_lock.run(lambda: self.metrics.timed("db_insert", threads.deferToThread(self.add_entries, articles)))
+        deferred.addCallback(self.articles_added, articles, spider)
+        deferred.addErrback(self.articles_failed, spider)
+        return deferred
+
+    @staticmethod
+    def articles_added(errors, articles, spider):
+        for err in errors:
+            spider.logger.info(str(err))
+        spider.logger.info("  added {} articles to the database".format(len(articles) - len(errors)))
+
+    @staticmethod
+    def articles_failed(failure, spider):
+        failure.trap(NonRecoverableDatabaseError)
+        spider.request_closure = True
+        spider.logger.critical(str(failure.value))
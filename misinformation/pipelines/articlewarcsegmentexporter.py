@@ -0,0 +1,108 @@
+import datetime
+import os
+from scrapy.exceptions import NotConfigured
+from twisted.internet import threads
+from ..database import Connector, RecoverableDatabaseError, NonRecoverableDatabaseError, Webpage
+from ..extensions import PipelineMetrics
+from ..warc import WarcSegmentWriter, write_cdxj_index
+
+
+class ArticleWarcSegmentExporter(Connector):
+    """Export pages into size-rotated multi-record WARC segments instead of one file per page.
+
+    Segments are written to 'webpages/<site name>/'. If uploading is enabled,
+    each segment is uploaded to blob storage as a single blob once it is
+    closed, and a webpages table entry pointing at the byte range of each page
+    within the segment is added. A CDXJ index of each segment's response
+    records is written (and uploaded) alongside it for random access. This
+    work runs in a worker thread, and the item which caused a segment to be
+    closed waits for it to finish, so slow uploads pause the crawl.
+    """
+    def __init__(self, max_segment_size, upload, local_storage_dir=None, stats=None):
+        super().__init__(local_storage_dir=local_storage_dir)
+        self.metrics = PipelineMetrics(stats)
+        self.max_segment_size = max_segment_size
+        self.upload = upload
+        self.writer = None
+        self.spider = None
+        self.pending_webpages = []
+        self.segment_export = None
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        exporter = crawler.settings['ARTICLE_EXPORTER']
+        if exporter != 'segments':
+            # if this isn't specified in settings, the pipeline will be completely disabled
+            raise NotConfigured
+        return cls(crawler.settings.getint('WARC_SEGMENT_SIZE'), crawler.settings.getbool('WARC_SEGMENT_UPLOAD'),
+                   crawler.settings.get('LOCAL_STORAGE_DIR') or None,
+                   crawler.stats)
+
+    # Initialise pipeline when crawler opened
+    def open_spider(self, spider):
+        self.spider = spider
+        site_name = spider.config['site_name']
+        output_dir = os.path.join("webpages", site_name)
+        prefix = "{}-{}".format(site_name, datetime.datetime.utcnow().strftime("%Y%m%d%H%M%S"))
+        self.writer = WarcSegmentWriter(output_dir, prefix, self.max_segment_size, self.segment_closed)
+
+    # Tidy up after crawler closed
+    def close_spider(self, spider):
+        self.segment_export = None
+        self.writer.close()
+        del spider  # supress unused argument warning
+        return self.segment_export
+
+    def process_item(self, crawl_response, spider):
+        '''Append an article to the current WARC segment'''
+        self.segment_export = None
+        segment_name, offset, length = self.writer.write(crawl_response["url"], crawl_response["warc_data"])
+        spider.logger.info("  appended WARC records to {} at offset {}".format(segment_name, offset))
+        if self.upload:
+            self.pending_webpages.append(Webpage(
+                site_name=crawl_response["site_name"],
+                article_url=crawl_response["url"],
+                crawl_id=crawl_response["crawl_id"],
+                crawl_datetime=crawl_response["crawl_datetime"],
+                blob_key=self.segment_blob_key(segment_name, offset, length),
+            ))
+        spider.logger.info("Finished processing: {}".format(crawl_response["url"]))
+        if self.segment_export is None:
+            return crawl_response
+        # Wait for the previous segment to be exported
+        return self.segment_export.addCallback(lambda _: crawl_response)
+
+    def segment_closed(self, segment_path, records):
+        '''Index a completed segment, then upload it and track each of its pages in the database'''
+        self.spider.logger.info("Closed WARC segment {} containing {} pages".format(segment_path, len(records)))
+        # Segments are closed before the next page is appended, so every pending entry belongs to this segment
+        webpages, self.pending_webpages = self.pending_webpages, []
+        self.segment_export = threads.deferToThread(write_cdxj_index, segment_path)
+        if self.upload:
+            self.segment_export.addCallback(self.upload_segment, segment_path)
+            self.segment_export.addCallback(self.insert_webpages, webpages)
+
+    def upload_segment(self, cdxj_path, segment_path):
+        blob_name = os.path.basename(segment_path)
+        self.spider.logger.info("  uploading WARC segment: {}".format(blob_name))
+        return self.metrics.timed("upload", threads.deferToThread(self.upload_files, segment_path, cdxj_path))
+
+    def upload_files(self, *paths):
+        for path in paths:
+            self.block_blob_service.create_blob_from_path(self.blob_container_name, os.path.basename(path), path)
+
+    def insert_webpages(self, _, webpages):
+        return self.metrics.timed("db_insert", threads.deferToThread(self.add_webpages, webpages))
+
+    def add_webpages(self, webpages):
+        '''Add webpage entries for a segment to the database, stopping the crawl if the database is unavailable'''
+        for webpage_data in webpages:
+            try:
+                self.add_entry(webpage_data)
+                self.spider.logger.info("  added database entry for: {}".format(webpage_data.article_url))
+            except RecoverableDatabaseError as err:
+                self.spider.logger.info(str(err))
+            except NonRecoverableDatabaseError as err:
+                self.spider.request_closure = True
+                self.spider.logger.critical(str(err))
+                break
@@ -0,0 +1,20 @@
+from scrapy.exceptions import NotConfigured
+
+
+class NearDuplicatePipeline():
+    """Record the fingerprint of each page once it has been exported.
+
+    This runs after the exporters, so pages which fail to export are not
+    indexed and their near-duplicates will still be archived later.
+    """
+    @classmethod
+    def from_crawler(cls, crawler):
+        if not crawler.settings.getbool('NEAR_DUPLICATE_DETECTION'):
+            # if this isn't specified in settings, the pipeline will be completely disabled
+            raise NotConfigured
+        return cls()
+
+    def process_item(self, crawl_response, spider):
+        if crawl_response.get("simhash") is not None:
+            spider.near_duplicate_index.add(crawl_response["url"], crawl_response["simhash"])
+        return crawl_response
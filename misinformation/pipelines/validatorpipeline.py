@@ -0,0 +1,20 @@
+from scrapy.exceptions import NotConfigured
+
+
+class ValidatorPipeline():
+    """Record the HTTP validators of each page once it has been exported.
+
+    This runs after the exporters, so pages which fail to export are not
+    recorded as unchanged and will be fetched in full by the next crawl.
+    """
+    @classmethod
+    def from_crawler(cls, crawler):
+        if not crawler.settings.getbool('CONDITIONAL_REQUESTS'):
+            # if this isn't specified in settings, the pipeline will be completely disabled
+            raise NotConfigured
+        return cls()
+
+    def process_item(self, crawl_response, spider):
+        if crawl_response.get("validators"):
+            spider.validator_store.record(**crawl_response["validators"])
+        return crawl_response
@@ -0,0 +1,8 @@
+"""
+This module contains functionality for scheduling crawls of many sites
+"""
+from .multi_site_scheduler import MultiSiteScheduler
+
+__all__ = [
+    "MultiSiteScheduler",
+]
@@ -0,0 +1,147 @@
+import datetime
+import logging
+from collections import deque
+from twisted.internet import task
+
+
+class SiteCrawl():
+    """Book-keeping for a single site within a multi-site crawl."""
+    def __init__(self, spider_class, config, weight=1):
+        self.spider_class = spider_class
+        self.config = config
+        self.weight = weight
+        self.concurrency = None
+        self.crawler = None
+        self.status = "queued"
+        self.start_time = None
+        self.end_time = None
+
+    @property
+    def site_name(self):
+        return self.config["site_name"]
+
+    @property
+    def elapsed(self):
+        if not self.start_time:
+            return datetime.timedelta(0)
+        end_time = self.end_time if self.end_time else datetime.datetime.utcnow()
+        # Truncate to whole seconds for display
+        return datetime.timedelta(seconds=int((end_time - self.start_time).total_seconds()))
+
+    def stat(self, name):
+        if not self.crawler:
+            return 0
+        return self.crawler.stats.get_value(name, 0)
+
+
+class MultiSiteScheduler():
+    """Run crawls of many sites in a single process with per-site budgets and a global request cap.
+
+    Each site is given a concurrency budget (the same for every site with
+    'equal' fairness, or proportional to its 'crawl_weight' with
+    'weighted' fairness). Sites are admitted first-in, first-out (heaviest
+    first for 'weighted' fairness) until the sum of the budgets of the running
+    sites would exceed the global request cap, and the next site in the queue
+    is started whenever a running site finishes. A site's budget only ever
+    lowers the concurrency that it would otherwise use. Optional per-site time
+    budgets stop any single site from dominating the wall-clock time of the
+    full sweep.
+    """
+    def __init__(self, process, global_concurrency=64, site_concurrency=8,
+                 fairness="equal", site_timeout=0, progress_interval=60):
+        if fairness not in ("equal", "weighted"):
+            raise ValueError("Unknown fairness policy '{}'".format(fairness))
+        self.process = process
+        self.global_concurrency = global_concurrency
+        self.site_concurrency = site_concurrency
+        self.fairness = fairness
+        self.site_timeout = site_timeout
+        self.progress_interval = progress_interval
+        self.sites = []
+        self.queue = deque()
+        self.progress_loop = None
+
+    def add_site(self, spider_class, config):
+        """Add a site to the end of the crawl queue."""
+        weight = config.get("crawl_weight", 1) if self.fairness == "weighted" else 1
+        self.sites.append(SiteCrawl(spider_class, config, weight))
+
+    def concurrency_budget(self, site):
+        """Number of concurrent requests that this site is allowed.
+
+        This is never more than the site would use without the scheduler (eg.
+        the CONCURRENT_REQUESTS set in its spider's custom settings).
+        """
+        site_concurrency = site.spider_class.custom_settings.get("CONCURRENT_REQUESTS",
+                                                                 self.process.settings.getint("CONCURRENT_REQUESTS"))
+        return min(max(1, int(round(self.site_concurrency * site.weight))), self.global_concurrency, site_concurrency)
+
+    @property
+    def active_concurrency(self):
+        return sum(site.concurrency for site in self.sites if site.status == "running")
+
+    def start(self):
+        """Queue up all sites and start as many as the global request cap allows.
+
+        This must be called before the crawler process is started.
+        """
+        sites = self.sites
+        if self.fairness == "weighted":
+            sites = sorted(sites, key=lambda site: site.weight, reverse=True)
+        self.queue.extend(sites)
+        self.start_next_sites()
+        if self.progress_interval > 0:
+            self.progress_loop = task.LoopingCall(self.log_progress)
+            self.progress_loop.start(self.progress_interval, now=False)
+
+    def start_next_sites(self):
+        """Start queued sites until we run out of sites or reach the global request cap."""
+        while self.queue:
+            site = self.queue[0]
+            budget = self.concurrency_budget(site)
+            if self.active_concurrency and self.active_concurrency + budget > self.global_concurrency:
+                break
+            self.queue.popleft()
+            self.start_site(site, budget)
+
+    def start_site(self, site, budget):
+        """Apply per-site budgets and register this site with the crawler process."""
+        site.concurrency = budget
+        site.spider_class.custom_settings["CONCURRENT_REQUESTS"] = budget
+        if self.site_timeout:
+            site.spider_class.custom_settings["CLOSESPIDER_TIMEOUT"] = self.site_timeout
+        site.crawler = self.process.create_crawler(site.spider_class)
+        site.status = "running"
+        site.start_time = datetime.datetime.utcnow()
+        logging.info("Starting crawl of %s with %s concurrent requests (%s sites queued)",
+                     site.site_name, budget, len(self.queue))
+        deferred = self.process.crawl(site.crawler, config=site.config)
+        deferred.addBoth(self.site_finished, site)
+
+    def site_finished(self, result, site):
+        """Record that a site has finished and start the next ones in the queue."""
+        site.status = "finished"
+        site.end_time = datetime.datetime.utcnow()
+        logging.info("Finished crawl of %s in %s", site.site_name, site.elapsed)
+        self.start_next_sites()
+        if not self.queue and not any(site.status == "running" for site in self.sites):
+            if self.progress_loop and self.progress_loop.running:
+                self.progress_loop.stop()
+            self.log_progress()
+        return result
+
+    def log_progress(self):
+        """Log a table showing the progress of every site that has been started."""
+        row_format = "{:<30} {:>9} {:>11} {:>9} {:>9} {:>12}"
+        logging.info(row_format.format("site", "status", "concurrency", "pages", "articles", "elapsed"))
+        for site in self.sites:
+            if site.status == "queued":
+                continue
+            logging.info(row_format.format(site.site_name, site.status, site.concurrency,
+                                           site.stat("response_received_count"),
+                                           site.stat("item_scraped_count"),
+                                           str(site.elapsed)))
+        logging.info("%s sites running, %s finished and %s queued using %s/%s concurrent requests",
+                     sum(site.status == "running" for site in self.sites),
+                     sum(site.status == "finished" for site in self.sites),
+                     len(self.queue), self.active_concurrency, self.global_concurrency)
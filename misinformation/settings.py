@@ -59,6 +59,44 @@ CONCURRENT_REQUESTS = 8
 # Ensure exporters write unicode rather than ASCII encoded output
 FEED_EXPORT_ENCODING = 'utf-8'
 
+# Directory used to persist crawl state (eg. HTTP validators) between crawls
+CRAWL_STATE_DIR = 'crawl_state'
+
+# Send conditional requests using validators stored by previous crawls
+CONDITIONAL_REQUESTS = False
+
+# Skip sitemap entries which are older than the newest entry seen in the previous crawl
+INCREMENTAL_SITEMAPS = False
+
+# Maximum number of sitemap entries to hold in memory at once when streaming
+# sitemaps. Setting this to 0 parses each sitemap as a single document instead.
+SITEMAP_MAX_PARSED_ENTRIES = 1000
+
+# Crawl links which are likely to be articles first, learning which parts of
+# each site are most likely to contain articles as the crawl progresses
+PRIORITISE_ARTICLE_LINKS = False
+
+# Identify articles by the canonical URL that they declare with rel=canonical
+# or og:url. This is also used for deduplication and as the blob key, so it is
+# off by default to keep the URLs (and blob keys) of existing crawls stable.
+USE_DECLARED_CANONICAL_URLS = False
+
+# Record pages whose content is within NEAR_DUPLICATE_MAX_DISTANCE bits (out of
+# 64) of an already archived page as aliases instead of archiving them again
+NEAR_DUPLICATE_DETECTION = False
+NEAR_DUPLICATE_MAX_DISTANCE = 3
+
+# Crawl frontier shared between several crawler processes on one host for the
+# same site. This is used when SCHEDULER is set to the SharedFrontierScheduler,
+# together with the SharedFrontierMiddleware in DOWNLOADER_MIDDLEWARES and the
+# SharedFrontierSpiderMiddleware in SPIDER_MIDDLEWARES (both before any others).
+SHARED_FRONTIER_BACKEND = 'misinformation.frontier.SQLiteFrontier'
+SHARED_FRONTIER_PATH = 'crawl_state/frontier.sqlite'
+SHARED_FRONTIER_BATCH_SIZE = 16
+SHARED_FRONTIER_LEASE_SECONDS = 600
+SHARED_FRONTIER_MAX_ATTEMPTS = 3
+SHARED_FRONTIER_WORKER_ID = ''
+
 # Enable or disable spider middlewares
 # See https://doc.scrapy.org/en/latest/topics/spider-middleware.html
 # SPIDER_MIDDLEWARES = {
@@ -75,19 +113,76 @@ DOWNLOADER_MIDDLEWARES = {
 # This does not work as all the code is Python 2 and I haven't managed to port it to Python 3
 # DOWNLOADER_MIDDLEWARES = {'warcmiddleware.WarcMiddleware': 820}
 
+# Number of headless browsers used by the ButtonPressMiddleware to render
+# pages with buttons in parallel, and the number of pages each browser renders
+# before it is replaced with a new one (0 for no limit)
+BUTTON_PRESS_BROWSERS = 2
+BUTTON_PRESS_PAGES_PER_BROWSER = 20
+
 # Enable or disable extensions
 # See https://doc.scrapy.org/en/latest/topics/extensions.html
 EXTENSIONS = {
-    'scrapy.extensions.closespider.CloseSpider': 500
+    'scrapy.extensions.closespider.CloseSpider': 500,
+    'scrapy.extensions.spiderstate.SpiderState': None,
+    'misinformation.extensions.AtomicSpiderState': 0,
+    'misinformation.extensions.PipelineMonitor': 500,
 }
 
+# Interval in seconds between logging the state of the item pipelines (0 to
+# disable) and the number of bytes of pages being processed by the pipelines
+# above which the number of concurrent requests is reduced (0 to disable)
+PIPELINE_MONITOR_INTERVAL = 60
+PIPELINE_MAX_BYTES_IN_FLIGHT = 100 * 1024 * 1024
+
 # Configure item pipelines
 # See https://doc.scrapy.org/en/latest/topics/item-pipeline.html
 ITEM_PIPELINES = {
     'misinformation.pipelines.ArticleBlobStorageExporter': 300,
-    'misinformation.pipelines.ArticleJsonFileExporter': 300,
+    'misinformation.pipelines.ArticleCrawlArchiveExporter': 300,
+    'misinformation.pipelines.ArticleWarcSegmentExporter': 300,
+    'misinformation.pipelines.NearDuplicatePipeline': 350,
+    'misinformation.pipelines.ValidatorPipeline': 360,
+    'misinformation.pipelines.ArticleExtractionPipeline': 400,
 }
 
+# Extract articles from pages during the crawl, using a pool of worker
+# processes, and add them to the database in batches
+ARTICLE_EXTRACTION = False
+ARTICLE_EXTRACTION_PROCESSES = 4
+ARTICLE_EXTRACTION_BATCH_SIZE = 20
+
+# Maximum size in bytes of each WARC segment written by the 'segments' exporter
+# and whether to upload completed segments to blob storage
+WARC_SEGMENT_SIZE = 100 * 1024 * 1024
+WARC_SEGMENT_UPLOAD = False
+
+# Directory for a local blob store and SQLite database to use in place of Azure
+# blob storage and the Azure SQL database (leave empty to use Azure)
+LOCAL_STORAGE_DIR = ''
+
+# Maximum size in bytes of each local archive written by the 'file' exporter
+# and the maximum number of seconds between syncing it to disk
+LOCAL_ARCHIVE_SIZE = 256 * 1024 * 1024
+LOCAL_ARCHIVE_FSYNC_INTERVAL = 30
+
+# Compression for WARC files written by the 'blob' and 'file' exporters: either 'gzip' or
+# 'zstd'. With 'zstd', a dictionary is trained for each site from its first
+# ZSTD_DICTIONARY_SAMPLES pages and stored in CRAWL_STATE_DIR
+WARC_CODEC = 'gzip'
+ZSTD_DICTIONARY_SAMPLES = 100
+
+# Maximum age in seconds of the local index of blob keys (kept in CRAWL_STATE_DIR)
+# used by the 'blob' exporter before it is rebuilt from a listing of the container
+BLOB_KEY_INDEX_REFRESH = 24 * 60 * 60
+
+# Number of threads used by the 'blob' exporter for uploads (shared by all sites
+# crawled in one process), the number of uploads that can be queued for each
+# site before its crawl is paused and the number of
+# webpage entries added to the database in each transaction
+BLOB_UPLOAD_THREADS = 8
+BLOB_UPLOAD_QUEUE_SIZE = 32
+BLOB_WEBPAGE_BATCH_SIZE = 50
+
 # Enable and configure the AutoThrottle extension (disabled by default)
 # See https://doc.scrapy.org/en/latest/topics/autothrottle.html
 # AUTOTHROTTLE_ENABLED = True
@@ -0,0 +1,26 @@
+from twisted.internet import reactor
+
+
+class SharedPool():
+    """A pool of workers shared by every crawler in this process.
+
+    Crawling many sites in one process (eg. with --all) would otherwise start
+    a separate pool for every site. The pool is created by the start function
+    on first use and passed to the stop function when the reactor stops.
+    """
+    def __init__(self, start, stop):
+        self.start = start
+        self.stop = stop
+        self.pool = None
+
+    def get(self, *args):
+        """Get the pool, starting it with these arguments if it is not already running."""
+        if self.pool is None:
+            self.pool = self.start(*args)
+            reactor.addSystemEventTrigger("after", "shutdown", self.shutdown)
+        return self.pool
+
+    def shutdown(self):
+        if self.pool is not None:
+            self.stop(self.pool)
+            self.pool = None
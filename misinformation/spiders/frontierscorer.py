@@ -0,0 +1,51 @@
+from urllib.parse import urlparse
+
+
+class FrontierScorer():
+    """Assign crawl priorities to links according to how likely they are to be articles.
+
+    Links are boosted if they match the article URL rules or if they were
+    found inside the 'article_links' section of an index page. On top of this
+    we learn the article yield of each path prefix as the crawl progresses, so
+    that sections of the site which are rich in articles are crawled first.
+    """
+    def __init__(self, is_article, article_weight=50, article_links_weight=25, prefix_yield_weight=25):
+        self.is_article = is_article
+        self.article_weight = article_weight
+        self.article_links_weight = article_links_weight
+        self.prefix_yield_weight = prefix_yield_weight
+        self.n_pages = {}
+        self.n_articles = {}
+
+    @staticmethod
+    def path_prefix(url):
+        """Get the first directory in the URL path, or an empty string for top-level pages."""
+        segments = [segment for segment in urlparse(url).path.split("/") if segment]
+        return segments[0] if len(segments) > 1 else ""
+
+    def prefix_yield(self, url):
+        """Estimate the fraction of pages under this URL's path prefix that are articles.
+
+        We use Laplace smoothing so that unseen prefixes start at 50%.
+        """
+        prefix = self.path_prefix(url)
+        return (self.n_articles.get(prefix, 0) + 1) / (self.n_pages.get(prefix, 0) + 2)
+
+    def score(self, url, in_article_links=False):
+        """Get an integer request priority for this URL, with higher values crawled first."""
+        score = self.prefix_yield_weight * self.prefix_yield(url)
+        if self.is_article(url):
+            score += self.article_weight
+        if in_article_links:
+            score += self.article_links_weight
+        return int(round(score))
+
+    def record_page(self, url):
+        """Record that we have parsed a page from this URL's path prefix."""
+        prefix = self.path_prefix(url)
+        self.n_pages[prefix] = self.n_pages.get(prefix, 0) + 1
+
+    def record_article(self, url):
+        """Record that we have found an article in this URL's path prefix."""
+        prefix = self.path_prefix(url)
+        self.n_articles[prefix] = self.n_articles.get(prefix, 0) + 1
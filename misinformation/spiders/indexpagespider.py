@@ -1,7 +1,9 @@
 from contextlib import suppress
+from scrapy.http import HtmlResponse
 from scrapy.linkextractors import LinkExtractor
 from scrapy.spiders import CrawlSpider, Rule
 from .misinformationmixin import MisinformationMixin
+from .singlepasslinkextractor import SinglePassLinkExtractor
 
 
 class IndexPageSpider(MisinformationMixin, CrawlSpider):
@@ -46,9 +48,12 @@ class IndexPageSpider(MisinformationMixin, CrawlSpider):
                                           attrs=('href', 'data-href', 'data-url'),
                                           **link_kwargs),
                             callback='parse_response')
+        if 'restrict_xpaths' in link_kwargs:
+            self.article_link_rules = (article_rule, )
 
-        # Use both rules
+        # Use both rules, extracting links for both in a single pass
         self.rules = (index_page_rule, article_rule)
+        self.link_extractor = SinglePassLinkExtractor(rule.link_extractor for rule in self.rules)
 
         # Load starting URLs
         self.start_urls = self.load_start_urls(config)
@@ -59,3 +64,22 @@ class IndexPageSpider(MisinformationMixin, CrawlSpider):
         # compiled and self._rules will be empty, even though self.rules will
         # have the right rules present.
         super().__init__(config, *args, **kwargs)
+
+    def _requests_to_follow(self, response):
+        """Follow links in the same way as CrawlSpider, but using a single pass over the page for all rules.
+
+        As in CrawlSpider, a link which matches more than one rule is only
+        followed using the first rule that it matches.
+        """
+        if not isinstance(response, HtmlResponse):
+            return
+        seen = set()
+        for n, links in enumerate(self.link_extractor.extract_links(response)):
+            rule = self._rules[n]
+            links = [lnk for lnk in links if lnk not in seen]
+            if links and rule.process_links:
+                links = rule.process_links(links)
+            for link in links:
+                seen.add(link)
+                request = self._build_request(n, link)
+                yield rule.process_request(request, response)
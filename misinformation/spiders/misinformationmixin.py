@@ -1,12 +1,17 @@
 import datetime
 import re
+import time
 import uuid
 from contextlib import suppress
 from urllib.parse import urlparse
 from w3lib.url import url_query_cleaner, canonicalize_url
 from scrapy.exceptions import CloseSpider
 from scrapy.http import Request
+from scrapy.utils.url import url_is_from_any_domain
+from misinformation.extensions import PipelineMetrics
 from misinformation.items import CrawlResponse
+from misinformation.state import SimHashIndex, ValidatorStore, hash_body, simhash
+from .frontierscorer import FrontierScorer
 from misinformation.warc import warc_from_response
 
 
@@ -14,6 +19,10 @@ class MisinformationMixin():
     """Mixin to provide useful defaults for Misinformation crawl spiders."""
     # Define attributes that will be overridden by child classes
     url_regexes = {}
+    # Rules whose links come from sections of the page that list articles
+    article_link_rules = ()
+    # Pass 'Not Modified' responses to our callbacks so that they can be skipped
+    handle_httpstatus_list = [304]
 
     def __init__(self, config, *args, **kwargs):
         # Load config and set spider display name to the name of the class
@@ -50,9 +59,18 @@ class MisinformationMixin():
         # Compile regexes
         self.url_regexes = dict((k, re.compile(v)) for k, v in self.url_regexes.items())
 
+        # Keep track of the (canonical) URLs of articles found in this crawl
+        self.seen_article_urls = set()
+
         # Initialise a cookie jar (list of cookies each of which is a dict)
         self.cookies = []
 
+        # Validators from previous crawls are loaded on first use, since the
+        # crawler settings are not available inside the constructor
+        self._validator_store = None
+        self._frontier_scorer = None
+        self._near_duplicate_index = None
+
         # On first glance, this next line seems a bit weird, since
         # MisinformationMixin has no parents. However, this is needed to
         # correctly navigate Python"s multiple inheritance structure - what it
@@ -60,6 +78,34 @@ class MisinformationMixin():
         # *derived* class, which will be the appropriate scrapy.Spider class
         super().__init__(*args, **kwargs)
 
+    def restore_state(self):
+        """Restore counters, cookies and crawl metadata from the spider state saved by an interrupted crawl.
+
+        This is called by the AtomicSpiderState extension once it has loaded
+        spider.state from the JOBDIR. Scrapy itself restores the request queue
+        and the duplicate filter, so together these let us carry on where the
+        crawl stopped.
+        """
+        if "crawl_info" not in self.state:
+            return
+        self.n_pages = self.state.get("n_pages", 0)
+        self.n_articles = self.state.get("n_articles", 0)
+        self.cookies = self.state.get("cookies", [])
+        self.crawl_info = self.state["crawl_info"]
+        self.seen_article_urls = set(self.state.get("seen_article_urls", []))
+        self.logger.info("Resuming crawl %s after %s pages and %s candidate articles",
+                         self.crawl_info["crawl_id"], self.n_pages, self.n_articles)
+
+    def save_state(self):
+        """Record counters, cookies and crawl metadata in the spider state so that this crawl can be resumed."""
+        self.state.update({
+            "n_pages": self.n_pages,
+            "n_articles": self.n_articles,
+            "cookies": self.cookies,
+            "crawl_info": self.crawl_info,
+            "seen_article_urls": sorted(self.seen_article_urls),
+        })
+
     def update_cookies(self, cookies):
         """Add cookies to those known about by this spider."""
         self.cookies.extend(self.as_list(cookies))
@@ -91,6 +137,86 @@ class MisinformationMixin():
             pass
         return {}
 
+    @property
+    def validator_store(self):
+        """Per-URL validators from previous crawls, or None if conditional requests are disabled."""
+        if self._validator_store is None and self.settings.getbool("CONDITIONAL_REQUESTS"):
+            self._validator_store = ValidatorStore(self.config["site_name"], self.settings.get("CRAWL_STATE_DIR"))
+        return self._validator_store
+
+    @property
+    def frontier_scorer(self):
+        """Link priority scorer, or None if article links are not being prioritised."""
+        if self._frontier_scorer is None and self.settings.getbool("PRIORITISE_ARTICLE_LINKS"):
+            self._frontier_scorer = FrontierScorer(self.is_article)
+        return self._frontier_scorer
+
+    @property
+    def near_duplicate_index(self):
+        """Fingerprints of pages archived from this site, or None if near-duplicate detection is disabled."""
+        if self._near_duplicate_index is None and self.settings.getbool("NEAR_DUPLICATE_DETECTION"):
+            self._near_duplicate_index = SimHashIndex(self.config["site_name"],
+                                                      self.settings.get("CRAWL_STATE_DIR"),
+                                                      self.settings.getint("NEAR_DUPLICATE_MAX_DISTANCE"))
+        return self._near_duplicate_index
+
+    def fingerprint_text(self, response):
+        """Get the text used to fingerprint a page.
+
+        We prefer the configured article content, since boilerplate shared by
+        every page on the site would otherwise make distinct articles similar.
+        """
+        xpath = "//body//p"
+        with suppress(KeyError):
+            if self.config["article"]["content"]["select_method"] == "xpath":
+                xpath = self.config["article"]["content"]["select_expression"]
+        return " ".join(response.xpath(xpath).xpath(".//text()[not(ancestor::script) and not(ancestor::style)]").extract())
+
+    def add_conditional_headers(self, request):
+        """Add If-None-Match/If-Modified-Since headers if we have seen this article in a previous crawl.
+
+        Other pages (eg. start URLs and index pages) are always fetched in full,
+        since we need to follow their links even if they have not changed.
+        """
+        if urlparse(request.url).path in ["", "/", "index.html"] or not self.is_article(request.url):
+            return request
+        if self.validator_store:
+            for header, value in self.validator_store.conditional_headers(request.url).items():
+                request.headers.setdefault(header, value)
+        return request
+
+    @staticmethod
+    def response_validators(response):
+        """Get the validators for this response, which are recorded by the ValidatorPipeline once it has been exported."""
+        return {
+            "url": response.url,
+            "etag": (response.headers.get("ETag") or b"").decode("latin-1"),
+            "last_modified": (response.headers.get("Last-Modified") or b"").decode("latin-1"),
+            "body_hash": hash_body(response.body),
+        }
+
+    def declared_canonical_url(self, response, resolved_url):
+        """Get the canonical URL declared by the page with rel=canonical or og:url, falling back to the resolved URL.
+
+        The declared URL is only trusted if it is an article on one of the
+        domains that we are crawling, since some sites point their canonical
+        URL at the front page or at the original source of syndicated content.
+        """
+        # Allow the canonical URL to add or remove a 'www.' prefix
+        domains = [domain[4:] if domain.startswith("www.") else domain for domain in self.allowed_domains]
+        for xpath in ('//link[contains(concat(" ", normalize-space(@rel), " "), " canonical ")]/@href',
+                      '//meta[@property="og:url"]/@content'):
+            declared_url = response.xpath(xpath).extract_first()
+            if not declared_url:
+                continue
+            declared_url = canonicalize_url(response.urljoin(declared_url.strip()), keep_blank_values=False)
+            parsed_url = urlparse(declared_url)
+            if parsed_url.scheme not in ["http", "https"] or parsed_url.path in ["", "/", "index.html"]:
+                continue
+            if url_is_from_any_domain(parsed_url, domains) and self.is_article(declared_url):
+                return declared_url
+        return resolved_url
+
     def is_article(self, url):
         """Check whether this is an article"""
         # Check whether we match the "require" or "reject" regexes
@@ -100,17 +226,26 @@ class MisinformationMixin():
         return required and not rejected
 
     def _build_request(self, rule, link):
-        """Override the default request builder to add any cookies that we have collected."""
+        """Override the default request builder to add any cookies that we have collected and to prioritise likely articles."""
         request = super()._build_request(rule, link)
         request.cookies = self.cookies
-        return request
+        if self.frontier_scorer:
+            request.priority = self.frontier_scorer.score(link.url, self.rules[rule] in self.article_link_rules)
+        return self.add_conditional_headers(request)
 
     def parse_response(self, response):
         """Parse the HTML response and determine whether it should be saved."""
         # If the closure flag has been set then stop crawling
         if self.request_closure:
             raise CloseSpider(reason='Ending crawl cleanly after a close request.')
+
+        # If the page has not been modified since the previous crawl then
+        # there is nothing new to serialise
+        if response.status == 304:
+            self.logger.info("Skipping page which is unchanged since the previous crawl: %s", response.url)
+            return None
         self.n_pages += 1
+        page_changed = not self.validator_store or self.validator_store.has_changed(response.url, response.body)
 
         # URL may be the result of a redirect. If so, we use the redirected URL
         if response.request.meta.get("redirect_urls"):
@@ -119,6 +254,8 @@ class MisinformationMixin():
             resolved_url = response.url
         resolved_url = canonicalize_url(resolved_url, keep_blank_values=False)
         self.logger.info("Searching for a URL match at: %s", resolved_url)
+        if self.frontier_scorer:
+            self.frontier_scorer.record_page(resolved_url)
 
         # Always reject the front page of the domain since this will change
         # over time We need this for henrymakow.com as there is no sane URL
@@ -130,8 +267,42 @@ class MisinformationMixin():
         if not self.is_article(resolved_url):
             return None
 
+        # Servers without validator support will still send us the full page,
+        # so we compare against the body hash from the previous crawl
+        if not page_changed:
+            self.logger.info("  skipping article which is unchanged since the previous crawl: %s", resolved_url)
+            return None
+
+        # Use the canonical URL declared by the page so that copies of an
+        # article with different query strings or paths are only stored once
+        if self.settings.getbool("USE_DECLARED_CANONICAL_URLS"):
+            canonical_url = self.declared_canonical_url(response, resolved_url)
+            if canonical_url != resolved_url:
+                self.logger.info("  using declared canonical URL %s for: %s", canonical_url, resolved_url)
+                resolved_url = canonical_url
+        if resolved_url in self.seen_article_urls:
+            self.logger.info("  skipping article which has already been found in this crawl: %s", resolved_url)
+            return None
+        self.seen_article_urls.add(resolved_url)
+
+        # Record near-duplicates of pages that we have already archived (eg.
+        # AMP or print views) as aliases rather than storing them again. The
+        # fingerprints of other pages are recorded by the NearDuplicatePipeline
+        # once they have been exported.
+        fingerprint = None
+        if self.near_duplicate_index:
+            fingerprint = simhash(self.fingerprint_text(response))
+            if fingerprint is not None:
+                original_url = self.near_duplicate_index.find(fingerprint, exclude_url=resolved_url)
+                if original_url:
+                    self.logger.info("  recording %s as an alias of the near-duplicate article at: %s", resolved_url, original_url)
+                    self.near_duplicate_index.add(resolved_url, fingerprint, alias_of=original_url)
+                    return None
+
         # If we get here then we've found a candidate article
         self.n_articles += 1
+        if self.frontier_scorer:
+            self.frontier_scorer.record_article(resolved_url)
         self.logger.info("  found a candidate article at: %s", resolved_url)
         article_percentage = float(100 * self.n_articles / self.n_pages) if self.n_pages > 0 else 0
         self.logger.info("  in this crawl session %s candidate articles have been extracted from %s pages: (%s)",
@@ -146,19 +317,26 @@ class MisinformationMixin():
         crawl_response["crawl_id"] = self.crawl_info["crawl_id"]
         crawl_response["crawl_datetime"] = self.crawl_info["crawl_datetime"]
         crawl_response["site_name"] = self.config["site_name"]
+        if fingerprint is not None:
+            crawl_response["simhash"] = fingerprint
+        if self.validator_store:
+            crawl_response["validators"] = self.response_validators(response)
+        start_time = time.time()
         crawl_response["warc_data"] = warc_from_response(response, resolved_url)
+        PipelineMetrics(self.crawler.stats).record_latency("warc_build", time.time() - start_time)
         return crawl_response
 
-    def start_requests(self):
+    async def start(self):
         """Process article overrides first, then delegate to the per-spider function."""
-        def yield_overrides():
-            for url in self.article_overrides:
-                self.logger.debug("Processing article override: %s", url)
-                yield Request(url, callback=self.parse_response)
-        yield from yield_overrides()
+        for url in self.article_overrides:
+            self.logger.debug("Processing article override: %s", url)
+            yield self.add_conditional_headers(Request(url, callback=self.parse_response))
         if self.config["start_url"]:
-            yield from super().start_requests()
+            async for request in super().start():
+                yield request
 
     def closed(self, reason):
-        """Log reason for closure."""
+        """Log reason for closure and save any state needed by the next crawl."""
+        if self.validator_store:
+            self.validator_store.save()
         self.logger.info("Spider closed: %s (%s)", self.config["site_name"], reason)
@@ -0,0 +1,125 @@
+from urllib.parse import urljoin, urlparse
+from lxml import etree
+from w3lib.html import strip_html5_whitespace
+from w3lib.url import canonicalize_url, safe_url_string
+from scrapy.link import Link
+from scrapy.utils.misc import rel_has_nofollow
+from scrapy.utils.python import unique as unique_list
+from scrapy.utils.response import get_base_url
+from scrapy.utils.url import url_has_any_extension, url_is_from_any_domain
+
+XHTML_NAMESPACE = "{http://www.w3.org/1999/xhtml}"
+string_content = etree.XPath("string()")
+
+
+def tag_name(tag):
+    """Element tag without any XHTML namespace"""
+    if isinstance(tag, str) and tag.startswith(XHTML_NAMESPACE):
+        return tag[len(XHTML_NAMESPACE):]
+    return tag
+
+
+def link_allowed(link_extractor, link):
+    """Check a link against the allow, deny, domain, extension and text rules of a LinkExtractor"""
+    if link.url.split("://", 1)[0] not in ("http", "https", "file", "ftp"):
+        return False
+    if link_extractor.allow_res and not any(regex.search(link.url) for regex in link_extractor.allow_res):
+        return False
+    if link_extractor.deny_res and any(regex.search(link.url) for regex in link_extractor.deny_res):
+        return False
+    parsed_url = urlparse(link.url)
+    if link_extractor.allow_domains and not url_is_from_any_domain(parsed_url, link_extractor.allow_domains):
+        return False
+    if link_extractor.deny_domains and url_is_from_any_domain(parsed_url, link_extractor.deny_domains):
+        return False
+    if link_extractor.deny_extensions and url_has_any_extension(parsed_url, link_extractor.deny_extensions):
+        return False
+    restrict_text = getattr(link_extractor, "restrict_text", None)
+    return not restrict_text or any(regex.search(link.text) for regex in restrict_text)
+
+
+class SinglePassLinkExtractor():
+    """Extract links for several LinkExtractors with a single walk over the document.
+
+    Running each LinkExtractor separately walks and canonicalizes every
+    anchor on the page once per extractor. Here we walk the document once,
+    process and canonicalize each URL once, and then classify the link
+    against the rules (including restrict_xpaths) of every extractor.
+
+    extract_links returns one list of links per extractor, matching what
+    each extractor would have returned on its own (apart from ordering when
+    restrict_xpaths select elements out of document order).
+    """
+    def __init__(self, link_extractors):
+        self.link_extractors = list(link_extractors)
+
+    @staticmethod
+    def restricted_elements(response, link_extractor):
+        """Get the set of elements inside this extractor's restrict_xpaths, or None if it has none."""
+        if not link_extractor.restrict_xpaths:
+            return None
+        elements = set()
+        for xpath in link_extractor.restrict_xpaths:
+            for selector in response.xpath(xpath):
+                if etree.iselement(selector.root):
+                    elements.update(selector.root.iter(etree.Element))
+        return elements
+
+    def extract_links(self, response):
+        base_url = get_base_url(response)
+        restricted_elements = [self.restricted_elements(response, link_extractor) for link_extractor in self.link_extractors]
+        links = [[] for _ in self.link_extractors]
+        processed_urls = {}
+        canonical_urls = {}
+
+        for element in response.selector.root.iter(etree.Element):
+            tag = tag_name(element.tag)
+            link_text = None
+            for attr, value in element.attrib.items():
+                for idx, link_extractor in enumerate(self.link_extractors):
+                    parser = link_extractor.link_extractor
+                    if not (parser.scan_tag(tag) and parser.scan_attr(attr)):
+                        continue
+                    if restricted_elements[idx] is not None and element not in restricted_elements[idx]:
+                        continue
+
+                    # Resolve and process the URL, reusing the result for any
+                    # other extractors which process URLs in the same way
+                    key = (value, parser.strip, parser.process_attr)
+                    if key not in processed_urls:
+                        processed_urls[key] = self.process_url(value, parser, response, base_url)
+                    url = processed_urls[key]
+                    if url is None:
+                        continue
+
+                    if link_text is None:
+                        link_text = string_content(element) or ""
+                    link = Link(url, link_text, nofollow=rel_has_nofollow(element.get("rel")))
+                    if not link_allowed(link_extractor, link):
+                        continue
+                    if link_extractor.canonicalize:
+                        if url not in canonical_urls:
+                            canonical_urls[url] = canonicalize_url(url)
+                        link.url = canonical_urls[url]
+                    links[idx].append(link)
+
+        return [unique_list(extractor_links, key=lambda link: link.url) for extractor_links in links]
+
+    @staticmethod
+    def process_url(value, parser, response, base_url):
+        """Convert an attribute value into an absolute URL in the same way as scrapy's LxmlParserLinkExtractor."""
+        try:
+            if parser.strip:
+                value = strip_html5_whitespace(value)
+            url = urljoin(base_url, value)
+        except ValueError:
+            return None  # skip bogus links
+        url = parser.process_attr(url)
+        if url is None:
+            return None
+        try:
+            url = safe_url_string(url, encoding=response.encoding)
+        except ValueError:
+            return None  # skip bad URLs
+        # Fix relative links after processing
+        return urljoin(response.url, url)
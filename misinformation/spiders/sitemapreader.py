@@ -0,0 +1,74 @@
+import gzip
+from io import BytesIO
+from lxml import etree
+
+GZIP_MAGIC_NUMBER = b"\x1f\x8b"
+
+
+def local_name(tag):
+    """Strip any namespace from an element tag."""
+    return tag.split("}", 1)[1] if "}" in tag else tag
+
+
+def entry_from_element(element):
+    """Convert a <url> or <sitemap> element into a dictionary in the same format as scrapy's Sitemap class."""
+    entry = {}
+    for child in element:
+        # Skip comments and processing instructions
+        if not isinstance(child.tag, str):
+            continue
+        name = local_name(child.tag)
+        if name == "link":
+            if "href" in child.attrib:
+                entry.setdefault("alternate", []).append(child.get("href"))
+        else:
+            entry[name] = child.text.strip() if child.text else ""
+    return entry
+
+
+def sitemap_stream(body):
+    """Get a file-like object over the (decompressed) sitemap body.
+
+    Compressed sitemaps are decompressed lazily as they are read, rather than
+    being expanded in memory all at once.
+    """
+    if body[:2] == GZIP_MAGIC_NUMBER:
+        return gzip.GzipFile(fileobj=BytesIO(body))
+    return BytesIO(body)
+
+
+def iter_sitemap_entries(stream, max_parsed_entries=1000):
+    """Incrementally parse a sitemap, yielding (sitemap_type, entries) batches.
+
+    Each batch holds at most max_parsed_entries entries. Elements are removed
+    from the document tree as soon as they have been converted into entries,
+    so memory use is bounded by the batch size rather than the sitemap size.
+    """
+    batch = []
+    sitemap_type = None
+    context = etree.iterparse(stream, events=("end",), recover=True, resolve_entities=False,
+                              remove_comments=True, huge_tree=True)
+    try:
+        for _, element in context:
+            parent = element.getparent()
+            # Only look at the direct children of the <urlset> or <sitemapindex>
+            if parent is None or parent.getparent() is not None:
+                continue
+            if local_name(element.tag) not in ("url", "sitemap"):
+                continue
+            sitemap_type = local_name(parent.tag)
+            entry = entry_from_element(element)
+            # Free the memory used by this element and any preceding siblings
+            element.clear()
+            while element.getprevious() is not None:
+                del parent[0]
+            if "loc" in entry:
+                batch.append(entry)
+            if len(batch) >= max_parsed_entries > 0:
+                yield sitemap_type, batch
+                batch = []
+    except (etree.XMLSyntaxError, EOFError, OSError):
+        # Truncated or invalid sitemaps are processed as far as possible
+        pass
+    if batch:
+        yield sitemap_type, batch
@@ -1,6 +1,11 @@
+import datetime
 from contextlib import suppress
+from scrapy.http import Request
 from scrapy.spiders import SitemapSpider
+from scrapy.spiders.sitemap import iterloc
+from misinformation.state import HighWaterMark, parse_lastmod
 from .misinformationmixin import MisinformationMixin
+from .sitemapreader import iter_sitemap_entries, sitemap_stream
 
 
 class XMLSitemapSpider(MisinformationMixin, SitemapSpider):
@@ -23,6 +28,10 @@ class XMLSitemapSpider(MisinformationMixin, SitemapSpider):
             for regex in self.as_list(config['article']['url_must_contain']):
                 self.sitemap_rules.append((regex, 'parse_response'))
 
+        # The high-water mark from previous crawls is loaded on first use,
+        # since the crawler settings are not available inside the constructor
+        self._high_water_mark = None
+
         # We need to call the super constructor AFTER setting any rules as it
         # calls self._compile_rules(), storing them in self._rules. If we call
         # the super constructor before we define the rules, they will not be
@@ -30,6 +39,84 @@ class XMLSitemapSpider(MisinformationMixin, SitemapSpider):
         # have the right rules present.
         super().__init__(config, *args, **kwargs)
 
+    @property
+    def high_water_mark(self):
+        """Newest <lastmod> from the previous crawl, or None if incremental crawling is disabled."""
+        if self._high_water_mark is None and self.settings.getbool("INCREMENTAL_SITEMAPS"):
+            self._high_water_mark = HighWaterMark(self.config["site_name"], self.settings.get("CRAWL_STATE_DIR"))
+        return self._high_water_mark
+
+    def sitemap_filter(self, entries):
+        """Skip sitemap entries older than the high-water mark and order the remainder newest-first."""
+        if not self.high_water_mark:
+            yield from entries
+            return
+        fresh_entries = []
+        for entry in entries:
+            if self.high_water_mark.is_stale(entry.get("lastmod")):
+                self.logger.debug("Skipping sitemap entry older than the high-water mark: %s", entry["loc"])
+                continue
+            self.high_water_mark.observe(entry.get("lastmod"))
+            fresh_entries.append(entry)
+        # Entries without a lastmod are treated as new
+        newest = datetime.datetime.max.replace(tzinfo=datetime.timezone.utc)
+        fresh_entries.sort(key=lambda entry: parse_lastmod(entry.get("lastmod")) or newest, reverse=True)
+        yield from fresh_entries
+
+    def _parse_sitemap(self, response):
+        """Parse sitemaps as a stream and prioritise newer child sitemaps when running incrementally.
+
+        As the scheduler queue is last-in-first-out we cannot rely on the
+        order that requests are yielded in, so we set explicit priorities.
+        """
+        max_parsed_entries = self.settings.getint("SITEMAP_MAX_PARSED_ENTRIES")
+        if max_parsed_entries > 0 and not response.url.endswith("/robots.txt"):
+            requests = self._parse_sitemap_stream(response, max_parsed_entries)
+        else:
+            requests = super()._parse_sitemap(response)
+        n_sitemaps = 0
+        for request in requests:
+            if self.high_water_mark and request.callback == self._parse_sitemap:  # pylint: disable=comparison-with-callable
+                request.priority = response.request.priority - n_sitemaps
+                n_sitemaps += 1
+            yield request
+
+    def _parse_sitemap_stream(self, response, max_parsed_entries):
+        """Walk the sitemap entries incrementally, emitting requests as we go.
+
+        This matches the behaviour of SitemapSpider._parse_sitemap but avoids
+        building the whole document tree in memory, which matters for
+        sitemaps with tens of thousands of URLs. The body is still checked
+        and decompressed by scrapy first, so responses which are not sitemaps
+        are ignored and compressed sitemaps are limited to DOWNLOAD_MAXSIZE.
+        """
+        body = self._get_sitemap_body(response)
+        if not body:
+            self.logger.warning("Ignoring invalid sitemap: %s", response.url)
+            return
+        n_entries = 0
+        for sitemap_type, entries in iter_sitemap_entries(sitemap_stream(body), max_parsed_entries):
+            n_entries += len(entries)
+            locs = iterloc(self.sitemap_filter(entries), self.sitemap_alternate_links)
+            if sitemap_type == "sitemapindex":
+                for loc in locs:
+                    if any(regex.search(loc) for regex in self._follow):
+                        yield Request(loc, callback=self._parse_sitemap)
+            elif sitemap_type == "urlset":
+                for loc in locs:
+                    for regex, callback in self._cbs:
+                        if regex.search(loc):
+                            yield Request(loc, callback=callback)
+                            break
+        if not n_entries:
+            self.logger.warning("Ignoring invalid or empty sitemap: %s", response.url)
+
+    def closed(self, reason):
+        """Advance the high-water mark, but only if the full sitemap was crawled."""
+        if self.high_water_mark and reason == "finished":
+            self.high_water_mark.save()
+        super().closed(reason)
+
     # Suppress abstract-method warning
     def parse(self, response):
         pass
@@ -0,0 +1,17 @@
+"""
+This module contains local state that is persisted between crawls
+"""
+from .blob_key_index import BlobKeyIndex
+from .high_water_mark import HighWaterMark, parse_lastmod
+from .simhash_index import SimHashIndex, simhash
+from .validator_store import ValidatorStore, hash_body
+
+__all__ = [
+    "BlobKeyIndex",
+    "HighWaterMark",
+    "SimHashIndex",
+    "ValidatorStore",
+    "hash_body",
+    "parse_lastmod",
+    "simhash",
+]
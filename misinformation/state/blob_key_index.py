@@ -0,0 +1,51 @@
+import os
+import sqlite3
+import time
+
+
+class BlobKeyIndex():
+    """Local set of the keys of blobs in a storage container, backed by SQLite.
+
+    This lets exporters check whether a blob has already been uploaded with a
+    local lookup instead of a request to blob storage. The index is rebuilt
+    from a listing of the whole container whenever it is older than
+    refresh_seconds, and is updated after each upload. It may be used from
+    any thread, but only from one thread at a time.
+    """
+    def __init__(self, path, refresh_seconds=24 * 60 * 60):
+        output_dir = os.path.dirname(path)
+        if output_dir and not os.path.isdir(output_dir):
+            os.makedirs(output_dir)
+        self.refresh_seconds = refresh_seconds
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute("CREATE TABLE IF NOT EXISTS blob_keys (key TEXT PRIMARY KEY) WITHOUT ROWID")
+        self.connection.execute("CREATE TABLE IF NOT EXISTS metadata (name TEXT PRIMARY KEY, value REAL NOT NULL)")
+        self.connection.commit()
+
+    def close(self):
+        self.connection.close()
+
+    def __contains__(self, key):
+        return self.connection.execute("SELECT 1 FROM blob_keys WHERE key = ?", (key,)).fetchone() is not None
+
+    def __len__(self):
+        return self.connection.execute("SELECT COUNT(*) FROM blob_keys").fetchone()[0]
+
+    @property
+    def last_refreshed(self):
+        row = self.connection.execute("SELECT value FROM metadata WHERE name = 'last_refreshed'").fetchone()
+        return row[0] if row else 0
+
+    def is_stale(self):
+        return time.time() - self.last_refreshed > self.refresh_seconds
+
+    def refresh(self, keys):
+        """Replace the contents of the index with the keys from a full listing of the container."""
+        with self.connection:
+            self.connection.execute("DELETE FROM blob_keys")
+            self.connection.executemany("INSERT OR IGNORE INTO blob_keys (key) VALUES (?)", ((key,) for key in keys))
+            self.connection.execute("INSERT OR REPLACE INTO metadata (name, value) VALUES ('last_refreshed', ?)", (time.time(),))
+
+    def add(self, key):
+        with self.connection:
+            self.connection.execute("INSERT OR IGNORE INTO blob_keys (key) VALUES (?)", (key,))
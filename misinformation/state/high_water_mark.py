@@ -0,0 +1,65 @@
+import datetime
+import json
+import os
+from contextlib import suppress
+from dateutil import parser
+
+
+def parse_lastmod(lastmod):
+    """Parse a W3C datetime from a sitemap <lastmod> entry, returning None if this is not possible."""
+    if not lastmod:
+        return None
+    try:
+        lastmod_datetime = parser.parse(lastmod)
+    except (ValueError, OverflowError):
+        return None
+    # Dates without a timezone are assumed to be UTC
+    if not lastmod_datetime.tzinfo:
+        lastmod_datetime = lastmod_datetime.replace(tzinfo=datetime.timezone.utc)
+    return lastmod_datetime
+
+
+class HighWaterMark():
+    """Most recent sitemap <lastmod> seen in the last complete crawl of a site.
+
+    Entries older than this mark have already been crawled and can be
+    skipped by incremental crawls.
+    """
+    def __init__(self, site_name, state_dir="crawl_state"):
+        self.path = os.path.join(state_dir, "{}_high_water_mark.json".format(site_name))
+        self.mark = None
+        self.newest_seen = None
+        self.load()
+
+    def load(self):
+        """Load the high-water mark from a previous crawl if there is one."""
+        with suppress(FileNotFoundError):
+            with open(self.path, "r") as f_in:
+                self.mark = parse_lastmod(json.load(f_in)["high_water_mark"])
+
+    def save(self):
+        """Advance the high-water mark to the newest entry seen in this crawl."""
+        if not self.newest_seen or (self.mark and self.newest_seen <= self.mark):
+            return
+        output_dir = os.path.dirname(self.path)
+        if output_dir and not os.path.isdir(output_dir):
+            os.makedirs(output_dir)
+        with open(self.path, "w") as f_out:
+            json.dump({"high_water_mark": self.newest_seen.isoformat()}, f_out)
+        self.mark = self.newest_seen
+
+    def is_stale(self, lastmod):
+        """Check whether an entry was last modified before the high-water mark.
+
+        Entries without a (valid) lastmod are never considered stale.
+        """
+        lastmod_datetime = parse_lastmod(lastmod)
+        if not lastmod_datetime or not self.mark:
+            return False
+        return lastmod_datetime < self.mark
+
+    def observe(self, lastmod):
+        """Track the newest entry seen during this crawl."""
+        lastmod_datetime = parse_lastmod(lastmod)
+        if lastmod_datetime and (not self.newest_seen or lastmod_datetime > self.newest_seen):
+            self.newest_seen = lastmod_datetime
@@ -0,0 +1,95 @@
+import hashlib
+import json
+import os
+import re
+from contextlib import suppress
+
+WORD_REGEX = re.compile(r"\w+", re.UNICODE)
+
+
+def simhash(text, shingle_size=3, min_words=50):
+    """Calculate a 64-bit SimHash over the word shingles of a piece of text.
+
+    Returns None for texts which are too short to fingerprint reliably.
+    """
+    words = WORD_REGEX.findall(text.lower())
+    if len(words) < max(min_words, shingle_size):
+        return None
+    shingle_hashes = []
+    for idx in range(len(words) - shingle_size + 1):
+        shingle = " ".join(words[idx:idx + shingle_size])
+        shingle_hashes.append(hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest())
+    # Set each bit of the fingerprint if it is set in a majority of the
+    # shingle hashes. Counting down the columns of the bit strings is much
+    # faster than testing each bit of each hash individually.
+    bit_strings = ["{:064b}".format(int.from_bytes(shingle_hash, "big")) for shingle_hash in shingle_hashes]
+    fingerprint = 0
+    for column in zip(*bit_strings):
+        fingerprint = (fingerprint << 1) | (2 * column.count("1") > len(bit_strings))
+    return fingerprint
+
+
+def hamming_distance(hash_a, hash_b):
+    return bin(hash_a ^ hash_b).count("1")
+
+
+class SimHashIndex():
+    """Persistent per-site index of page fingerprints for finding near-duplicates.
+
+    Fingerprints are split into bands for locality-sensitive lookup. With
+    max_distance + 1 bands, any two fingerprints within max_distance bits of
+    each other must agree exactly on at least one band, so we only need to
+    compare against pages which share a band.
+
+    Each page is appended to a JSON-lines file as it is added, together with
+    the URL it duplicates (if any), so that aliases are recorded across crawls.
+    """
+    def __init__(self, site_name, state_dir="crawl_state", max_distance=3):
+        self.path = os.path.join(state_dir, "{}_simhashes.jsonl".format(site_name))
+        self.max_distance = max_distance
+        self.n_bands = max_distance + 1
+        self.band_width = 64 // self.n_bands
+        self.bands = [{} for _ in range(self.n_bands)]
+        self.load()
+
+    def band_values(self, fingerprint):
+        mask = (1 << self.band_width) - 1
+        return [(fingerprint >> (idx * self.band_width)) & mask for idx in range(self.n_bands)]
+
+    def load(self):
+        """Load fingerprints recorded by previous crawls."""
+        with suppress(FileNotFoundError):
+            with open(self.path, "r") as f_in:
+                for line in f_in:
+                    entry = json.loads(line)
+                    if not entry["alias_of"]:
+                        self.index(entry["url"], entry["simhash"])
+
+    def index(self, url, fingerprint):
+        for band, value in zip(self.bands, self.band_values(fingerprint)):
+            band.setdefault(value, []).append((fingerprint, url))
+
+    def find(self, fingerprint, exclude_url=None):
+        """Find the URL of another indexed page within max_distance bits of this fingerprint, if there is one.
+
+        Pages at exclude_url are not considered, so that a page fetched again
+        is not reported as a duplicate of its own copy from a previous crawl.
+        """
+        for band, value in zip(self.bands, self.band_values(fingerprint)):
+            for candidate, url in band.get(value, []):
+                if url != exclude_url and hamming_distance(candidate, fingerprint) <= self.max_distance:
+                    return url
+        return None
+
+    def add(self, url, fingerprint, alias_of=None):
+        """Record a page, either as an archived page or as an alias of the archived page that it duplicates.
+
+        Aliases are recorded but not indexed themselves.
+        """
+        if not alias_of:
+            self.index(url, fingerprint)
+        output_dir = os.path.dirname(self.path)
+        if output_dir and not os.path.isdir(output_dir):
+            os.makedirs(output_dir)
+        with open(self.path, "a") as f_out:
+            f_out.write(json.dumps({"url": url, "simhash": fingerprint, "alias_of": alias_of}) + "\n")
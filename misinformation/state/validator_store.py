@@ -0,0 +1,64 @@
+import hashlib
+import json
+import os
+from contextlib import suppress
+
+
+def hash_body(body):
+    return hashlib.sha1(body).hexdigest()
+
+
+class ValidatorStore():
+    """Per-URL HTTP validators (ETag, Last-Modified and body hash) persisted between crawls.
+
+    These are used to send conditional requests on recrawls so that unchanged
+    pages can be answered with a '304 Not Modified' instead of a full download.
+    """
+    def __init__(self, site_name, state_dir="crawl_state"):
+        self.path = os.path.join(state_dir, "{}_validators.json".format(site_name))
+        self.validators = {}
+        self.load()
+
+    def load(self):
+        """Load validators from a previous crawl if there are any."""
+        with suppress(FileNotFoundError):
+            with open(self.path, "r") as f_in:
+                self.validators = json.load(f_in)
+
+    def save(self):
+        """Write validators to disk, replacing the file atomically."""
+        output_dir = os.path.dirname(self.path)
+        if output_dir and not os.path.isdir(output_dir):
+            os.makedirs(output_dir)
+        temporary_path = self.path + ".tmp"
+        with open(temporary_path, "w") as f_out:
+            json.dump(self.validators, f_out)
+        os.replace(temporary_path, self.path)
+
+    def conditional_headers(self, url):
+        """Get the If-None-Match/If-Modified-Since headers to send when requesting this URL."""
+        headers = {}
+        validator = self.validators.get(url, {})
+        if validator.get("etag"):
+            headers["If-None-Match"] = validator["etag"]
+        if validator.get("last_modified"):
+            headers["If-Modified-Since"] = validator["last_modified"]
+        return headers
+
+    def has_changed(self, url, body):
+        """Check whether the body of this URL has changed since the last crawl."""
+        return hash_body(body) != self.validators.get(url, {}).get("body_hash", None)
+
+    def update(self, url, etag, last_modified, body):
+        """Record the validators for this URL, returning whether the body has changed since the last crawl."""
+        changed = self.has_changed(url, body)
+        self.record(url, etag, last_modified, hash_body(body))
+        return changed
+
+    def record(self, url, etag, last_modified, body_hash):
+        """Record the validators for this URL."""
+        self.validators[url] = {
+            "etag": etag,
+            "last_modified": last_modified,
+            "body_hash": body_hash,
+        }
@@ -1,13 +1,33 @@
 """
 This module contains functionality for interacting with WARC files
 """
+from .cdxj import CdxjIndex, WarcRecordReader, surt, write_cdxj_index
+from .crawl_archive import CrawlArchiveWriter, RotatingCrawlArchiveWriter, crawl_archive_paths, iter_crawl_archive, iter_crawl_archives
+from .segment_writer import WarcSegmentWriter
 from .warc_parser import WarcParser
-from .serialisation import warc_from_response, response_from_warc, string_from_warc, warc_from_string
+from .zstd_codec import SiteWarcEncoder, ZstdDictionaryStore, decode_warc, dictionary_blob_name, encode_warc
+from .serialisation import LazyWarcResponse, warc_from_response, response_from_warc, string_from_warc, warc_from_string
 
 __all__ = [
+    "CdxjIndex",
+    "CrawlArchiveWriter",
+    "LazyWarcResponse",
+    "RotatingCrawlArchiveWriter",
+    "SiteWarcEncoder",
     "WarcParser",
+    "WarcRecordReader",
+    "WarcSegmentWriter",
+    "ZstdDictionaryStore",
+    "crawl_archive_paths",
+    "decode_warc",
+    "dictionary_blob_name",
+    "encode_warc",
     "warc_from_response",
+    "iter_crawl_archive",
+    "iter_crawl_archives",
     "response_from_warc",
     "string_from_warc",
+    "surt",
     "warc_from_string",
+    "write_cdxj_index",
 ]
@@ -0,0 +1,124 @@
+import bisect
+import json
+import mmap
+import os
+import re
+from urllib.parse import urlsplit
+from warcio.archiveiterator import ArchiveIterator
+
+
+def surt(url):
+    """Sort-friendly URI Reordering Transform of a URL, as used for CDXJ keys."""
+    parts = urlsplit(url.strip())
+    host = (parts.hostname or "").lower()
+    if host.startswith("www."):
+        host = host[4:]
+    key = ",".join(reversed(host.split(".")))
+    if parts.port and parts.port not in (80, 443):
+        key += ":{}".format(parts.port)
+    key += ")" + (parts.path or "/").lower()
+    if parts.query:
+        key += "?" + "&".join(sorted(parts.query.lower().split("&")))
+    return key
+
+
+def cdxj_entries(warc_path):
+    """Yield an index entry for each response record in a (possibly multi-record) WARC file."""
+    filename = os.path.basename(warc_path)
+    with open(warc_path, "rb") as f_in:
+        archive_iterator = ArchiveIterator(f_in)
+        for record in archive_iterator:
+            if record.rec_type != "response":
+                continue
+            url = record.rec_headers.get_header("WARC-Target-URI")
+            timestamp = re.sub(r"\D", "", record.rec_headers.get_header("WARC-Date"))[:14]
+            entry = {
+                "url": url,
+                "mime": (record.http_headers.get_header("Content-Type") or "").split(";")[0].strip(),
+                "status": record.http_headers.get_statuscode(),
+                "digest": record.rec_headers.get_header("WARC-Payload-Digest"),
+            }
+            # The record offset and length are only known once it has been read
+            archive_iterator.read_to_end(record)
+            entry["length"] = archive_iterator.get_record_length()
+            entry["offset"] = archive_iterator.get_record_offset()
+            entry["filename"] = filename
+            yield surt(url), timestamp, entry
+
+
+def write_cdxj_index(warc_path, cdxj_path=None):
+    """Write a sorted CDXJ index next to a WARC file, returning its path."""
+    cdxj_path = cdxj_path or "{}.cdxj".format(warc_path)
+    lines = sorted("{} {} {}".format(key, timestamp, json.dumps(entry)) for key, timestamp, entry in cdxj_entries(warc_path))
+    with open(cdxj_path, "w") as f_out:
+        for line in lines:
+            f_out.write(line + "\n")
+    return cdxj_path
+
+
+class CdxjIndex():
+    """Sorted CDXJ index supporting binary-search lookup of the records for a URL."""
+    def __init__(self, lines=()):
+        self.keys = []
+        self.entries = []
+        for line in sorted(line.strip() for line in lines if line.strip()):
+            key, timestamp, entry = line.split(" ", 2)
+            self.keys.append((key, timestamp))
+            self.entries.append(json.loads(entry))
+
+    @classmethod
+    def from_files(cls, *cdxj_paths):
+        lines = []
+        for cdxj_path in cdxj_paths:
+            with open(cdxj_path, "r") as f_in:
+                lines.extend(f_in.readlines())
+        return cls(lines)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def lookup(self, url):
+        """All index entries for a URL, oldest capture first."""
+        key = surt(url)
+        idx = bisect.bisect_left(self.keys, (key, ""))
+        entries = []
+        while idx < len(self.keys) and self.keys[idx][0] == key:
+            entries.append(self.entries[idx])
+            idx += 1
+        return entries
+
+    def latest(self, url):
+        """The index entry for the most recent capture of a URL, or None."""
+        entries = self.lookup(url)
+        return entries[-1] if entries else None
+
+
+class WarcRecordReader():
+    """Read single WARC records located by a CDXJ index entry.
+
+    Local WARC files are memory-mapped so each record is a slice of the
+    mapping. If a connector is given, records for files that are not
+    available locally are fetched with a ranged blob download instead.
+    """
+    def __init__(self, warc_dir, connector=None):
+        self.warc_dir = warc_dir
+        self.connector = connector
+        self.mappings = {}
+
+    def mapping(self, filename):
+        if filename not in self.mappings:
+            with open(os.path.join(self.warc_dir, filename), "rb") as f_in:
+                self.mappings[filename] = mmap.mmap(f_in.fileno(), 0, access=mmap.ACCESS_READ)
+        return self.mappings[filename]
+
+    def read(self, entry):
+        """Return the bytes of the single gzipped WARC record described by an index entry."""
+        offset, length = int(entry["offset"]), int(entry["length"])
+        if self.connector and not os.path.isfile(os.path.join(self.warc_dir, entry["filename"])):
+            return self.connector.get_blob_content(self.connector.segment_blob_key(entry["filename"], offset, length))
+        return self.mapping(entry["filename"])[offset:offset + length]
+
+    def close(self):
+        for mapping in self.mappings.values():
+            mapping.close()
+        self.mappings = {}
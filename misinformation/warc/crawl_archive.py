@@ -0,0 +1,137 @@
+import glob
+import json
+import logging
+import mmap
+import os
+import re
+import struct
+import time
+from dateutil import parser
+from .crawl_file import CrawlFile
+
+MAGIC = b"MISCRAWL\x01"
+ENTRY_HEADER = struct.Struct(">IQ")
+ARCHIVE_NUMBER = re.compile(r"-(\d+)\.crawl$")
+
+
+class CrawlArchiveWriter():
+    """Append crawled pages to a local binary archive.
+
+    Each page is stored as a fixed-size header holding the lengths of its
+    metadata and its WARC data, followed by the metadata as JSON and the raw
+    gzipped WARC records. Unlike the JSON export, WARC data is not base64
+    encoded and pages can be read back one at a time.
+    """
+    def __init__(self, path):
+        self.file = open(path, "wb")
+        self.file.write(MAGIC)
+        # Make sure that an archive is never found without its header, even if the crawl dies before the next sync
+        self.sync()
+
+    @property
+    def size(self):
+        return self.file.tell()
+
+    def write(self, metadata, warc_data):
+        metadata_bytes = json.dumps(metadata).encode("utf-8")
+        self.file.write(ENTRY_HEADER.pack(len(metadata_bytes), len(warc_data)))
+        self.file.write(metadata_bytes)
+        self.file.write(warc_data)
+
+    def sync(self):
+        """Flush everything written so far to disk."""
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def close(self):
+        self.sync()
+        self.file.close()
+
+
+class RotatingCrawlArchiveWriter():
+    """Write crawled pages to a series of size-rotated crawl archives named '<prefix>-<n>.crawl'.
+
+    Archives are synced to disk at least every fsync_interval seconds, so
+    that the pages from a crawl which dies part way through can still be
+    read. An optional encoder (eg. a SiteWarcEncoder) compresses the WARC
+    data of each page as it is written. Numbering carries on after any
+    archives already written with this prefix, which are left untouched.
+    """
+    def __init__(self, output_dir, prefix, max_archive_size=256 * 1024 * 1024, fsync_interval=30, encoder=None):
+        self.output_dir = output_dir
+        self.prefix = prefix
+        self.max_archive_size = max_archive_size
+        self.fsync_interval = fsync_interval
+        self.encoder = encoder
+        self.n_archives = max((int(match.group(1)) for match in map(ARCHIVE_NUMBER.search, crawl_archive_paths(output_dir, prefix))
+                               if match), default=0)
+        self.writer = None
+        self.last_sync = time.time()
+
+    @property
+    def archive_path(self):
+        return os.path.join(self.output_dir, "{}-{:05d}.crawl".format(self.prefix, self.n_archives))
+
+    def write(self, metadata, warc_data):
+        if self.writer and self.writer.size >= self.max_archive_size:
+            self.writer.close()
+            self.writer = None
+        if not self.writer:
+            if not os.path.isdir(self.output_dir):
+                os.makedirs(self.output_dir)
+            self.n_archives += 1
+            self.writer = CrawlArchiveWriter(self.archive_path)
+        if self.encoder:
+            warc_data = self.encoder.encode(warc_data)
+        self.writer.write(metadata, warc_data)
+        if time.time() - self.last_sync >= self.fsync_interval:
+            self.writer.sync()
+            self.last_sync = time.time()
+
+    def close(self):
+        if self.writer:
+            self.writer.close()
+            self.writer = None
+
+
+def iter_crawl_archive(path):
+    """Yield a CrawlFile for each page in a local binary archive.
+
+    The archive is memory-mapped while it is read, and only the pages being
+    yielded are copied out of the mapping. A page left incomplete by an
+    interrupted crawl is ignored, as is an archive which was cut off before
+    its header was written.
+    """
+    if os.path.getsize(path) < len(MAGIC):
+        logging.warning("Skipping incomplete crawl archive: %s", path)
+        return
+    with open(path, "rb") as f_in, mmap.mmap(f_in.fileno(), 0, access=mmap.ACCESS_READ) as mapping:
+        if mapping[:len(MAGIC)] != MAGIC:
+            raise ValueError("{} is not a crawl archive".format(path))
+        position = len(MAGIC)
+        while position + ENTRY_HEADER.size <= len(mapping):
+            metadata_length, warc_length = ENTRY_HEADER.unpack_from(mapping, position)
+            metadata_start = position + ENTRY_HEADER.size
+            warc_start = metadata_start + metadata_length
+            position = warc_start + warc_length
+            if position > len(mapping):
+                break
+            metadata = json.loads(mapping[metadata_start:warc_start].decode("utf-8"))
+            yield CrawlFile(
+                article_url=metadata["url"],
+                crawl_id=metadata["crawl_id"],
+                crawl_datetime=parser.parse(metadata["crawl_datetime"]),
+                site_name=metadata["site_name"],
+                warc_data=mapping[warc_start:position],
+            )
+
+
+def crawl_archive_paths(input_dir, prefix):
+    """Paths of the crawl archives written with this prefix, in the order they were written."""
+    return sorted(glob.glob(os.path.join(glob.escape(input_dir), "{}-[0-9]*.crawl".format(glob.escape(prefix)))))
+
+
+def iter_crawl_archives(input_dir, prefix):
+    """Yield a CrawlFile for each page in all the crawl archives written with this prefix."""
+    for path in crawl_archive_paths(input_dir, prefix):
+        yield from iter_crawl_archive(path)
@@ -0,0 +1,66 @@
+import json
+import os
+
+
+class WarcSegmentWriter():
+    """Append gzipped WARC data to size-rotated segment files on disk.
+
+    Each page's WARC data (a response record and its request record, each
+    gzipped separately) is appended to the current segment. As gzip members
+    can be concatenated, every segment is itself a valid multi-record WARC
+    file. The offset and length of each page's records are written to an
+    offsets file next to the segment when it is closed.
+    """
+    def __init__(self, output_dir, prefix, max_segment_size=100 * 1024 * 1024, on_segment_closed=None):
+        self.output_dir = output_dir
+        self.prefix = prefix
+        self.max_segment_size = max_segment_size
+        self.on_segment_closed = on_segment_closed
+        self.n_segments = 0
+        self.file = None
+        self.records = []
+
+    @property
+    def segment_name(self):
+        return "{}-{:05d}.warc.gz".format(self.prefix, self.n_segments)
+
+    @property
+    def segment_path(self):
+        return os.path.join(self.output_dir, self.segment_name)
+
+    def open_segment(self):
+        if not os.path.isdir(self.output_dir):
+            os.makedirs(self.output_dir)
+        self.n_segments += 1
+        self.file = open(self.segment_path, "wb")
+        self.records = []
+
+    def close_segment(self):
+        """Close the current segment, write its offsets and notify any listener."""
+        self.file.close()
+        self.file = None
+        with open(self.segment_path + ".offsets", "w") as f_out:
+            for record in self.records:
+                f_out.write(json.dumps(record) + "\n")
+        if self.on_segment_closed:
+            self.on_segment_closed(self.segment_path, self.records)
+
+    def write(self, url, warc_data):
+        """Append WARC data for a page, returning the (segment name, offset, length) where it was written.
+
+        Full segments are only closed when the next page is written, so that
+        callers can act on the returned location before the segment is closed.
+        """
+        if self.file and self.file.tell() >= self.max_segment_size:
+            self.close_segment()
+        if not self.file:
+            self.open_segment()
+        offset = self.file.tell()
+        self.file.write(warc_data)
+        record = {"url": url, "segment": self.segment_name, "offset": offset, "length": len(warc_data)}
+        self.records.append(record)
+        return record["segment"], record["offset"], record["length"]
+
+    def close(self):
+        if self.file:
+            self.close_segment()
@@ -1,10 +1,13 @@
 import base64
 from io import BytesIO
 from scrapy.http.response.html import HtmlResponse
+from scrapy.http.headers import Headers
 from scrapy.http.request import Request
+from scrapy.selector import Selector
 from warcio.archiveiterator import ArchiveIterator
 from warcio.statusandheaders import StatusAndHeaders
 from warcio.warcwriter import WARCWriter
+from .zstd_codec import decode_warc
 
 
 def request_from_dict(d):
@@ -19,7 +22,8 @@ def request_from_dict(d):
 
 
 def response_from_dict(d):
-    request = request_from_dict(d["request"])
+    # Records read on their own through a CDXJ index have no request record
+    request = request_from_dict(d["request"]) if "request" in d else Request(url=d["url"])
     r = HtmlResponse(d["url"],
                      status=d["status"],
                      headers=d["headers"],
@@ -49,7 +53,20 @@ def warc_from_response(response, resolved_url):
     return contents
 
 
-def response_from_warc(file_bytes):
+def request_dict_from_record(record, url):
+    return {
+        "url": url,
+        "status": record.http_headers.get_statuscode(),
+        "headers": dict(record.http_headers.headers),
+        "method": "GET",
+        "body": record.content_stream().read(),
+        "_encoding": "utf-8",
+        "cookies": record.http_headers.get_header("cookie"),
+    }
+
+
+def response_from_warc(file_bytes, dictionaries=None):
+    file_bytes = decode_warc(file_bytes, dictionaries)
     content = {}
     for record in ArchiveIterator(BytesIO(file_bytes)):
         # Load response
@@ -62,18 +79,85 @@ def response_from_warc(file_bytes):
         # Load corresponding request
         elif record.rec_headers.get_header("WARC-Concurrent-To") == response_id:
             if record.rec_type == "request":
-                content["request"] = {}
-                content["request"]["url"] = content["url"]
-                content["request"]["status"] = record.http_headers.get_statuscode()
-                content["request"]["headers"] = dict(record.http_headers.headers)
-                content["request"]["method"] = "GET"
-                content["request"]["body"] = record.content_stream().read()
-                content["request"]["_encoding"] = "utf-8"
-                content["request"]["cookies"] = record.http_headers.get_header("cookie")
+                content["request"] = request_dict_from_record(record, content["url"])
     # Build a response and return it
     return response_from_dict(content)
 
 
+class LazyWarcResponse():
+    """Response read from WARC data, whose headers and request are only parsed when accessed.
+
+    Only the response record is read up front, and its payload is
+    decompressed into the body, which is the one copy of the page content
+    made. This is all that article extraction needs, as it only uses the URL
+    and the page content.
+    """
+    encoding = "utf-8"
+
+    def __init__(self, file_bytes, dictionaries=None):
+        file_bytes = decode_warc(file_bytes, dictionaries)
+        self.file_bytes = file_bytes
+        self.url = None
+        self.status = None
+        self.body = b""
+        self.response_id = None
+        self._http_headers = None
+        self._request_offset = 0
+        self._request = None
+        self._selector = None
+        archive_iterator = ArchiveIterator(BytesIO(file_bytes))
+        for record in archive_iterator:
+            if record.rec_type == "response":
+                self.response_id = record.rec_headers.get_header("WARC-Record-ID")
+                self.url = record.rec_headers.get_header("WARC-Target-URI")
+                self.status = int(record.http_headers.get_statuscode())
+                self._http_headers = record.http_headers
+                self.body = record.content_stream().read()
+                # The request record is normally written directly after the response
+                archive_iterator.read_to_end(record)
+                self._request_offset = archive_iterator.get_record_offset() + archive_iterator.get_record_length()
+                break
+
+    @property
+    def headers(self):
+        return Headers(dict(self._http_headers.headers) if self._http_headers else {})
+
+    @property
+    def request(self):
+        if not self._request:
+            self._request = self.load_request()
+        return self._request
+
+    def load_request(self):
+        for offset in (self._request_offset, 0):
+            for record in ArchiveIterator(BytesIO(memoryview(self.file_bytes)[offset:])):
+                if record.rec_type == "request" and record.rec_headers.get_header("WARC-Concurrent-To") == self.response_id:
+                    return request_from_dict(request_dict_from_record(record, self.url))
+        # Records read on their own through a CDXJ index have no request record
+        return Request(url=self.url)
+
+    @property
+    def text(self):
+        return str(self.body, self.encoding, "replace")
+
+    @property
+    def selector(self):
+        if self._selector is None:
+            self._selector = Selector(text=self.text, type="html")
+        return self._selector
+
+    def xpath(self, query, **kwargs):
+        return self.selector.xpath(query, **kwargs)
+
+    def css(self, query):
+        return self.selector.css(query)
+
+    def to_response(self):
+        """Build a full HtmlResponse, for code which needs more than the URL and content."""
+        return HtmlResponse(self.url, status=self.status, headers=self.headers, body=self.body,
+                            request=self.request, encoding=self.encoding)
+
+
 def string_from_warc(file_bytes):
     return base64.encodebytes(file_bytes).decode("utf-8")
 
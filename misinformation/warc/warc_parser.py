@@ -9,14 +9,20 @@ from dateutil import parser
 from termcolor import colored
 from misinformation.extractors import extract_article
 from misinformation.database import Connector, RecoverableDatabaseError, NonRecoverableDatabaseError, Article, Webpage
+from .crawl_archive import crawl_archive_paths, iter_crawl_archives
 from .crawl_file import CrawlFile
-from .serialisation import response_from_warc, warc_from_string
+from .serialisation import LazyWarcResponse, warc_from_string
+from .zstd_codec import ZstdDictionaryStore
 
 
 def read_local_files(site_name):
     input_dir = "webpages"
-    input_file = "{}_extracted.txt".format(site_name)
-    input_path = os.path.join(input_dir, input_file)
+    # Pages in crawl archives are streamed one at a time rather than all being read into memory
+    prefix = "{}_extracted".format(site_name)
+    if crawl_archive_paths(input_dir, prefix):
+        return iter_crawl_archives(input_dir, prefix)
+    # Fall back to the base64-encoded JSON export written by older crawls
+    input_path = os.path.join(input_dir, "{}_extracted.txt".format(site_name))
     output_crawl_responses = []
     with open(input_path, "rb") as f_in:
         raw_data = f_in.readlines()[0].decode("utf-8")
@@ -24,17 +30,20 @@ def read_local_files(site_name):
         for json_data in data_entries:
             json_data["article_url"] = json_data.pop("url")
             json_data["crawl_datetime"] = parser.parse(json_data.pop("crawl_datetime"))
+            json_data["warc_data"] = warc_from_string(json_data["warc_data"])
             response = CrawlFile(**json_data)
             output_crawl_responses.append(response)
     return output_crawl_responses
 
 
 class WarcParser(Connector):
-    def __init__(self, content_digests=False, node_indexes=False):
-        super().__init__()
+    def __init__(self, content_digests=False, node_indexes=False, local_storage_dir=None):
+        super().__init__(local_storage_dir=local_storage_dir)
         self.content_digests = content_digests
         self.node_indexes = node_indexes
         self.counts = None
+        # Dictionaries for zstd-compressed WARC files are downloaded when not available locally
+        self.dictionaries = ZstdDictionaryStore(fetch=self.get_blob_content)
 
     def load_warcfiles(self, site_name, max_entries, use_local):
         '''Load WARC files'''
@@ -43,6 +52,10 @@ class WarcParser(Connector):
             warcfile_entries = read_local_files(site_name)
         else:
             warcfile_entries = self.read_entries(Webpage, max_entries=max_entries, site_name=site_name)
+        if not isinstance(warcfile_entries, list):
+            # Pages streamed from crawl archives are only counted as they are processed
+            logging.info("Streaming crawled pages from local crawl archives")
+            return warcfile_entries
         self.counts["warcentries"] = len(warcfile_entries)
         duration = datetime.datetime.utcnow() - start_time
         logging.info("Loaded %s crawled pages in %s",
@@ -102,6 +115,7 @@ class WarcParser(Connector):
         # Load existing articles
         article_urls = self.load_existing_articles(site_name, max_entries)
 
+        n_entries = self.counts["warcentries"] or "?"
         for idx, entry in enumerate(warcfile_entries, start=1):
             # Stop if we've reached the processing limit
             if self.counts["articles"] >= max_articles > 0:
@@ -122,12 +136,12 @@ class WarcParser(Connector):
 
             # Load WARC data
             if use_local:  # ... from local file
-                warc_data = warc_from_string(entry.warc_data)
+                warc_data = entry.warc_data
             else:  # ... from blob storage
                 warc_data = self.get_blob_content(entry.blob_key)
 
             # Create a response from the WARC content and attempt to extract an article
-            response = response_from_warc(warc_data)
+            response = LazyWarcResponse(warc_data, self.dictionaries)
             article = extract_article(response, config, entry, self.content_digests, self.node_indexes)
             with suppress(KeyError):
                 article["plain_text"] = json.dumps(article["plain_text"])
@@ -148,7 +162,7 @@ class WarcParser(Connector):
                     self.counts["no_title"] += 1
             else:
                 logging.info("  no article found for: %s", entry.article_url)
-            logging.info("Finished processing %s/%s: %s", idx, self.counts["warcentries"], entry.article_url)
+            logging.info("Finished processing %s/%s: %s", idx, n_entries, entry.article_url)
 
         # Print statistics
         duration = datetime.datetime.utcnow() - start_time
@@ -0,0 +1,149 @@
+import gzip
+import hashlib
+import os
+import re
+import threading
+import zstandard
+
+MAGIC = b"MZSTD1"
+
+
+def dictionary_blob_name(name):
+    return "zstd-dictionaries/{}.zdict".format(name)
+
+
+def train_dictionary(samples, dict_size):
+    """Train a zstd dictionary from sample WARC data, returning its serialised form."""
+    try:
+        return zstandard.train_dictionary(dict_size, samples).as_bytes()
+    except zstandard.ZstdError:
+        # Too few samples to train from, so use the samples themselves as raw content
+        return b"".join(samples)[-dict_size:]
+
+
+class ZstdDictionaryStore():
+    """Versioned zstd dictionaries for each site, saved as '<site name>.v<version>.<digest>.zdict' files.
+
+    The digest is taken from the dictionary contents, so two dictionaries
+    never share a name even if they were trained in different state
+    directories with the same version number. Dictionaries are never
+    overwritten, so pages compressed with any earlier version can still be
+    decoded. If a fetch function is given, it is used to load dictionaries
+    which are not available locally, by blob name.
+    """
+    def __init__(self, directory=os.path.join("crawl_state", "zstd_dictionaries"), fetch=None):
+        self.directory = directory
+        self.fetch = fetch
+        self.dictionaries = {}
+        self.decompressors = {}
+
+    def path(self, name):
+        return os.path.join(self.directory, "{}.zdict".format(name))
+
+    def versions(self, site_name):
+        """(version, name) of each local dictionary for a site, oldest first."""
+        if not os.path.isdir(self.directory):
+            return []
+        pattern = re.compile(r"^({}\.v(\d+)\.[0-9a-f]+)\.zdict$".format(re.escape(site_name)))
+        return sorted((int(match.group(2)), match.group(1)) for match in map(pattern.match, os.listdir(self.directory)) if match)
+
+    def latest(self, site_name):
+        """Name of the newest dictionary for a site, or None if there isn't one."""
+        versions = self.versions(site_name)
+        return versions[-1][1] if versions else None
+
+    def add(self, site_name, dictionary_data):
+        """Save a new version of the dictionary for a site, returning its name."""
+        versions = self.versions(site_name)
+        name = "{}.v{}.{}".format(site_name, versions[-1][0] + 1 if versions else 1,
+                                  hashlib.sha256(dictionary_data).hexdigest()[:16])
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+        with open(self.path(name), "xb") as f_out:
+            f_out.write(dictionary_data)
+        return name
+
+    def get(self, name):
+        if name not in self.dictionaries:
+            if os.path.isfile(self.path(name)):
+                with open(self.path(name), "rb") as f_in:
+                    dictionary_data = f_in.read()
+            elif self.fetch:
+                dictionary_data = self.fetch(dictionary_blob_name(name))
+            else:
+                raise KeyError("Unknown zstd dictionary: {}".format(name))
+            self.dictionaries[name] = zstandard.ZstdCompressionDict(dictionary_data)
+        return self.dictionaries[name]
+
+    def decompressor(self, name):
+        if name not in self.decompressors:
+            self.decompressors[name] = zstandard.ZstdDecompressor(dict_data=self.get(name))
+        return self.decompressors[name]
+
+
+DEFAULT_DICTIONARIES = ZstdDictionaryStore()
+
+
+def is_zstd_warc(data):
+    return bytes(data[:len(MAGIC)]) == MAGIC
+
+
+def encode_warc(warc_data, name, dictionary, level=3):
+    """Recompress gzipped WARC data with zstd, using the named dictionary.
+
+    The output starts with a header naming the dictionary, so that it can be
+    decoded without knowing which site or dictionary version it came from.
+    """
+    name_bytes = name.encode("utf-8")
+    compressor = zstandard.ZstdCompressor(level=level, dict_data=dictionary)
+    return MAGIC + bytes([len(name_bytes)]) + name_bytes + compressor.compress(gzip.decompress(warc_data))
+
+
+def decode_warc(data, dictionaries=None):
+    """Return WARC data readable by an ArchiveIterator, decompressing it first if zstd encoded."""
+    if not is_zstd_warc(data):
+        return data
+    dictionaries = dictionaries or DEFAULT_DICTIONARIES
+    data = memoryview(data)
+    name_length = data[len(MAGIC)]
+    frame_start = len(MAGIC) + 1 + name_length
+    name = bytes(data[len(MAGIC) + 1:frame_start]).decode("utf-8")
+    return dictionaries.decompressor(name).decompress(data[frame_start:])
+
+
+class SiteWarcEncoder():
+    """Encode WARC data for one site with its newest zstd dictionary.
+
+    If the site has no dictionary yet, WARC data is left gzipped while the
+    first pages are collected as samples, after which a dictionary is trained
+    and used for all later pages. The on_trained callback is given the name
+    of each newly trained dictionary, before any page is encoded with it.
+    Pages may be encoded from several threads at once.
+    """
+    def __init__(self, site_name, dictionaries, n_samples=100, dict_size=112640, level=3, on_trained=None):
+        self.site_name = site_name
+        self.dictionaries = dictionaries
+        self.n_samples = n_samples
+        self.dict_size = dict_size
+        self.level = level
+        self.on_trained = on_trained
+        self.samples = []
+        self.dictionary_name = dictionaries.latest(site_name)
+        self.lock = threading.Lock()
+
+    def train(self):
+        name = self.dictionaries.add(self.site_name, train_dictionary(self.samples, self.dict_size))
+        self.samples = []
+        if self.on_trained:
+            self.on_trained(name)
+        self.dictionary_name = name
+
+    def encode(self, warc_data):
+        with self.lock:
+            if not self.dictionary_name:
+                self.samples.append(gzip.decompress(warc_data))
+                if len(self.samples) >= self.n_samples:
+                    self.train()
+                return warc_data
+            name = self.dictionary_name
+        return encode_warc(warc_data, name, self.dictionaries.get(name), self.level)
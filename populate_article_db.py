@@ -11,6 +11,7 @@ def main():
     parser.add_argument("--max-articles", "-n", type=int, default=-1, help="Maximum number of articles to process from each site.")
     parser.add_argument("--site-name", "-s", default="all", help="Name of site configuration.")
     parser.add_argument("--local", action="store_true", help="Use local file as input and do not write output")
+    parser.add_argument("--local-storage", help="Directory to use for blob storage and the database instead of Azure.")
     args = parser.parse_args()
 
     # Set up logging
@@ -23,7 +24,7 @@ def main():
     site_configs = yaml.load(spider_config, Loader=yaml.FullLoader)
 
     # Set up the parser with content digests and node indexes enabled
-    parser = WarcParser(content_digests=True, node_indexes=True)
+    parser = WarcParser(content_digests=True, node_indexes=True, local_storage_dir=args.local_storage)
 
     # Process data for selected sites
     for site_name in site_configs:
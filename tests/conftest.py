@@ -0,0 +1,22 @@
+from types import SimpleNamespace
+
+
+def pipeline_spider():
+    """A stand-in for the spider passed to item pipelines, which discards log messages."""
+    return SimpleNamespace(config={"site_name": "example.com"}, request_closure=False,
+                           logger=SimpleNamespace(info=lambda message: None, critical=lambda message: None))
+
+
+def record_added_entries(connector):
+    """Record the URLs of each batch of entries added to the database, instead of adding them."""
+    connector.added_batches = []
+    connector.add_entries = lambda entries: connector.added_batches.append([entry.article_url for entry in entries]) or []
+    return connector
+
+
+def results(deferreds):
+    """Collect the results of some Deferreds as they fire."""
+    output = []
+    for deferred in deferreds:
+        deferred.addBoth(output.append)
+    return output
@@ -0,0 +1,154 @@
+from types import SimpleNamespace
+import pytest
+from twisted.python.failure import Failure
+from misinformation.database import RecoverableDatabaseError
+from misinformation.pipelines import ArticleBlobStorageExporter, articleblobstorageexporter
+from .conftest import pipeline_spider, record_added_entries, results
+
+
+class ManualThreadPool():
+    """Queue calls made to the thread pool, which only run when run_next is called."""
+    def __init__(self):
+        self.calls = []
+
+    def callInThreadWithCallback(self, on_result, func, *args):  # pylint: disable=invalid-name
+        self.calls.append((on_result, func, args))
+
+    def run_next(self):
+        on_result, func, args = self.calls.pop(0)
+        try:
+            result = func(*args)
+        except Exception:  # pylint: disable=broad-except
+            on_result(False, Failure())
+        else:
+            on_result(True, result)
+
+    def run_all(self):
+        while self.calls:
+            self.run_next()
+
+
+@pytest.fixture
+def thread_pool(monkeypatch):
+    """Deliver results from the upload threads immediately rather than through a running reactor."""
+    fake_reactor = SimpleNamespace(callFromThread=lambda func, *args: func(*args))
+    monkeypatch.setattr(articleblobstorageexporter, "reactor", fake_reactor)
+    pool = ManualThreadPool()
+    monkeypatch.setattr(articleblobstorageexporter.UPLOAD_THREADS, "pool", pool)
+    return pool
+
+
+def open_exporter(tmpdir, spider, upload_queue_size=32, webpage_batch_size=50):
+    exporter = record_added_entries(ArticleBlobStorageExporter(
+        state_dir=str(tmpdir), upload_queue_size=upload_queue_size, webpage_batch_size=webpage_batch_size,
+        local_storage_dir=str(tmpdir.join("storage"))))
+    opened = results([exporter.open_spider(spider)])
+    articleblobstorageexporter.UPLOAD_THREADS.pool.run_all()
+    assert opened == [None]
+    return exporter
+
+
+def crawl_response(idx):
+    return {"site_name": "example.com", "url": "http://example.com/article-{}.html".format(idx),
+            "crawl_id": "crawl-id", "crawl_datetime": "2020-01-01T00:00:00", "warc_data": "warc {}".format(idx)}
+
+
+def test_items_wait_for_a_free_upload_slot(thread_pool, tmpdir):
+    spider = pipeline_spider()
+    exporter = open_exporter(tmpdir, spider, upload_queue_size=2)
+    items = [crawl_response(idx) for idx in range(3)]
+    output = results(exporter.process_item(item, spider) for item in items)
+    assert len(thread_pool.calls) == 2
+    thread_pool.run_next()
+    assert output == [items[0]]
+    assert len(thread_pool.calls) == 2
+    thread_pool.run_all()
+    assert output == items
+    assert exporter.block_blob_service.exists("warc-files")
+
+
+def test_pages_already_being_uploaded_are_only_uploaded_once(thread_pool, tmpdir):
+    spider = pipeline_spider()
+    exporter = open_exporter(tmpdir, spider)
+    output = results([exporter.process_item(crawl_response(0), spider), exporter.process_item(crawl_response(0), spider)])
+    assert len(thread_pool.calls) == 1
+    thread_pool.run_next()
+    assert output == [crawl_response(0), crawl_response(0)]
+    assert len(exporter.pending_webpages) == 2
+    # Once uploaded, the page is found in the index of existing blobs
+    assert results([exporter.process_item(crawl_response(0), spider)]) == [crawl_response(0)]
+    assert not thread_pool.calls
+
+
+def test_pages_are_compressed_in_the_upload_threads(thread_pool, tmpdir):
+    spider = pipeline_spider()
+    exporter = open_exporter(tmpdir, spider)
+    encoded = []
+    exporter.encoder = SimpleNamespace(encode=lambda warc_data: encoded.append(warc_data) or warc_data)
+    output = results([exporter.process_item(crawl_response(0), spider)])
+    assert not encoded
+    thread_pool.run_next()
+    assert encoded == [crawl_response(0)["warc_data"]]
+    assert output == [crawl_response(0)]
+
+
+def test_failed_uploads_add_no_webpages(thread_pool, tmpdir):
+    spider = pipeline_spider()
+    exporter = open_exporter(tmpdir, spider)
+
+    def fail(*_):
+        raise ConnectionError("upload failed")
+    exporter.block_blob_service.create_blob_from_text = fail
+    output = results([exporter.process_item(crawl_response(0), spider), exporter.process_item(crawl_response(0), spider)])
+    thread_pool.run_next()
+    assert [result.check(ConnectionError) for result in output] == [ConnectionError, ConnectionError]
+    assert not exporter.pending_webpages
+    assert not exporter.uploading
+
+
+def test_webpages_are_added_in_batches_and_flushed_on_close(thread_pool, tmpdir):
+    spider = pipeline_spider()
+    exporter = open_exporter(tmpdir, spider, webpage_batch_size=2)
+    items = [crawl_response(idx) for idx in range(3)]
+    output = results(exporter.process_item(item, spider) for item in items)
+    thread_pool.run_all()
+    # The item which fills a batch finishes once the batch has been added
+    assert output == [items[0], items[2], items[1]]
+    assert exporter.added_batches == [[items[0]["url"], items[1]["url"]]]
+    closed = results([exporter.close_spider(spider)])
+    thread_pool.run_all()
+    assert closed == [None]
+    assert exporter.added_batches[-1] == [items[2]["url"]]
+
+
+def test_recoverable_database_errors_are_logged_and_crawling_continues(thread_pool, tmpdir):
+    logged = []
+    spider = pipeline_spider()
+    spider.logger.info = logged.append
+    exporter = open_exporter(tmpdir, spider, webpage_batch_size=1)
+
+    def fail(_):
+        raise RecoverableDatabaseError("Could not load database connection information.")
+    exporter.add_entries = fail
+    output = results([exporter.process_item(crawl_response(0), spider)])
+    thread_pool.run_all()
+    assert output == [crawl_response(0)]
+    assert "Could not load database connection information." in logged
+    assert not spider.request_closure
+
+
+def test_stale_blob_key_indexes_are_refreshed_in_an_upload_thread(thread_pool, tmpdir):
+    spider = pipeline_spider()
+    exporter = open_exporter(tmpdir, spider)
+    exporter.process_item(crawl_response(0), spider)
+    thread_pool.run_all()
+    exporter.close_spider(spider)
+    thread_pool.run_all()
+
+    exporter = ArticleBlobStorageExporter(state_dir=str(tmpdir), blob_key_refresh=0, local_storage_dir=str(tmpdir.join("storage")))
+    opened = results([exporter.open_spider(spider)])
+    assert not opened
+    assert len(thread_pool.calls) == 1
+    thread_pool.run_next()
+    assert opened == [None]
+    assert len(exporter.blob_keys) == 1
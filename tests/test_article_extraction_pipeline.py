@@ -0,0 +1,95 @@
+from concurrent.futures import Future
+from types import SimpleNamespace
+import pytest
+from twisted.internet import defer, threads
+from misinformation.database import NonRecoverableDatabaseError
+from misinformation.pipelines import ArticleExtractionPipeline, articleextractionpipeline
+from misinformation.pipelines.articleextractionpipeline import deferred_from_future
+from .conftest import pipeline_spider, record_added_entries, results
+
+
+class SynchronousExecutor():
+    """Run submitted functions immediately, returning a completed Future."""
+    def submit(self, func, *args):
+        future = Future()
+        try:
+            future.set_result(func(*args))
+        except Exception as err:  # pylint: disable=broad-except
+            future.set_exception(err)
+        return future
+
+
+@pytest.fixture
+def synchronous_reactor(monkeypatch):
+    """Deliver results from worker threads and processes immediately rather than through a running reactor."""
+    fake_reactor = SimpleNamespace(callFromThread=lambda func, *args: func(*args))
+    monkeypatch.setattr(articleextractionpipeline, "reactor", fake_reactor)
+    monkeypatch.setattr(threads, "deferToThread", defer.maybeDeferred)
+
+
+def make_pipeline(batch_size=2):
+    pipeline = record_added_entries(ArticleExtractionPipeline(n_processes=1, batch_size=batch_size))
+    pipeline.executor = SynchronousExecutor()
+    return pipeline
+
+
+def crawl_response(idx):
+    return {"url": "http://example.com/article-{}.html".format(idx), "warc_data": b"warc"}
+
+
+def article_for(crawl_response, *_):
+    return {"article_url": crawl_response["url"], "content": "<p>Text</p>"}
+
+
+def test_deferred_wraps_future_result_and_exception(synchronous_reactor):
+    future = Future()
+    fired = results([deferred_from_future(future)])
+    assert not fired
+    future.set_result("article")
+    assert fired == ["article"]
+
+    future = Future()
+    fired = results([deferred_from_future(future)])
+    future.set_exception(ValueError("parse failed"))
+    assert fired[0].check(ValueError)
+
+
+def test_articles_are_added_in_batches(synchronous_reactor, monkeypatch):
+    monkeypatch.setattr(articleextractionpipeline, "extract_article_from_warc", article_for)
+    pipeline = make_pipeline()
+    spider = pipeline_spider()
+    items = [crawl_response(idx) for idx in range(3)]
+    assert results(pipeline.process_item(item, spider) for item in items) == items
+    assert pipeline.added_batches == [[items[0]["url"], items[1]["url"]]]
+    pipeline.close_spider(spider)
+    assert pipeline.added_batches[-1] == [items[2]["url"]]
+
+
+def test_pages_without_articles_are_not_added(synchronous_reactor, monkeypatch):
+    monkeypatch.setattr(articleextractionpipeline, "extract_article_from_warc", lambda *_: None)
+    pipeline = make_pipeline()
+    spider = pipeline_spider()
+    assert results([pipeline.process_item(crawl_response(0), spider)]) == [crawl_response(0)]
+    pipeline.close_spider(spider)
+    assert pipeline.added_batches == []
+
+
+def test_extraction_errors_fail_the_item(synchronous_reactor, monkeypatch):
+    def fail(*_):
+        raise ValueError("parse failed")
+    monkeypatch.setattr(articleextractionpipeline, "extract_article_from_warc", fail)
+    pipeline = make_pipeline()
+    output = results([pipeline.process_item(crawl_response(0), pipeline_spider())])
+    assert output[0].check(ValueError)
+
+
+def test_database_failures_close_the_crawl(synchronous_reactor, monkeypatch):
+    monkeypatch.setattr(articleextractionpipeline, "extract_article_from_warc", article_for)
+    pipeline = make_pipeline(batch_size=1)
+
+    def fail(articles):
+        raise NonRecoverableDatabaseError("Lost connection with the database. Ending the crawl.")
+    pipeline.add_entries = fail
+    spider = pipeline_spider()
+    results([pipeline.process_item(crawl_response(0), spider)])
+    assert spider.request_closure
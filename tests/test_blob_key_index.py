@@ -0,0 +1,27 @@
+import os
+from misinformation.state import BlobKeyIndex
+
+
+def test_keys_are_found_after_refresh_and_upload(tmpdir):
+    index = BlobKeyIndex(os.path.join(str(tmpdir), "blob_keys.sqlite3"))
+    assert index.is_stale()
+    index.refresh(["key-1", "key-2"])
+    assert not index.is_stale()
+    index.add("key-3")
+    assert "key-1" in index and "key-3" in index
+    assert "key-4" not in index
+    assert len(index) == 3
+
+
+def test_refresh_replaces_keys_and_persists(tmpdir):
+    path = os.path.join(str(tmpdir), "blob_keys.sqlite3")
+    index = BlobKeyIndex(path)
+    index.refresh(["key-1", "key-2"])
+    index.refresh(key for key in ["key-2", "key-3"])
+    index.close()
+    index = BlobKeyIndex(path, refresh_seconds=60)
+    assert not index.is_stale()
+    assert "key-1" not in index
+    assert "key-3" in index
+    index = BlobKeyIndex(path, refresh_seconds=-1)
+    assert index.is_stale()
@@ -0,0 +1,51 @@
+from types import SimpleNamespace
+import pytest
+from selenium.common.exceptions import WebDriverException
+from misinformation import shared_pool
+from misinformation.middlewares import ButtonPressMiddleware, buttonpressmiddleware
+from misinformation.middlewares.browserpool import BrowserPool
+
+
+class FakeDriver:
+    def __init__(self):
+        self.closed = False
+
+    def quit(self):
+        self.closed = True
+
+
+def test_browsers_are_reused_then_recycled():
+    drivers = []
+    pool = BrowserPool(n_browsers=1, pages_per_browser=3, driver_factory=lambda: drivers.append(FakeDriver()) or drivers[-1])
+    used = [pool.with_driver(lambda driver: driver) for _ in range(4)]
+    assert used[:3] == [drivers[0]] * 3
+    assert drivers[0].closed
+    assert used[3] is drivers[1] and not drivers[1].closed
+    pool.close()
+    assert drivers[1].closed
+    assert len(pool) == 0
+
+
+def test_crashed_browsers_are_replaced():
+    drivers = []
+    pool = BrowserPool(n_browsers=1, pages_per_browser=0, driver_factory=lambda: drivers.append(FakeDriver()) or drivers[-1])
+
+    def crash(driver):
+        raise WebDriverException("chrome not reachable")
+    with pytest.raises(WebDriverException):
+        pool.with_driver(crash)
+    assert drivers[0].closed
+    with pytest.raises(ValueError):
+        pool.with_driver(lambda driver: int("not a number"))
+    assert len(pool) == 1 and not drivers[1].closed
+    assert pool.with_driver(lambda driver: driver) is drivers[1]
+
+
+def test_one_pool_of_browsers_is_shared_by_every_site(monkeypatch):
+    monkeypatch.setattr(shared_pool, "reactor", SimpleNamespace(addSystemEventTrigger=lambda phase, event, func: None))
+    monkeypatch.setattr(buttonpressmiddleware.BROWSERS, "pool", None)
+    pool = ButtonPressMiddleware(n_browsers=3).browser_pool()
+    assert ButtonPressMiddleware(n_browsers=1).browser_pool() is pool
+    assert pool.thread_pool.max == 3
+    # Any site may replay a load button's requests, so the browsers always record them
+    assert pool.driver_factory.keywords == {"performance_log": True}
@@ -0,0 +1,69 @@
+import glob
+import os
+from types import SimpleNamespace
+import pkg_resources
+import pytest
+import yaml
+from scrapy.http import HtmlResponse, Request, Response
+from misinformation.middlewares import ButtonPressMiddleware
+from misinformation.middlewares.buttonpressmiddleware import SiteButtons, combined_xpath
+
+SITE_TEST_DATA = os.path.join(os.path.dirname(__file__), "site_test_data")
+SITE_CONFIGS = yaml.load(pkg_resources.resource_string("misinformation", "../site_configs.yml"), Loader=yaml.FullLoader)
+
+
+def html_response(body):
+    return HtmlResponse(url="https://example.com/", body=body, encoding="utf-8")
+
+
+def test_detector_matches_individual_xpaths():
+    site_buttons = SiteButtons(SITE_CONFIGS["npr.org"]["buttons"])
+    buttons = site_buttons.load_buttons + site_buttons.form_buttons
+    for path in sorted(glob.glob(os.path.join(SITE_TEST_DATA, "*", "*_article.html"))):
+        with open(path, "rb") as f_in:
+            response = html_response(f_in.read())
+        expected = any(response.xpath(button.xpath) for button in buttons)
+        assert site_buttons.contains_button(response, load=True, form=True) == expected, path
+
+
+def test_buttons_are_detected():
+    site_buttons = SiteButtons(SITE_CONFIGS["npr.org"]["buttons"])
+    load_page = html_response(b'<html><body><ul class="list"></ul><button class="btn-more">More</button></body></html>')
+    form_page = html_response(b"<html><body><form><input class='agree-all' type='submit'></form></body></html>")
+    text_page = html_response(b'<html><body><button class="x">Load More</button></body></html>')
+    assert site_buttons.contains_button(load_page, load=True)
+    assert not site_buttons.contains_button(load_page, form=True)
+    assert site_buttons.contains_button(form_page, load=True, form=True)
+    assert site_buttons.contains_button(text_page, load=True)
+    assert not site_buttons.contains_button(html_response(b"<html><body><p>btn-more Load More</p></body></html>"), load=True)
+    assert not site_buttons.contains_button(Response(url="https://example.com/image.png", body=b"btn-more"), load=True)
+
+
+def test_site_button_config():
+    site_buttons = SiteButtons({
+        "max_button_clicks": 10,
+        "load": [{"xpath": '//div[@class="more"]', "interact_method": "Click"}, {"xpath": '//button[@class="more"]'}],
+    })
+    assert [button.interact_method for button in site_buttons.load_buttons] == ["Click", "Return"]
+    assert site_buttons.form_buttons == []
+    assert site_buttons.max_button_clicks == 10
+    assert site_buttons.timeout_cumulative == 1800
+    with pytest.raises(ValueError):
+        SiteButtons({"load": [{"xpath": '//button[@class="more"]', "interact_method": "Tap"}]})
+
+
+def test_sites_without_buttons_are_skipped():
+    middleware = ButtonPressMiddleware()
+    page = html_response(b'<html><body><button class="btn-more">More</button></body></html>')
+    request = Request(url="https://example.com/")
+    spider = SimpleNamespace(config={"site_name": "example.com"})
+    assert middleware.process_response(request, page, spider) is page
+    assert middleware.buttons_for_site(spider) is None
+    assert not middleware.seen_urls
+
+
+def test_xpaths_are_combined_by_tag():
+    xpath = combined_xpath(['//button[@class="more"]', '//div[contains(@class, "more")]', '//button[text()="More]"]',
+                            '//li[@class="pager"]/a', '//button[@id="a"][@name="b"]'])
+    assert xpath == ('//button[(@class="more") or (text()="More]")] | //div[(contains(@class, "more"))] | '
+                     '//li[@class="pager"]/a | //button[@id="a"][@name="b"]')
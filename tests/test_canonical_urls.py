@@ -0,0 +1,53 @@
+import pytest
+from scrapy.http import HtmlResponse, Request
+from scrapy.utils.test import get_crawler
+from misinformation.spiders import IndexPageSpider
+
+CONFIG = {
+    "site_name": "example.com",
+    "start_url": "http://example.com/news",
+    "crawl_strategy": {"method": "index_page", "index_page": {"url_must_contain": "page="}},
+    "article": {"url_must_contain": "/news/"},
+}
+
+
+def make_spider(use_canonical_urls=True):
+    crawler = get_crawler(IndexPageSpider, {"USE_DECLARED_CANONICAL_URLS": use_canonical_urls, "PRIORITISE_ARTICLE_LINKS": False})
+    return IndexPageSpider.from_crawler(crawler, config=CONFIG)
+
+
+def article_response(url, head):
+    html = "<html><head>{}</head><body><p>Article text</p></body></html>".format(head)
+    return HtmlResponse(url, body=html, encoding="utf-8", request=Request(url))
+
+
+@pytest.mark.parametrize("head, expected_url", [
+    ('<link rel="canonical" href="/news/article.html">', "http://example.com/news/article.html"),
+    ('<link rel="amphtml canonical" href="http://www.example.com/news/article.html">', "http://www.example.com/news/article.html"),
+    ('<meta property="og:url" content="http://example.com/news/article.html?b=2&a=1">', "http://example.com/news/article.html?a=1&b=2"),
+    # Front pages, non-articles and other sites are not trusted
+    ('<link rel="canonical" href="http://example.com/">', "http://example.com/news/article.html?utm_source=feed"),
+    ('<link rel="canonical" href="http://example.com/about.html">', "http://example.com/news/article.html?utm_source=feed"),
+    ('<link rel="canonical" href="http://syndicated.com/news/article.html">', "http://example.com/news/article.html?utm_source=feed"),
+    ("", "http://example.com/news/article.html?utm_source=feed"),
+])
+def test_declared_canonical_url(head, expected_url):
+    resolved_url = "http://example.com/news/article.html?utm_source=feed"
+    assert make_spider().declared_canonical_url(article_response(resolved_url, head), resolved_url) == expected_url
+
+
+def test_copies_of_an_article_are_only_stored_once():
+    spider = make_spider()
+    head = '<link rel="canonical" href="http://example.com/news/article.html">'
+    first = spider.parse_response(article_response("http://example.com/news/article.html?utm_source=feed", head))
+    second = spider.parse_response(article_response("http://example.com/news/amp/article.html", head))
+    assert first["url"] == "http://example.com/news/article.html"
+    assert second is None
+
+
+def test_declared_canonical_urls_are_only_used_if_enabled():
+    spider = make_spider(use_canonical_urls=False)
+    head = '<link rel="canonical" href="http://example.com/news/article.html">'
+    response = spider.parse_response(article_response("http://example.com/news/amp/article.html", head))
+    assert response["url"] == "http://example.com/news/amp/article.html"
+    assert spider.parse_response(article_response("http://example.com/news/amp/article.html", head)) is None
@@ -0,0 +1,49 @@
+import os
+from scrapy.http import HtmlResponse, Request
+from misinformation.warc import CdxjIndex, WarcRecordReader, WarcSegmentWriter, response_from_warc, surt, warc_from_response, write_cdxj_index
+
+
+def make_warc(url, body):
+    response = HtmlResponse(url, body=body, encoding="utf-8", headers={"Content-Type": "text/html; charset=utf-8"},
+                            request=Request(url))
+    return warc_from_response(response, url)
+
+
+def test_surt():
+    assert surt("http://www.Example.com/News/Article.html") == "com,example)/news/article.html"
+    assert surt("https://example.com") == "com,example)/"
+    assert surt("http://example.com:8080/a?b=2&a=1") == "com,example:8080)/a?a=1&b=2"
+
+
+def test_lookup_and_read_single_records(tmpdir):
+    writer = WarcSegmentWriter(str(tmpdir), "example.com")
+    urls = ["http://example.com/article-{}.html".format(idx) for idx in range(5)]
+    for url in urls:
+        writer.write(url, make_warc(url, "<html><body><p>{}</p></body></html>".format(url)))
+    writer.close()
+    cdxj_path = write_cdxj_index(writer.segment_path)
+    assert cdxj_path == writer.segment_path + ".cdxj"
+
+    index = CdxjIndex.from_files(cdxj_path)
+    assert len(index) == 5
+    assert not index.lookup("http://example.com/missing.html")
+    reader = WarcRecordReader(str(tmpdir))
+    for url in urls:
+        entry = index.latest(url)
+        assert entry["filename"] == os.path.basename(writer.segment_path)
+        assert entry["mime"] == "text/html"
+        assert entry["digest"].startswith("sha1:")
+        response = response_from_warc(reader.read(entry))
+        assert response.url == url
+        assert response.xpath("//p/text()").extract_first() == url
+    reader.close()
+
+
+def test_lookup_returns_captures_in_time_order():
+    index = CdxjIndex([
+        'com,example)/a 20190502000000 {"url": "http://example.com/a", "offset": 10}',
+        'com,example)/b 20190501000000 {"url": "http://example.com/b", "offset": 20}',
+        'com,example)/a 20190501000000 {"url": "http://example.com/a", "offset": 0}',
+    ])
+    assert [entry["offset"] for entry in index.lookup("http://www.example.com/a")] == [0, 10]
+    assert index.latest("http://example.com/a")["offset"] == 10
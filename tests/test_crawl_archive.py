@@ -0,0 +1,100 @@
+import datetime
+import gzip
+import os
+from scrapy.utils.test import get_crawler
+from misinformation.pipelines import ArticleCrawlArchiveExporter
+from misinformation.warc import CrawlArchiveWriter, RotatingCrawlArchiveWriter, crawl_archive_paths, iter_crawl_archive, iter_crawl_archives
+from misinformation.warc.crawl_archive import MAGIC
+
+
+def metadata(idx):
+    return {
+        "url": "http://example.com/article-{}.html".format(idx),
+        "crawl_id": "crawl-id",
+        "crawl_datetime": "2019-05-01T12:00:00+00:00",
+        "site_name": "example.com",
+    }
+
+
+def test_pages_are_read_back(tmpdir):
+    path = os.path.join(str(tmpdir), "example.com_extracted.crawl")
+    warc_data = [gzip.compress(os.urandom(100 * idx)) for idx in range(1, 4)]
+    writer = CrawlArchiveWriter(path)
+    for idx, data in enumerate(warc_data):
+        writer.write(metadata(idx), data)
+    writer.close()
+
+    entries = list(iter_crawl_archive(path))
+    assert [entry.article_url for entry in entries] == [metadata(idx)["url"] for idx in range(3)]
+    assert entries[0].crawl_datetime == datetime.datetime(2019, 5, 1, 12, tzinfo=datetime.timezone.utc)
+    assert [entry.warc_data for entry in entries] == warc_data
+
+
+def test_incomplete_final_page_is_ignored(tmpdir):
+    path = os.path.join(str(tmpdir), "example.com_extracted.crawl")
+    writer = CrawlArchiveWriter(path)
+    writer.write(metadata(0), b"complete")
+    writer.write(metadata(1), b"incomplete")
+    writer.close()
+    with open(path, "r+b") as f_out:
+        f_out.truncate(os.path.getsize(path) - 3)
+    assert [entry.article_url for entry in iter_crawl_archive(path)] == [metadata(0)["url"]]
+
+
+def test_archives_cut_off_before_their_header_are_skipped(tmpdir):
+    writer = CrawlArchiveWriter(os.path.join(str(tmpdir), "example.com_extracted-00001.crawl"))
+    writer.write(metadata(0), b"warc")
+    # The header is on disk as soon as the archive is created
+    interrupted = CrawlArchiveWriter(os.path.join(str(tmpdir), "example.com_extracted-00002.crawl"))
+    assert os.path.getsize(interrupted.file.name) == len(MAGIC)
+    writer.close()
+    interrupted.close()
+    for idx, size in [(3, 0), (4, len(MAGIC) - 1)]:
+        with open(os.path.join(str(tmpdir), "example.com_extracted-{:05d}.crawl".format(idx)), "wb") as f_out:
+            f_out.write(MAGIC[:size])
+    entries = iter_crawl_archives(str(tmpdir), "example.com_extracted")
+    assert [entry.article_url for entry in entries] == [metadata(0)["url"]]
+
+
+def test_archives_are_rotated_and_read_in_order(tmpdir):
+    writer = RotatingCrawlArchiveWriter(str(tmpdir), "example.com_extracted", max_archive_size=500, fsync_interval=0)
+    for idx in range(5):
+        writer.write(metadata(idx), os.urandom(200))
+    # Pages written so far can be read before the writer is closed
+    assert len(list(iter_crawl_archives(str(tmpdir), "example.com_extracted"))) == 5
+    writer.close()
+    assert [os.path.basename(path) for path in crawl_archive_paths(str(tmpdir), "example.com_extracted")] == [
+        "example.com_extracted-00001.crawl", "example.com_extracted-00002.crawl", "example.com_extracted-00003.crawl"]
+    entries = iter_crawl_archives(str(tmpdir), "example.com_extracted")
+    assert [entry.article_url for entry in entries] == [metadata(idx)["url"] for idx in range(5)]
+
+
+def test_resumed_crawls_add_further_archives(tmpdir):
+    writer = RotatingCrawlArchiveWriter(str(tmpdir), "example.com_extracted", max_archive_size=500, fsync_interval=0)
+    for idx in range(3):
+        writer.write(metadata(idx), os.urandom(200))
+    writer.close()
+    writer = RotatingCrawlArchiveWriter(str(tmpdir), "example.com_extracted", max_archive_size=500, fsync_interval=0)
+    writer.write(metadata(3), os.urandom(200))
+    writer.close()
+    assert [os.path.basename(path) for path in crawl_archive_paths(str(tmpdir), "example.com_extracted")][-1] == \
+        "example.com_extracted-00003.crawl"
+    entries = iter_crawl_archives(str(tmpdir), "example.com_extracted")
+    assert [entry.article_url for entry in entries] == [metadata(idx)["url"] for idx in range(4)]
+
+
+def test_archives_are_only_replaced_by_crawls_which_cannot_be_resumed(tmpdir, monkeypatch):
+    class Spider():
+        config = {"site_name": "example.com"}
+
+    monkeypatch.chdir(str(tmpdir))
+    RotatingCrawlArchiveWriter("webpages", "example.com_extracted").write(metadata(0), b"warc")
+    resumable = ArticleCrawlArchiveExporter.from_crawler(get_crawler(settings_dict={
+        "ARTICLE_EXPORTER": "file", "JOBDIR": os.path.join(str(tmpdir), "jobs")}))
+    resumable.open_spider(Spider)
+    resumable.close_spider(Spider)
+    assert len(crawl_archive_paths("webpages", "example.com_extracted")) == 1
+    fresh = ArticleCrawlArchiveExporter.from_crawler(get_crawler(settings_dict={"ARTICLE_EXPORTER": "file"}))
+    fresh.open_spider(Spider)
+    fresh.close_spider(Spider)
+    assert crawl_archive_paths("webpages", "example.com_extracted") == []
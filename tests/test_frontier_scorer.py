@@ -0,0 +1,33 @@
+import re
+from misinformation.spiders.frontierscorer import FrontierScorer
+
+ARTICLE_REGEX = re.compile(r"/news/\d{4}/")
+
+
+def is_article(url):
+    return bool(ARTICLE_REGEX.search(url))
+
+
+def test_path_prefix():
+    assert FrontierScorer.path_prefix("http://example.com/news/2019/article.html") == "news"
+    assert FrontierScorer.path_prefix("http://example.com/about.html") == ""
+    assert FrontierScorer.path_prefix("http://example.com/") == ""
+
+
+def test_article_links_are_prioritised():
+    scorer = FrontierScorer(is_article)
+    article_score = scorer.score("http://example.com/news/2019/article.html")
+    index_score = scorer.score("http://example.com/category/politics")
+    assert article_score > index_score
+    assert scorer.score("http://example.com/category/politics", in_article_links=True) > index_score
+
+
+def test_prefix_yield_is_learned():
+    scorer = FrontierScorer(is_article)
+    unseen_score = scorer.score("http://example.com/tags/elections")
+    for idx in range(10):
+        scorer.record_page("http://example.com/tags/page-{}".format(idx))
+        scorer.record_page("http://example.com/opinion/page-{}".format(idx))
+        scorer.record_article("http://example.com/opinion/page-{}".format(idx))
+    assert scorer.score("http://example.com/tags/elections") < unseen_score
+    assert scorer.score("http://example.com/opinion/editorial") > unseen_score
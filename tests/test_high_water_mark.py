@@ -0,0 +1,35 @@
+from misinformation.state import HighWaterMark
+
+
+def test_nothing_is_stale_on_first_crawl(tmpdir):
+    high_water_mark = HighWaterMark("example.com", str(tmpdir))
+    assert not high_water_mark.is_stale("2019-01-01")
+
+
+def test_entries_before_mark_are_stale(tmpdir):
+    high_water_mark = HighWaterMark("example.com", str(tmpdir))
+    high_water_mark.observe("2019-05-01T12:00:00+00:00")
+    high_water_mark.observe("2019-04-01")
+    high_water_mark.save()
+    reloaded_mark = HighWaterMark("example.com", str(tmpdir))
+    assert reloaded_mark.is_stale("2019-04-30T23:59:59Z")
+    assert not reloaded_mark.is_stale("2019-05-01T12:00:00Z")
+    assert not reloaded_mark.is_stale("2019-05-02")
+
+
+def test_entries_without_lastmod_are_never_stale(tmpdir):
+    high_water_mark = HighWaterMark("example.com", str(tmpdir))
+    high_water_mark.observe("2019-05-01")
+    high_water_mark.save()
+    assert not high_water_mark.is_stale(None)
+    assert not high_water_mark.is_stale("not a date")
+
+
+def test_mark_does_not_move_backwards(tmpdir):
+    high_water_mark = HighWaterMark("example.com", str(tmpdir))
+    high_water_mark.observe("2019-05-01")
+    high_water_mark.save()
+    second_crawl = HighWaterMark("example.com", str(tmpdir))
+    second_crawl.observe("2019-04-01")
+    second_crawl.save()
+    assert HighWaterMark("example.com", str(tmpdir)).is_stale("2019-04-15")
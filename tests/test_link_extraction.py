@@ -0,0 +1,83 @@
+import pytest
+from scrapy.http import HtmlResponse
+from scrapy.linkextractors import LinkExtractor
+from scrapy.utils.test import get_crawler
+from w3lib.url import url_query_cleaner
+from misinformation.spiders import IndexPageSpider
+from misinformation.spiders.singlepasslinkextractor import SinglePassLinkExtractor
+
+
+def index_page_html(n_links):
+    links = []
+    for idx in range(n_links):
+        links.append('<li><a href="/news/2019/article-{idx}.html?utm_source=index">Article {idx}</a></li>'.format(idx=idx))
+        links.append('<li><a href="/news?page={idx}">Page {idx}</a></li>'.format(idx=idx))
+        links.append('<li><span data-href="https://other.com/{idx}.html">Elsewhere</span></li>'.format(idx=idx))
+    return """
+        <html>
+            <body>
+                <div class="nav"><a href="/about.html">About</a><a href="/news/2019/article-0.html">Repeated</a></div>
+                <ul class="articles">{links}</ul>
+                <a href="/image.jpg">Image</a>
+            </body>
+        </html>
+    """.format(links="".join(links))
+
+
+def index_page_response(n_links):
+    url = "http://example.com/news"
+    return HtmlResponse(url=url, body=index_page_html(n_links), encoding="utf-8")
+
+
+def link_extractors():
+    common_kwargs = {"canonicalize": True, "unique": True, "attrs": ("href", "data-href", "data-url"),
+                     "process_value": url_query_cleaner}
+    index_page_extractor = LinkExtractor(allow="page=", **common_kwargs)
+    article_extractor = LinkExtractor(allow="/news/", deny="page=",
+                                      restrict_xpaths='//ul[@class="articles"]', **common_kwargs)
+    return [index_page_extractor, article_extractor]
+
+
+def test_single_pass_matches_separate_extractors():
+    response = index_page_response(50)
+    extractors = link_extractors()
+    expected_links = [extractor.extract_links(response) for extractor in extractors]
+    assert SinglePassLinkExtractor(extractors).extract_links(response) == expected_links
+
+
+def test_restrict_xpaths_are_respected():
+    response = index_page_response(5)
+    _, article_links = SinglePassLinkExtractor(link_extractors()).extract_links(response)
+    assert [link.url for link in article_links] == ["http://example.com/news/2019/article-{}.html".format(idx) for idx in range(5)]
+    assert article_links[0].text == "Article 0"
+
+
+@pytest.mark.parametrize("n_links", [100, 2000])
+def test_benchmark_separate_extractors(benchmark, n_links):
+    response = index_page_response(n_links)
+    extractors = link_extractors()
+    benchmark(lambda: [extractor.extract_links(response) for extractor in extractors])
+
+
+@pytest.mark.parametrize("n_links", [100, 2000])
+def test_benchmark_single_pass_extractor(benchmark, n_links):
+    response = index_page_response(n_links)
+    extractor = SinglePassLinkExtractor(link_extractors())
+    benchmark(extractor.extract_links, response)
+
+
+def test_index_page_spider_follows_links_in_a_single_pass():
+    config = {
+        "site_name": "example.com",
+        "start_url": "http://example.com/news",
+        "crawl_strategy": {"method": "index_page", "index_page": {"url_must_contain": "page=", "article_links": '//ul[@class="articles"]'}},
+        "article": {"url_must_contain": "/news/"},
+    }
+    crawler = get_crawler(IndexPageSpider, {"PRIORITISE_ARTICLE_LINKS": False})
+    spider = IndexPageSpider.from_crawler(crawler, config=config)
+    requests = list(spider._requests_to_follow(index_page_response(3)))  # pylint: disable=protected-access
+    index_urls = ["http://example.com/news?page={}".format(idx) for idx in range(3)]
+    article_urls = ["http://example.com/news/2019/article-{}.html?utm_source=index".format(idx) for idx in range(3)]
+    assert [request.url for request in requests] == index_urls + article_urls
+    assert all(request.callback == spider._callback for request in requests)  # pylint: disable=protected-access
+    assert [request.meta["rule"] for request in requests] == [0] * 3 + [1] * 3
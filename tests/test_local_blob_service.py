@@ -0,0 +1,45 @@
+import os
+import pytest
+from misinformation.database.local_blob_service import LocalBlobService
+
+
+def test_blobs_can_be_written_and_read(tmpdir):
+    service = LocalBlobService(str(tmpdir))
+    service.create_blob_from_text("warc-files", "page-1", "some text")
+    service.create_blob_from_bytes("warc-files", "page-2", b"0123456789")
+    source_path = os.path.join(str(tmpdir), "segment.warc.gz")
+    with open(source_path, "wb") as f_out:
+        f_out.write(b"segment data")
+    service.create_blob_from_path("warc-files", "segment.warc.gz", source_path)
+    assert service.get_blob_to_bytes("warc-files", "page-1").content == b"some text"
+    assert service.get_blob_to_bytes("warc-files", "page-2", start_range=2, end_range=5).content == b"2345"
+    assert service.get_blob_to_bytes("warc-files", "segment.warc.gz").content == b"segment data"
+    assert [blob.name for blob in service.list_blobs("warc-files")] == ["page-1", "page-2", "segment.warc.gz"]
+    assert [blob.name for blob in service.list_blobs("warc-files", "page")] == ["page-1", "page-2"]
+    assert not list(service.list_blobs("other-container"))
+    assert service.exists("warc-files", "page-1")
+    assert not service.exists("warc-files", "page-3")
+    with pytest.raises(KeyError):
+        service.get_blob_to_bytes("warc-files", "page-3")
+
+
+def test_identical_contents_are_stored_once(tmpdir):
+    service = LocalBlobService(str(tmpdir))
+    service.create_blob_from_bytes("warc-files", "page-1", b"duplicate")
+    service.create_blob_from_bytes("warc-files", "page-2", b"duplicate")
+    service.create_blob_from_bytes("warc-files", "page-1", b"replaced")
+    object_files = [name for _, _, names in os.walk(os.path.join(str(tmpdir), "objects")) for name in names]
+    assert len(object_files) == 2
+    assert service.get_blob_to_bytes("warc-files", "page-1").content == b"replaced"
+    assert service.get_blob_to_bytes("warc-files", "page-2").content == b"duplicate"
+
+
+def test_benchmark_write_and_read(benchmark, tmpdir):
+    service = LocalBlobService(str(tmpdir))
+    blobs = [os.urandom(50 * 1024) for _ in range(20)]
+
+    def write_and_read():
+        for idx, blob in enumerate(blobs):
+            service.create_blob_from_bytes("warc-files", "page-{}".format(idx), blob)
+        return [service.get_blob_to_bytes("warc-files", "page-{}".format(idx)).content for idx in range(len(blobs))]
+    assert benchmark(write_and_read) == blobs
@@ -0,0 +1,88 @@
+from types import SimpleNamespace
+from scrapy import Spider
+from scrapy.http import Request, Response
+from scrapy.settings import Settings
+from scrapy.utils.test import get_crawler
+from twisted.internet import defer
+from misinformation.middlewares import DelayedRetryMiddleware
+from misinformation.scheduling import MultiSiteScheduler
+
+
+class FakeCrawlerProcess():
+    """Record the crawls started by the scheduler, which finish when their Deferreds are fired."""
+    def __init__(self):
+        self.settings = Settings({"CONCURRENT_REQUESTS": 16})
+        self.crawls = {}
+
+    def create_crawler(self, spider_class):
+        return SimpleNamespace(spider_class=spider_class)
+
+    def crawl(self, crawler, config):
+        self.crawls[config["site_name"]] = defer.Deferred()
+        return self.crawls[config["site_name"]]
+
+
+def add_sites(scheduler, weights):
+    for idx, weight in enumerate(weights):
+        spider_class = type("Site{}Spider".format(idx), (Spider,), {"custom_settings": {}})
+        scheduler.add_site(spider_class, {"site_name": "site-{}.com".format(idx), "crawl_weight": weight})
+
+
+def running(scheduler):
+    return [(site.site_name, site.concurrency) for site in scheduler.sites if site.status == "running"]
+
+
+def test_sites_are_admitted_in_order_within_the_global_cap():
+    process = FakeCrawlerProcess()
+    scheduler = MultiSiteScheduler(process, global_concurrency=16, site_concurrency=8, progress_interval=0)
+    add_sites(scheduler, [1, 1, 1])
+    scheduler.start()
+    assert running(scheduler) == [("site-0.com", 8), ("site-1.com", 8)]
+    process.crawls["site-1.com"].callback(None)
+    assert running(scheduler) == [("site-0.com", 8), ("site-2.com", 8)]
+    assert scheduler.sites[2].spider_class.custom_settings["CONCURRENT_REQUESTS"] == 8
+
+
+def test_weighted_sites_start_heaviest_first():
+    process = FakeCrawlerProcess()
+    scheduler = MultiSiteScheduler(process, global_concurrency=16, site_concurrency=4, fairness="weighted", progress_interval=0)
+    add_sites(scheduler, [1, 3, 0.5])
+    scheduler.start()
+    assert running(scheduler) == [("site-0.com", 4), ("site-1.com", 12)]
+    assert scheduler.queue[0].site_name == "site-2.com"
+
+
+def test_budgets_never_raise_site_concurrency():
+    process = FakeCrawlerProcess()
+    scheduler = MultiSiteScheduler(process, global_concurrency=64, site_concurrency=32, progress_interval=0)
+    add_sites(scheduler, [1])
+    scheduler.add_site(type("ShallowSpider", (Spider,), {"custom_settings": {"CONCURRENT_REQUESTS": 4}}), {"site_name": "shallow.com"})
+    scheduler.start()
+    assert running(scheduler) == [("site-0.com", 16), ("shallow.com", 4)]
+
+
+def make_retry_middleware(spider_delay=None):
+    crawler = get_crawler(Spider, {"DOWNLOAD_DELAY": 1.0})
+    slot = SimpleNamespace(delay=1.0)
+    crawler.engine = SimpleNamespace(downloader=SimpleNamespace(slots={"example.com": slot}))
+    crawler.spider = Spider.from_crawler(crawler, name="example")
+    if spider_delay is not None:
+        crawler.spider.download_delay = spider_delay
+    return DelayedRetryMiddleware.from_crawler(crawler), crawler.spider, slot
+
+
+def test_server_errors_increase_the_slot_delay():
+    middleware, spider, slot = make_retry_middleware()
+    request = Request("http://example.com/page.html", meta={"download_slot": "example.com"})
+    middleware.process_response(request, Response(request.url, status=503, request=request), spider)
+    assert slot.delay == 1.1
+    for _ in range(middleware.num_responses_threshold):
+        middleware.process_response(request, Response(request.url, status=200, request=request), spider)
+    assert slot.delay == 1.0
+
+
+def test_slot_delay_includes_the_spider_download_delay():
+    middleware, spider, slot = make_retry_middleware(spider_delay=5.0)
+    request = Request("http://example.com/page.html", meta={"download_slot": "example.com"})
+    middleware.process_response(request, Response(request.url, status=503, request=request), spider)
+    assert slot.delay == 5.1
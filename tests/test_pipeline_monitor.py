@@ -0,0 +1,45 @@
+from types import SimpleNamespace
+from scrapy.settings import Settings
+from scrapy.statscollectors import MemoryStatsCollector
+from twisted.internet import defer
+from misinformation.extensions import PipelineMetrics, PipelineMonitor
+
+
+def make_crawler(concurrency):
+    crawler = SimpleNamespace(settings=Settings())
+    crawler.stats = MemoryStatsCollector(crawler)
+    crawler.engine = SimpleNamespace(downloader=SimpleNamespace(total_concurrency=concurrency),
+                                     scraper=SimpleNamespace(slot=SimpleNamespace(itemproc_size=3)))
+    return crawler
+
+
+def test_items_and_latencies_are_recorded():
+    crawler = make_crawler(8)
+    metrics = PipelineMetrics(crawler.stats)
+    deferred = defer.Deferred()
+    metrics.tracked(100, metrics.timed("upload", deferred))
+    assert crawler.stats.get_value("pipeline/items_in_flight") == 1
+    assert crawler.stats.get_value("pipeline/bytes_in_flight") == 100
+    deferred.callback(None)
+    assert crawler.stats.get_value("pipeline/items_in_flight") == 0
+    assert crawler.stats.get_value("pipeline/bytes_in_flight") == 0
+    assert crawler.stats.get_value("pipeline/upload/count") == 1
+    assert metrics.summary(["warc_build", "upload"]).startswith("upload ")
+
+
+def test_concurrency_is_throttled_by_bytes_in_flight():
+    crawler = make_crawler(8)
+    monitor = PipelineMonitor(crawler, 60, max_bytes_in_flight=1000)
+    monitor.max_concurrency = 8
+    spider = SimpleNamespace(logger=SimpleNamespace(info=lambda *args: None))
+    crawler.stats.set_value("pipeline/bytes_in_flight", 2000)
+    monitor.check(spider)
+    monitor.check(spider)
+    assert crawler.engine.downloader.total_concurrency == 2
+    crawler.stats.set_value("pipeline/bytes_in_flight", 700)
+    monitor.check(spider)
+    assert crawler.engine.downloader.total_concurrency == 2
+    crawler.stats.set_value("pipeline/bytes_in_flight", 0)
+    for _ in range(10):
+        monitor.check(spider)
+    assert crawler.engine.downloader.total_concurrency == 8
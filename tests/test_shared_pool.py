@@ -0,0 +1,18 @@
+from types import SimpleNamespace
+from misinformation import shared_pool
+from misinformation.shared_pool import SharedPool
+
+
+def test_pools_are_shared_until_the_reactor_stops(monkeypatch):
+    triggers = []
+    monkeypatch.setattr(shared_pool, "reactor", SimpleNamespace(
+        addSystemEventTrigger=lambda phase, event, func: triggers.append((phase, event, func))))
+    stopped = []
+    pools = SharedPool(lambda size: {"size": size}, stopped.append)
+    pool = pools.get(2)
+    assert pools.get(4) is pool
+    assert pool == {"size": 2}
+    assert [(phase, event) for phase, event, _ in triggers] == [("after", "shutdown")]
+    triggers[0][2]()
+    assert stopped == [pool]
+    assert pools.get(4) == {"size": 4}
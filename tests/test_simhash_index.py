@@ -0,0 +1,70 @@
+import random
+import pytest
+from scrapy.exceptions import NotConfigured
+from scrapy.utils.test import get_crawler
+from misinformation.items import CrawlResponse
+from misinformation.pipelines import NearDuplicatePipeline
+from misinformation.state import SimHashIndex, simhash
+from misinformation.state.simhash_index import hamming_distance
+
+
+def random_text(n_words, seed):
+    generator = random.Random(seed)
+    return " ".join("word{}".format(generator.randint(0, 5000)) for _ in range(n_words))
+
+
+def test_short_texts_are_not_fingerprinted():
+    assert simhash("Only a few words here") is None
+
+
+def test_near_duplicates_have_similar_fingerprints():
+    text = random_text(1000, seed=1)
+    near_duplicate = text + " Share this article"
+    assert hamming_distance(simhash(text), simhash(near_duplicate)) <= 3
+    assert hamming_distance(simhash(text), simhash(random_text(1000, seed=2))) > 3
+
+
+def test_near_duplicates_are_found(tmpdir):
+    index = SimHashIndex("example.com", str(tmpdir))
+    text = random_text(1000, seed=1)
+    index.add("http://example.com/article.html", simhash(text))
+    assert index.find(simhash(text + " AMP")) == "http://example.com/article.html"
+    assert index.find(simhash(random_text(1000, seed=2))) is None
+
+
+def test_pages_are_not_duplicates_of_themselves(tmpdir):
+    index = SimHashIndex("example.com", str(tmpdir))
+    text = random_text(1000, seed=1)
+    index.add("http://example.com/article.html", simhash(text))
+    assert index.find(simhash(text), exclude_url="http://example.com/article.html") is None
+    assert index.find(simhash(text), exclude_url="http://example.com/amp/article.html") == "http://example.com/article.html"
+
+
+def test_aliases_are_not_indexed(tmpdir):
+    text = random_text(1000, seed=1)
+    index = SimHashIndex("example.com", str(tmpdir))
+    index.add("http://example.com/amp/article.html", simhash(text), alias_of="http://example.com/article.html")
+    assert index.find(simhash(text)) is None
+    assert SimHashIndex("example.com", str(tmpdir)).find(simhash(text)) is None
+
+
+def test_index_persists_between_crawls(tmpdir):
+    text = random_text(1000, seed=1)
+    SimHashIndex("example.com", str(tmpdir)).add("http://example.com/article.html", simhash(text))
+    reloaded_index = SimHashIndex("example.com", str(tmpdir))
+    assert reloaded_index.find(simhash(text)) == "http://example.com/article.html"
+
+
+def test_pipeline_records_fingerprints_of_exported_pages(tmpdir):
+    with pytest.raises(NotConfigured):
+        NearDuplicatePipeline.from_crawler(get_crawler(settings_dict={"NEAR_DUPLICATE_DETECTION": False}))
+    pipeline = NearDuplicatePipeline.from_crawler(get_crawler(settings_dict={"NEAR_DUPLICATE_DETECTION": True}))
+
+    class Spider():
+        near_duplicate_index = SimHashIndex("example.com", str(tmpdir))
+
+    text = random_text(1000, seed=1)
+    crawl_response = CrawlResponse(url="http://example.com/article.html", simhash=simhash(text))
+    assert pipeline.process_item(crawl_response, Spider) is crawl_response
+    pipeline.process_item(CrawlResponse(url="http://example.com/short.html"), Spider)
+    assert SimHashIndex("example.com", str(tmpdir)).find(simhash(text)) == "http://example.com/article.html"
@@ -0,0 +1,103 @@
+import gzip
+from scrapy.http import Request, Response, TextResponse
+from scrapy.utils.test import get_crawler
+from misinformation.spiders import XMLSitemapSpider
+from misinformation.spiders.sitemapreader import iter_sitemap_entries, sitemap_stream
+
+URLSET = b"""<?xml version="1.0" encoding="UTF-8"?>
+<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9" xmlns:xhtml="http://www.w3.org/1999/xhtml">
+    <url>
+        <loc>http://example.com/article-1.html</loc>
+        <lastmod>2019-05-01</lastmod>
+    </url>
+    <url>
+        <loc>http://example.com/article-2.html</loc>
+        <xhtml:link rel="alternate" hreflang="fr" href="http://example.com/fr/article-2.html"/>
+    </url>
+    <url>
+        <lastmod>2019-05-03</lastmod>
+    </url>
+    <url>
+        <loc> http://example.com/article-3.html </loc>
+    </url>
+</urlset>
+"""
+
+SITEMAPINDEX = b"""<?xml version="1.0" encoding="UTF-8"?>
+<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">
+    <sitemap>
+        <loc>http://example.com/sitemap-1.xml</loc>
+        <lastmod>2019-05-01</lastmod>
+    </sitemap>
+</sitemapindex>
+"""
+
+
+def all_entries(body, max_parsed_entries=1000):
+    return [(sitemap_type, entry)
+            for sitemap_type, entries in iter_sitemap_entries(sitemap_stream(body), max_parsed_entries)
+            for entry in entries]
+
+
+def test_urlset_entries():
+    expected_entries = [
+        ("urlset", {"loc": "http://example.com/article-1.html", "lastmod": "2019-05-01"}),
+        ("urlset", {"loc": "http://example.com/article-2.html", "alternate": ["http://example.com/fr/article-2.html"]}),
+        ("urlset", {"loc": "http://example.com/article-3.html"}),
+    ]
+    assert all_entries(URLSET) == expected_entries
+
+
+def test_sitemapindex_entries():
+    expected_entries = [
+        ("sitemapindex", {"loc": "http://example.com/sitemap-1.xml", "lastmod": "2019-05-01"}),
+    ]
+    assert all_entries(SITEMAPINDEX) == expected_entries
+
+
+def test_gzipped_sitemap():
+    assert all_entries(gzip.compress(URLSET)) == all_entries(URLSET)
+
+
+def test_batches_are_bounded():
+    batches = list(iter_sitemap_entries(sitemap_stream(URLSET), max_parsed_entries=2))
+    assert [len(entries) for _, entries in batches] == [2, 1]
+
+
+def test_truncated_sitemap():
+    truncated_sitemap = gzip.compress(URLSET)[:-20]
+    assert isinstance(all_entries(truncated_sitemap), list)
+
+
+def test_invalid_sitemap():
+    assert all_entries(b"<html><body>Not found</body></html>") == []
+
+
+def make_spider(**settings):
+    crawler = get_crawler(settings_dict=dict({"SITEMAP_MAX_PARSED_ENTRIES": 2}, **settings))
+    config = {"site_name": "example.com", "start_url": "http://example.com/sitemap.xml",
+              "article": {"url_must_contain": "article"}}
+    return XMLSitemapSpider.from_crawler(crawler, config=config)
+
+
+def sitemap_response(url, body, response_class=Response):
+    return response_class(url, body=body, request=Request(url))
+
+
+def test_spider_streams_gzipped_sitemaps():
+    spider = make_spider()
+    response = sitemap_response("http://example.com/sitemap.xml.gz", gzip.compress(URLSET))
+    assert [request.url for request in spider._parse_sitemap(response)] == [  # pylint: disable=protected-access
+        "http://example.com/article-1.html", "http://example.com/article-2.html", "http://example.com/article-3.html"]
+
+
+def test_spider_ignores_responses_which_are_not_sitemaps():
+    spider = make_spider()
+    response = sitemap_response("http://example.com/sitemap", URLSET, TextResponse)
+    assert not list(spider._parse_sitemap(response))  # pylint: disable=protected-access
+
+
+def test_spider_ignores_sitemaps_which_decompress_beyond_the_maximum_size():
+    spider = make_spider(DOWNLOAD_MAXSIZE=len(URLSET) - 1)
+    response = sitemap_response("http://example.com/sitemap.xml.gz", gzip.compress(URLSET))
+    assert not list(spider._parse_sitemap(response))  # pylint: disable=protected-access
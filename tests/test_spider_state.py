@@ -0,0 +1,63 @@
+import os
+from scrapy.utils.test import get_crawler
+from crawl import dynamic_spider_class
+from misinformation.extensions import AtomicSpiderState
+
+CONFIG = {
+    "site_name": "example.com",
+    "start_url": "http://example.com/news",
+    "crawl_strategy": {"method": "index_page", "index_page": {"url_must_contain": "page="}},
+    "article": {"url_must_contain": "/news/"},
+}
+
+
+def open_spider(resume_dir):
+    spider_class = dynamic_spider_class(CONFIG, 0, resume_dir)
+    crawler = get_crawler(spider_class, spider_class.custom_settings)
+    spider = spider_class.from_crawler(crawler, config=CONFIG)
+    extension = AtomicSpiderState.from_crawler(crawler)
+    extension.spider_opened(spider)
+    return spider, extension
+
+
+def test_each_site_has_its_own_job_directory(tmpdir):
+    spider_class = dynamic_spider_class(CONFIG, 0, str(tmpdir))
+    assert spider_class.custom_settings["JOBDIR"] == os.path.join(str(tmpdir), "example.com")
+    assert "JOBDIR" not in dynamic_spider_class(CONFIG, 0).custom_settings
+
+
+def test_spider_state_is_restored_by_a_resumed_crawl(tmpdir):
+    spider, extension = open_spider(str(tmpdir))
+    assert spider.state == {}
+    spider.n_pages, spider.n_articles = 10, 3
+    spider.update_cookies({"name": "consent", "value": "yes"})
+    spider.seen_article_urls.add("http://example.com/news/article.html")
+    extension.spider_closed(spider)
+    assert os.listdir(os.path.join(str(tmpdir), "example.com")) == ["spider.state"]
+
+    resumed_spider, _ = open_spider(str(tmpdir))
+    assert resumed_spider.crawl_info == spider.crawl_info
+    assert (resumed_spider.n_pages, resumed_spider.n_articles) == (10, 3)
+    assert resumed_spider.cookies == [{"name": "consent", "value": "yes"}]
+    assert resumed_spider.seen_article_urls == {"http://example.com/news/article.html"}
+
+
+def test_state_is_replaced_atomically(tmpdir, monkeypatch):
+    spider, extension = open_spider(str(tmpdir))
+    extension.spider_closed(spider)
+    state_path = os.path.join(str(tmpdir), "example.com", "spider.state")
+    with open(state_path, "rb") as f_in:
+        saved_state = f_in.read()
+
+    # A crawl which dies while saving its state leaves the previous state in place
+    def fail(*_args, **_kwargs):
+        raise KeyboardInterrupt
+    monkeypatch.setattr("pickle.dump", fail)
+    spider.n_pages = 20
+    try:
+        extension.spider_closed(spider)
+    except KeyboardInterrupt:
+        pass
+    with open(state_path, "rb") as f_in:
+        assert f_in.read() == saved_state
+    assert os.listdir(os.path.join(str(tmpdir), "example.com")) == ["spider.state"]
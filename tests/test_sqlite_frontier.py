@@ -0,0 +1,158 @@
+import os
+import time
+from scrapy import Request, Spider, signals
+from scrapy.exceptions import IgnoreRequest
+from scrapy.http import Response
+from scrapy.utils.test import get_crawler
+from misinformation.frontier import SharedFrontierMiddleware, SharedFrontierScheduler, SharedFrontierSpiderMiddleware, SQLiteFrontier
+
+
+def frontier_at(tmpdir, **kwargs):
+    return SQLiteFrontier(os.path.join(str(tmpdir), "frontier.sqlite"), **kwargs)
+
+
+def test_duplicate_requests_are_filtered(tmpdir):
+    frontier = frontier_at(tmpdir)
+    assert frontier.add("example.com", "fingerprint-1", 0, b"request-1")
+    assert not frontier.add("example.com", "fingerprint-1", 0, b"request-1")
+    assert frontier.add("other.com", "fingerprint-1", 0, b"request-1")
+    assert frontier.n_pending("example.com") == 1
+    assert frontier.add_many("example.com", [("fingerprint-1", 0, b"request-1"), ("fingerprint-2", 0, b"request-2"),
+                                             ("fingerprint-2", 0, b"request-2")]) == 1
+    assert frontier.n_pending("example.com") == 2
+
+
+def test_requests_are_leased_by_priority(tmpdir):
+    frontier = frontier_at(tmpdir)
+    frontier.add("example.com", "fingerprint-1", 0, b"request-1")
+    frontier.add("example.com", "fingerprint-2", 10, b"request-2")
+    frontier.add("other.com", "fingerprint-3", 20, b"request-3")
+    assert [data for _, data in frontier.lease("example.com", "worker-1", 10)] == [b"request-2", b"request-1"]
+
+
+def test_workers_do_not_share_leases(tmpdir):
+    worker_1 = frontier_at(tmpdir)
+    worker_2 = frontier_at(tmpdir)
+    for idx in range(4):
+        worker_1.add("example.com", "fingerprint-{}".format(idx), 0, "request-{}".format(idx).encode("utf-8"))
+    leased_1 = worker_1.lease("example.com", "worker-1", 3)
+    leased_2 = worker_2.lease("example.com", "worker-2", 3)
+    assert len(leased_1) == 3
+    assert len(leased_2) == 1
+    assert not set(leased_1) & set(leased_2)
+    assert worker_1.n_available("example.com") == 0
+    assert worker_1.n_pending("example.com") == 4
+
+
+def test_acknowledged_requests_are_removed(tmpdir):
+    frontier = frontier_at(tmpdir)
+    frontier.add("example.com", "fingerprint-1", 0, b"request-1")
+    leased = frontier.lease("example.com", "worker-1", 1)
+    assert frontier.n_pending("example.com") == 1
+    frontier.acknowledge([request_id for request_id, _ in leased])
+    assert frontier.n_pending("example.com") == 0
+    assert not frontier.add("example.com", "fingerprint-1", 0, b"request-1")
+
+
+def test_expired_and_released_leases_are_reissued(tmpdir):
+    frontier = frontier_at(tmpdir, lease_seconds=0.1, max_attempts=2)
+    frontier.add("example.com", "fingerprint-1", 0, b"request-1")
+    leased = frontier.lease("example.com", "worker-1", 1)
+    assert frontier.lease("example.com", "worker-2", 1) == []
+    frontier.release([request_id for request_id, _ in leased])
+    assert frontier.lease("example.com", "worker-2", 1) == leased
+    time.sleep(0.2)
+    assert frontier.lease("example.com", "worker-3", 1) == leased
+    # This request has now reached its maximum number of attempts
+    time.sleep(0.2)
+    assert frontier.lease("example.com", "worker-4", 1) == []
+    assert frontier.n_pending("example.com") == 0
+
+
+class SiteSpider(Spider):
+    name = "site"
+    config = {"site_name": "example.com"}
+
+    def parse_page(self, response):
+        pass
+
+
+def scheduler_at(tmpdir):
+    crawler = get_crawler(SiteSpider, {
+        "SHARED_FRONTIER_BACKEND": "misinformation.frontier.SQLiteFrontier",
+        "SHARED_FRONTIER_PATH": os.path.join(str(tmpdir), "frontier.sqlite"),
+        "SHARED_FRONTIER_BATCH_SIZE": 16,
+        "SHARED_FRONTIER_LEASE_SECONDS": 600,
+        "SHARED_FRONTIER_MAX_ATTEMPTS": 3,
+    })
+    crawler.spider = SiteSpider()
+    scheduler = SharedFrontierScheduler.from_crawler(crawler)
+    scheduler.open(crawler.spider)
+    return crawler, scheduler
+
+
+def test_scheduler_round_trips_requests_through_the_frontier(tmpdir):
+    _, scheduler = scheduler_at(tmpdir)
+    assert scheduler.enqueue_request(Request("http://example.com/a", callback=scheduler.spider.parse_page, priority=5))
+    assert not scheduler.enqueue_request(Request("http://example.com/a"))
+    request = scheduler.next_request()
+    assert request.url == "http://example.com/a"
+    assert request.callback == scheduler.spider.parse_page
+    assert request.priority == 5
+    assert scheduler.next_request() is None
+
+
+def test_new_requests_are_added_in_batches(tmpdir):
+    _, scheduler = scheduler_at(tmpdir)
+    other_worker = frontier_at(tmpdir)
+    for idx in range(15):
+        assert scheduler.enqueue_request(Request("http://example.com/{}".format(idx)))
+    assert other_worker.n_pending("example.com") == 0
+    assert scheduler.has_pending_requests()
+    scheduler.enqueue_request(Request("http://example.com/15"))
+    assert other_worker.n_pending("example.com") == 16
+
+
+def test_requests_leased_by_other_workers_are_not_pending(tmpdir):
+    _, scheduler = scheduler_at(tmpdir)
+    other_worker = frontier_at(tmpdir)
+    other_worker.add("example.com", "fingerprint-1", 0, b"request-1")
+    assert scheduler.has_pending_requests()
+    other_worker.lease("example.com", "worker-2", 1)
+    assert not scheduler.has_pending_requests()
+
+
+def test_scheduler_acknowledges_requests_once_processed(tmpdir):
+    crawler, scheduler = scheduler_at(tmpdir)
+    downloader_middleware = SharedFrontierMiddleware.from_crawler(crawler)
+    spider_middleware = SharedFrontierSpiderMiddleware.from_crawler(crawler)
+    for path in ["article", "callback-error", "disallowed", "redirected"]:
+        scheduler.enqueue_request(Request("http://example.com/" + path))
+    article, callback_error, disallowed, redirected = [scheduler.next_request() for _ in range(4)]
+
+    # Pages are only acknowledged once their items have been through the pipelines
+    response = Response(article.url, request=article)
+    item, next_page = {"url": article.url}, Request("http://example.com/next")
+    assert list(spider_middleware.process_spider_output(response, [item, next_page])) == [item, next_page]
+    assert article.meta["frontier_id"] in scheduler.unacknowledged_ids
+    crawler.signals.send_catch_log(signal=signals.item_scraped, item=item, response=response, spider=crawler.spider)
+    assert article.meta["frontier_id"] not in scheduler.unacknowledged_ids
+
+    spider_middleware.process_spider_exception(Response(callback_error.url, request=callback_error), ValueError())
+    downloader_middleware.process_exception(disallowed, IgnoreRequest(), crawler.spider)
+    # Redirects replace the request they came from
+    assert scheduler.enqueue_request(redirected.replace(url="http://example.com/redirect-target"))
+    assert not scheduler.unacknowledged_ids
+    scheduler.flush()
+    assert [request.url for request in iter(scheduler.next_request, None)] == ["http://example.com/redirect-target"]
+    assert scheduler.frontier.n_pending("example.com") == 1
+
+
+def test_scheduler_releases_unfinished_requests_on_close(tmpdir):
+    _, scheduler = scheduler_at(tmpdir)
+    for path in ["in-progress", "waiting"]:
+        scheduler.enqueue_request(Request("http://example.com/" + path))
+    assert scheduler.next_request().url == "http://example.com/in-progress"
+    scheduler.close("shutdown")
+    frontier = frontier_at(tmpdir)
+    assert [request_id for request_id, _ in frontier.lease("example.com", "worker-2", 10)] == [1, 2]
@@ -0,0 +1,93 @@
+import asyncio
+from scrapy.http import HtmlResponse, Request
+from scrapy.utils.test import get_crawler
+from misinformation.pipelines import ValidatorPipeline
+from misinformation.spiders import IndexPageSpider
+from misinformation.state import ValidatorStore
+
+
+def test_conditional_headers_for_unseen_url(tmpdir):
+    store = ValidatorStore("example.com", str(tmpdir))
+    assert store.conditional_headers("http://example.com/page.html") == {}
+
+
+def test_conditional_headers_after_update(tmpdir):
+    store = ValidatorStore("example.com", str(tmpdir))
+    store.update("http://example.com/page.html", '"abc123"', "Wed, 21 Oct 2015 07:28:00 GMT", b"<html></html>")
+    expected_headers = {
+        "If-None-Match": '"abc123"',
+        "If-Modified-Since": "Wed, 21 Oct 2015 07:28:00 GMT",
+    }
+    assert store.conditional_headers("http://example.com/page.html") == expected_headers
+
+
+def test_missing_validators_are_not_sent(tmpdir):
+    store = ValidatorStore("example.com", str(tmpdir))
+    store.update("http://example.com/page.html", "", "", b"<html></html>")
+    assert store.conditional_headers("http://example.com/page.html") == {}
+
+
+def test_body_change_detection(tmpdir):
+    store = ValidatorStore("example.com", str(tmpdir))
+    assert store.update("http://example.com/page.html", "", "", b"<html>1</html>")
+    assert not store.update("http://example.com/page.html", "", "", b"<html>1</html>")
+    assert store.update("http://example.com/page.html", "", "", b"<html>2</html>")
+
+
+def test_validators_persist_between_crawls(tmpdir):
+    store = ValidatorStore("example.com", str(tmpdir))
+    store.update("http://example.com/page.html", '"abc123"', "", b"<html></html>")
+    store.save()
+    reloaded_store = ValidatorStore("example.com", str(tmpdir))
+    assert reloaded_store.conditional_headers("http://example.com/page.html") == {"If-None-Match": '"abc123"'}
+    assert not reloaded_store.update("http://example.com/page.html", '"abc123"', "", b"<html></html>")
+
+
+def test_conditional_headers_are_only_sent_for_articles(tmpdir):
+    store = ValidatorStore("example.com", str(tmpdir))
+    for url in ["http://example.com/news", "http://example.com/news?page=2", "http://example.com/news/article.html"]:
+        store.update(url, '"abc123"', "", b"<html></html>")
+    store.save()
+    config = {
+        "site_name": "example.com",
+        "start_url": "http://example.com/news",
+        "crawl_strategy": {"method": "index_page", "index_page": {"url_must_contain": "page="}},
+        "article": {"url_must_contain": "/news/"},
+    }
+    crawler = get_crawler(IndexPageSpider, {"CONDITIONAL_REQUESTS": True, "CRAWL_STATE_DIR": str(tmpdir),
+                                            "PRIORITISE_ARTICLE_LINKS": False})
+    spider = IndexPageSpider.from_crawler(crawler, config=config)
+
+    async def start_requests():
+        return [request async for request in spider.start()]
+    assert [request.headers.get("If-None-Match") for request in asyncio.run(start_requests())] == [None]
+    response = HtmlResponse("http://example.com/news", encoding="utf-8",
+                            body='<a href="/news?page=2">Next</a><a href="/news/article.html">Article</a>')
+    requests = list(spider._requests_to_follow(response))  # pylint: disable=protected-access
+    assert {request.url: request.headers.get("If-None-Match") for request in requests} == {
+        "http://example.com/news?page=2": None,
+        "http://example.com/news/article.html": b'"abc123"',
+    }
+
+
+def test_validators_are_only_recorded_once_exported(tmpdir):
+    config = {
+        "site_name": "example.com",
+        "start_url": "http://example.com/news",
+        "crawl_strategy": {"method": "index_page", "index_page": {"url_must_contain": "page="}},
+        "article": {"url_must_contain": "/news/"},
+    }
+    crawler = get_crawler(IndexPageSpider, {"CONDITIONAL_REQUESTS": True, "CRAWL_STATE_DIR": str(tmpdir),
+                                            "PRIORITISE_ARTICLE_LINKS": False})
+    spider = IndexPageSpider.from_crawler(crawler, config=config)
+    response = HtmlResponse("http://example.com/news/article.html", encoding="utf-8", headers={"ETag": '"abc123"'},
+                            body="<p>Article text</p>", request=Request("http://example.com/news/article.html"))
+    crawl_response = spider.parse_response(response)
+    assert spider.validator_store.conditional_headers(response.url) == {}
+    # A page which failed to export is still treated as changed by the next crawl
+    spider.seen_article_urls.clear()
+    assert spider.parse_response(response) is not None
+    ValidatorPipeline.from_crawler(crawler).process_item(crawl_response, spider)
+    assert spider.validator_store.conditional_headers(response.url) == {"If-None-Match": '"abc123"'}
+    spider.seen_article_urls.clear()
+    assert spider.parse_response(response) is None
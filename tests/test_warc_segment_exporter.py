@@ -0,0 +1,70 @@
+import gzip
+import os
+from types import SimpleNamespace
+import pytest
+from twisted.internet import defer, threads
+from misinformation.pipelines import ArticleWarcSegmentExporter
+
+
+class WorkerThreads():
+    """Queue calls made to worker threads, which only run when run_next is called."""
+    def __init__(self):
+        self.calls = []
+
+    def defer_to_thread(self, func, *args):
+        deferred = defer.Deferred()
+        self.calls.append((deferred, func, args))
+        return deferred
+
+    def run_next(self):
+        deferred, func, args = self.calls.pop(0)
+        deferred.callback(func(*args))
+
+
+@pytest.fixture
+def worker_threads(monkeypatch):
+    workers = WorkerThreads()
+    monkeypatch.setattr(threads, "deferToThread", workers.defer_to_thread)
+    return workers
+
+
+def make_exporter(tmpdir, monkeypatch):
+    monkeypatch.chdir(str(tmpdir))
+    spider = SimpleNamespace(config={"site_name": "example.com"}, request_closure=False,
+                             logger=SimpleNamespace(info=lambda message: None, critical=lambda message: None))
+    exporter = ArticleWarcSegmentExporter(max_segment_size=10, upload=True, local_storage_dir=str(tmpdir.join("storage")))
+    exporter.added_webpages = []
+    exporter.add_entry = lambda webpage: exporter.added_webpages.append(webpage.article_url)
+    exporter.open_spider(spider)
+    return exporter, spider
+
+
+def crawl_response(idx):
+    warc_data = gzip.compress(b"WARC/1.0\r\nWARC-Type: warcinfo\r\nContent-Length: 0\r\n\r\n\r\n\r\n")
+    return {"site_name": "example.com", "url": "http://example.com/article-{}.html".format(idx),
+            "crawl_id": "crawl-id", "crawl_datetime": "2020-01-01T00:00:00", "warc_data": warc_data}
+
+
+def test_closed_segments_are_exported_in_worker_threads(tmpdir, monkeypatch, worker_threads):
+    exporter, spider = make_exporter(tmpdir, monkeypatch)
+    assert exporter.process_item(crawl_response(0), spider) == crawl_response(0)
+    assert not worker_threads.calls
+
+    # Writing the next page closes the first segment, and the page waits for it to be exported
+    segment_path = exporter.writer.segment_path
+    output = []
+    exporter.process_item(crawl_response(1), spider).addBoth(output.append)
+    for _ in range(3):
+        assert not output
+        worker_threads.run_next()
+    assert output == [crawl_response(1)]
+    assert exporter.added_webpages == [crawl_response(0)["url"]]
+    assert exporter.block_blob_service.exists("warc-files", os.path.basename(segment_path))
+    assert exporter.block_blob_service.exists("warc-files", os.path.basename(segment_path) + ".cdxj")
+
+    closed = []
+    exporter.close_spider(spider).addBoth(closed.append)
+    while worker_threads.calls:
+        worker_threads.run_next()
+    assert closed == [None]
+    assert exporter.added_webpages == [crawl_response(0)["url"], crawl_response(1)["url"]]
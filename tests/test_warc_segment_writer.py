@@ -0,0 +1,34 @@
+import gzip
+import json
+import os
+from misinformation.warc import WarcSegmentWriter
+
+
+def test_segments_are_rotated_by_size(tmpdir):
+    closed_segments = []
+    writer = WarcSegmentWriter(str(tmpdir), "example.com", max_segment_size=250,
+                               on_segment_closed=lambda path, records: closed_segments.append((path, len(records))))
+    for idx in range(5):
+        writer.write("http://example.com/{}.html".format(idx), gzip.compress(os.urandom(200)))
+    writer.close()
+    assert [os.path.basename(path) for path, _ in closed_segments] == [
+        "example.com-00001.warc.gz", "example.com-00002.warc.gz", "example.com-00003.warc.gz"]
+    assert [n_records for _, n_records in closed_segments] == [2, 2, 1]
+
+
+def test_records_can_be_read_from_offsets(tmpdir):
+    writer = WarcSegmentWriter(str(tmpdir), "example.com")
+    contents = [("http://example.com/{}.html".format(idx), "page {}".format(idx).encode("utf-8")) for idx in range(3)]
+    for url, content in contents:
+        writer.write(url, gzip.compress(content))
+    writer.close()
+    segment_path = os.path.join(str(tmpdir), "example.com-00001.warc.gz")
+    with open(segment_path + ".offsets") as f_in:
+        records = [json.loads(line) for line in f_in]
+    assert [record["url"] for record in records] == [url for url, _ in contents]
+    with open(segment_path, "rb") as f_in:
+        segment = f_in.read()
+    for record, (_, content) in zip(records, contents):
+        assert gzip.decompress(segment[record["offset"]:record["offset"] + record["length"]]) == content
+    # The segment as a whole is also a valid gzip stream
+    assert gzip.decompress(segment) == b"".join(content for _, content in contents)
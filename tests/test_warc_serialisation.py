@@ -0,0 +1,34 @@
+from scrapy.http import HtmlResponse, Request
+from misinformation.warc import LazyWarcResponse, response_from_warc, warc_from_response
+
+URL = "http://example.com/article.html"
+BODY = "<html><body><h1>Headline</h1><p>Café society</p></body></html>"
+
+
+def make_warc():
+    request = Request(URL, headers={"User-Agent": "test-agent"})
+    response = HtmlResponse(URL, body=BODY, encoding="utf-8", headers={"Content-Type": "text/html; charset=utf-8"},
+                            request=request)
+    return warc_from_response(response, URL)
+
+
+def test_lazy_response_matches_eager_response():
+    warc_data = make_warc()
+    eager = response_from_warc(warc_data)
+    lazy = LazyWarcResponse(warc_data)
+    assert lazy.url == eager.url
+    assert lazy.status == eager.status
+    assert lazy.body == eager.body
+    assert lazy.text == eager.text
+    assert lazy.xpath("//p/text()").extract() == eager.xpath("//p/text()").extract()
+    assert lazy.headers.get("Content-Type") == eager.headers.get("Content-Type")
+
+
+def test_lazy_response_request_is_parsed_on_access():
+    lazy = LazyWarcResponse(make_warc())
+    assert lazy._request is None
+    assert lazy.request.url == URL
+    assert lazy.request.headers.get("User-Agent") == b"test-agent"
+    response = lazy.to_response()
+    assert isinstance(response, HtmlResponse)
+    assert response.css("h1::text").extract_first() == "Headline"
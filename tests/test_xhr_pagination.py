@@ -0,0 +1,90 @@
+import json
+from types import SimpleNamespace
+from scrapy.http import HtmlResponse, Request, TextResponse
+from misinformation.middlewares import ButtonPressMiddleware
+from misinformation.middlewares.xhrpagination import (PaginationPattern, XhrRequest, html_from_xhr_response,
+                                                      infer_pagination, xhr_requests_from_performance_log)
+
+
+def log_entry(method, url, request_type="XHR", request_method="GET"):
+    return {"message": json.dumps({"message": {"method": method, "params": {
+        "type": request_type,
+        "request": {"url": url, "method": request_method, "headers": {"X-Requested-With": "XMLHttpRequest", "Cookie": "a=b"}},
+    }}})}
+
+
+def xhr_requests(*urls):
+    return [XhrRequest(url, {}) for url in urls]
+
+
+def test_xhr_requests_are_read_from_performance_log():
+    entries = [
+        log_entry("Network.requestWillBeSent", "https://example.com/image.png", request_type="Image"),
+        log_entry("Network.requestWillBeSent", "https://example.com/api/more?page=2"),
+        log_entry("Network.responseReceived", "https://example.com/api/more?page=2"),
+        log_entry("Network.requestWillBeSent", "https://example.com/api/track", request_method="POST"),
+        log_entry("Network.requestWillBeSent", "https://example.com/api/more?page=3", request_type="Fetch"),
+    ]
+    requests = xhr_requests_from_performance_log(entries)
+    assert [request.url for request in requests] == ["https://example.com/api/more?page=2", "https://example.com/api/more?page=3"]
+    assert requests[0].headers == {"X-Requested-With": "XMLHttpRequest"}
+
+
+def test_query_pagination_is_inferred():
+    pattern = infer_pagination(xhr_requests(
+        "https://example.com/api/more?page=2&size=10",
+        "https://stats.example.com/ping?id=1",
+        "https://example.com/api/more?page=3&size=10",
+        "https://example.com/api/more?page=4&size=10",
+    ))
+    assert pattern.page_url(1) == "https://example.com/api/more?page=5&size=10"
+    assert pattern.page_url(3) == "https://example.com/api/more?page=7&size=10"
+
+
+def test_offsets_and_cache_busters():
+    pattern = infer_pagination(xhr_requests(
+        "https://example.com/v2/articles/offset/20?_=1563000000123",
+        "https://example.com/v2/articles/offset/40?_=1563000000124",
+    ))
+    assert pattern.step == 20
+    assert pattern.page_url(2) == "https://example.com/v2/articles/offset/80?_=1563000000124"
+
+
+def test_no_pattern():
+    assert infer_pagination(xhr_requests("https://example.com/api/more?page=2")) is None
+    assert infer_pagination(xhr_requests("https://example.com/api/more?cursor=abc", "https://example.com/api/more?cursor=xyz")) is None
+    assert infer_pagination(xhr_requests("https://example.com/api/more?page=2&n=5", "https://example.com/api/more?page=3&n=7")) is None
+    assert infer_pagination(xhr_requests("https://example.com/api/more?page=2", "https://example.com/api/more?page=3",
+                                         "https://example.com/api/more?page=5")) is None
+
+
+def test_html_from_xhr_response():
+    url = "https://example.com/api/more?page=2"
+    fragment = TextResponse(url=url, body=b'<li><a href="/a">A</a></li>', encoding="utf-8")
+    data = TextResponse(url=url, body=json.dumps({"count": 2, "items": [{"html": '<a href="/a">A</a>'}, {"html": '<a href="/b">B</a>'}]}).encode("utf-8"), encoding="utf-8")
+    assert html_from_xhr_response(fragment) == '<li><a href="/a">A</a></li>'
+    assert html_from_xhr_response(data) == '<a href="/a">A</a>\n<a href="/b">B</a>'
+
+
+def test_replayed_pages_are_requested_until_empty():
+    scheduled = []
+    crawler = SimpleNamespace(engine=SimpleNamespace(crawl=scheduled.append))
+    middleware = ButtonPressMiddleware(crawler=crawler)
+    spider = SimpleNamespace(config={"site_name": "example.com", "buttons": {"replay_xhr": True, "load": []}}, cookies=[],
+                             logger=SimpleNamespace(info=lambda message: None))
+    pattern = PaginationPattern("https://example.com/api/more?page=4", 0, 1, {"X-Requested-With": "XMLHttpRequest"})
+    middleware.rendered_response((b"<html></html>", [], pattern), Request("https://example.com/news"), spider)
+    assert scheduled[0].url == "https://example.com/api/more?page=5"
+    assert scheduled[0].headers["Referer"] == b"https://example.com/news"
+
+    response = TextResponse(url=scheduled[0].url, body=b'<a href="story/1">Story</a>', encoding="utf-8", request=scheduled[0])
+    page = middleware.process_response(scheduled[0], response, spider)
+    assert isinstance(page, HtmlResponse)
+    assert page.css("a::attr(href)").get() == "story/1"
+    assert page.urljoin("story/1") == "https://example.com/story/1"
+    assert scheduled[1].url == "https://example.com/api/more?page=6"
+    assert scheduled[1].headers["X-Requested-With"] == b"XMLHttpRequest"
+
+    empty = TextResponse(url=scheduled[1].url, body=b"{}", encoding="utf-8", request=scheduled[1])
+    middleware.process_response(scheduled[1], empty, spider)
+    assert len(scheduled) == 2
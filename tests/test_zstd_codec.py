@@ -0,0 +1,111 @@
+import glob
+import gzip
+import os
+import re
+import pytest
+from scrapy.http import HtmlResponse, Request
+from misinformation.warc import SiteWarcEncoder, ZstdDictionaryStore, decode_warc, response_from_warc, warc_from_response
+
+SITE_TEST_DATA = os.path.join(os.path.dirname(__file__), "site_test_data")
+
+
+def make_warc(url, body):
+    response = HtmlResponse(url, body=body, encoding="utf-8", request=Request(url))
+    return warc_from_response(response, url)
+
+
+def site_warcs(site_name):
+    paths = sorted(glob.glob(os.path.join(SITE_TEST_DATA, site_name, "article-*_article.html")))
+    return [make_warc("http://{}/{}".format(site_name, os.path.basename(path)), open(path, "rb").read()) for path in paths]
+
+
+def test_gzip_warcs_are_unchanged():
+    warc_data = make_warc("http://example.com/article.html", "<html><body><p>Text</p></body></html>")
+    assert decode_warc(warc_data) is warc_data
+
+
+def test_pages_are_gzipped_until_a_dictionary_is_trained(tmpdir):
+    dictionaries = ZstdDictionaryStore(str(tmpdir))
+    trained = []
+    encoder = SiteWarcEncoder("abcnews.go.com", dictionaries, n_samples=2, on_trained=trained.append)
+    warcs = site_warcs("abcnews.go.com")
+    encoded = [encoder.encode(warc_data) for warc_data in warcs]
+    assert len(trained) == 1
+    assert re.match(r"^abcnews\.go\.com\.v1\.[0-9a-f]{16}$", trained[0])
+    assert encoded[:2] == warcs[:2]
+    assert len(encoded[2]) < len(warcs[2])
+    for warc_data in encoded:
+        response = response_from_warc(warc_data, dictionaries)
+        assert response.url.startswith("http://abcnews.go.com/")
+
+
+def test_older_dictionary_versions_can_still_be_decoded(tmpdir):
+    dictionaries = ZstdDictionaryStore(str(tmpdir))
+    warcs = site_warcs("abcnews.go.com")
+    encoder = SiteWarcEncoder("abcnews.go.com", dictionaries, n_samples=1)
+    encoder.encode(warcs[0])
+    encoded_v1 = encoder.encode(warcs[2])
+    encoder.samples = [gzip.decompress(warcs[1])]
+    encoder.train()
+    encoded_v2 = encoder.encode(warcs[2])
+    assert dictionaries.latest("abcnews.go.com").startswith("abcnews.go.com.v2.")
+    assert SiteWarcEncoder("abcnews.go.com", dictionaries).dictionary_name == encoder.dictionary_name
+    # Decode with a fresh store, as a separate reader would
+    dictionaries = ZstdDictionaryStore(str(tmpdir))
+    assert response_from_warc(encoded_v1, dictionaries).body == response_from_warc(encoded_v2, dictionaries).body
+
+
+def test_missing_dictionaries_are_fetched(tmpdir):
+    dictionaries = ZstdDictionaryStore(os.path.join(str(tmpdir), "writer"))
+    encoder = SiteWarcEncoder("abcnews.go.com", dictionaries, n_samples=2)
+    warcs = site_warcs("abcnews.go.com")
+    encoded = [encoder.encode(warc_data) for warc_data in warcs][-1]
+    fetched = []
+
+    def fetch(blob_name):
+        fetched.append(blob_name)
+        with open(dictionaries.path(encoder.dictionary_name), "rb") as f_in:
+            return f_in.read()
+
+    reader_dictionaries = ZstdDictionaryStore(os.path.join(str(tmpdir), "reader"), fetch=fetch)
+    assert response_from_warc(encoded, reader_dictionaries).url == response_from_warc(warcs[-1]).url
+    assert fetched == ["zstd-dictionaries/{}.zdict".format(encoder.dictionary_name)]
+
+
+def test_dictionaries_trained_in_separate_state_directories_have_different_names(tmpdir):
+    warcs = site_warcs("abcnews.go.com")
+    names = []
+    for state_dir, sample in [("first", warcs[0]), ("second", warcs[1])]:
+        encoder = SiteWarcEncoder("abcnews.go.com", ZstdDictionaryStore(os.path.join(str(tmpdir), state_dir)), n_samples=1)
+        encoder.encode(sample)
+        names.append(encoder.dictionary_name)
+    assert names[0] != names[1]
+    assert all(".v1." in name for name in names)
+
+
+def compressed_sizes(tmpdir):
+    """Total gzip and zstd sizes of the final test page of each site, using a dictionary trained on the others."""
+    dictionaries = ZstdDictionaryStore(str(tmpdir))
+    gzip_size, zstd_size, encoded_warcs = 0, 0, []
+    for site_name in sorted(os.listdir(SITE_TEST_DATA)):
+        warcs = site_warcs(site_name)
+        if len(warcs) < 2:
+            continue
+        encoder = SiteWarcEncoder(site_name, dictionaries, n_samples=len(warcs) - 1)
+        encoded = [encoder.encode(warc_data) for warc_data in warcs][-1]
+        gzip_size += len(warcs[-1])
+        zstd_size += len(encoded)
+        encoded_warcs.append((warcs[-1], encoded))
+    return gzip_size, zstd_size, encoded_warcs, dictionaries
+
+
+def test_dictionary_compression_beats_gzip(tmpdir):
+    gzip_size, zstd_size, _, _ = compressed_sizes(tmpdir)
+    assert zstd_size < gzip_size
+
+
+@pytest.mark.parametrize("codec", ["gzip", "zstd"])
+def test_benchmark_decode(benchmark, tmpdir, codec):
+    _, _, encoded_warcs, dictionaries = compressed_sizes(tmpdir)
+    warcs = [gzip_warc if codec == "gzip" else zstd_warc for gzip_warc, zstd_warc in encoded_warcs]
+    benchmark(lambda: [response_from_warc(warc_data, dictionaries) for warc_data in warcs])